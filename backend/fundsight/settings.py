@@ -24,7 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-djne4(zfr7p%o3%7c)r-!c)b$(rk+r=jza3!zfo7+lvz8!3&dn"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', '1').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = []
 
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'investments.telemetry.TelemetryMiddleware',  # Removes itself unless TELEMETRY_ENABLED; first to time the rest
     'corsheaders.middleware.CorsMiddleware',  # Add this at the beginning
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -91,6 +92,68 @@ DATABASES = {
 }
 
 
+# Cache
+# Redis or memcached in production, per-process memory otherwise (tests, local runs)
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('MEMCACHED_LOCATION'):  # requires pymemcache
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds an API response stays cached; 0 disables the response cache
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Seconds a token's user stays cached; 0 looks every token up in the database
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('TOKEN_CACHE_TIMEOUT', 300))
+
+# Request telemetry (investments/telemetry.py): Server-Timing headers and /metrics
+TELEMETRY_ENABLED = os.environ.get('TELEMETRY_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Seconds each worker buffers its counts before adding them to the shared counters
+TELEMETRY_FLUSH_INTERVAL = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', 5))
+# Bearer token /metrics requires; empty leaves it open
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Requests sending "X-Profile: <PROFILE_TOKEN>" are profiled, as is a random PROFILE_SAMPLE_RATE of all requests
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILER = os.environ.get('PROFILER', 'cprofile')  # or "pyinstrument", if installed
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# NAV history storage (investments/packed.py): "rows", "mirror" (also pack every write) or "packed" (read packed)
+HISTORY_STORAGE = os.environ.get('HISTORY_STORAGE', 'rows')
+
+# Background jobs (investments/jobs.py), run with "python manage.py run_workers"
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))  # worker processes
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))  # seconds an idle worker waits between polls
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 60))  # seconds before the first retry, doubling after
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))  # seconds without a heartbeat before a running job is requeued
+JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', 1000))  # investments per refresh job
+# (cron expression in TIME_ZONE, task, keyword arguments); JOB_NIGHTLY_SCHEDULE="" disables the nightly refresh
+JOB_SCHEDULE = [
+    (expression, 'nightly_refresh', {})
+    for expression in [os.environ.get('JOB_NIGHTLY_SCHEDULE', '0 2 * * *')] if expression
+]
+
+# Annual risk-free rate used for Sharpe ratios, as a fraction
+RISK_FREE_RATE = float(os.environ.get('RISK_FREE_RATE', 0.065))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -147,15 +210,27 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 
+# Email login in one query; the username backend stays for the admin
+AUTHENTICATION_BACKENDS = [
+    'investments.authentication.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Authentication settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',  # Add token authentication
+        'investments.authentication.CachedTokenAuthentication',  # Token authentication, cached per token
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Make all endpoints require authentication by default
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'investments.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'investments.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # Update session cookie settings
@@ -0,0 +1,54 @@
+"""
+Production settings: run with DJANGO_SETTINGS_MODULE=fundsight.settings_production.
+
+Everything deployment specific comes from the environment; see
+``gunicorn.conf.py`` for the matching server configuration.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DEBUG = False
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('ALLOWED_HOSTS', 'localhost').split(',') if host.strip()]
+
+SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', '1') == '1'
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+
+# Under ASGI each request runs its sync code on a thread of its own, so a
+# persistent connection would never be reused and leaks until the thread is
+# collected. Connect per request there and let PgBouncer do the pooling.
+ASGI = 'uvicorn' in os.environ.get('GUNICORN_WORKER_CLASS', '')
+
+# Keep one connection open per worker thread instead of reconnecting on
+# every request, and ping it before reuse so a restarted database or a
+# pooler that dropped the connection does not surface as a request error.
+DATABASES['default'].update({
+    'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE') or (0 if ASGI else 600)),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+    },
+})
+
+# Behind PgBouncer in transaction mode a server-side cursor can land on a
+# different server connection than the one that declared it
+if os.environ.get('DB_POOLER') == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
+}
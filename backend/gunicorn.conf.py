@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for the production profile.
+
+    gunicorn fundsight.wsgi:application -c gunicorn.conf.py
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn fundsight.asgi:application -c gunicorn.conf.py
+
+All values can be overridden with environment variables.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Processes; each holds its own persistent database connection(s)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# gthread keeps a persistent DB connection per thread; use
+# uvicorn.workers.UvicornWorker to serve fundsight.asgi, which the
+# /api/async/ endpoints need to run without tying up a thread per request
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth; jitter avoids all
+# workers restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Import the app before forking so workers share its memory pages
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
@@ -1,6 +1,35 @@
 from django.contrib import admin
 
-from .models import Investment, PerformanceHistory, SectorAllocation, Fund, Stock, FundStockHolding
+from .changelist import LargeTableAdmin, RelatedIdFilter
+from .jobs import TASKS
+from .models import (
+    Investment, PerformanceHistory, SectorAllocation, Fund, FundNav, Stock, FundStockHolding, InvestmentHolding, Job,
+)
+
+class InvestmentIdFilter(RelatedIdFilter):
+    title = 'investment'
+    field_name = 'investment'
+
+class FundIdFilter(RelatedIdFilter):
+    title = 'fund'
+    field_name = 'fund'
+
+class StockIdFilter(RelatedIdFilter):
+    title = 'stock'
+    field_name = 'stock'
+
+class TaskFilter(admin.SimpleListFilter):
+    # The registered tasks, rather than a DISTINCT over every job
+    title = 'task'
+    parameter_name = 'task'
+
+    def lookups(self, request, model_admin):
+        return [(name, name) for name in sorted(TASKS)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(task=self.value())
+        return queryset
 
 @admin.register(Investment)
 class InvestmentAdmin(admin.ModelAdmin):
@@ -8,25 +37,56 @@ class InvestmentAdmin(admin.ModelAdmin):
     search_fields = ('user_name',)
 
 @admin.register(PerformanceHistory)
-class PerformanceHistoryAdmin(admin.ModelAdmin):
+class PerformanceHistoryAdmin(LargeTableAdmin):
     list_display = ('investment', 'date', 'value')
-    list_filter = ('date',)
+    list_filter = (InvestmentIdFilter,)
+    list_select_related = ('investment',)
+    raw_id_fields = ('investment',)
+    date_hierarchy = 'date'
 
 @admin.register(SectorAllocation)
-class SectorAllocationAdmin(admin.ModelAdmin):
+class SectorAllocationAdmin(LargeTableAdmin):
     list_display = ('investment', 'name', 'amount', 'percentage')
+    list_filter = (InvestmentIdFilter,)
+    list_select_related = ('investment',)
+    raw_id_fields = ('investment',)
 
 @admin.register(Fund)
 class FundAdmin(admin.ModelAdmin):
-    list_display = ('name', 'color')
+    list_display = ('name', 'color', 'nav')
     search_fields = ('name',)
 
+@admin.register(FundNav)
+class FundNavAdmin(LargeTableAdmin):
+    list_display = ('fund', 'date', 'nav')
+    list_filter = (FundIdFilter,)
+    list_select_related = ('fund',)
+    raw_id_fields = ('fund',)
+    date_hierarchy = 'date'
+
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'sector')
+    list_filter = ('sector',)
     search_fields = ('name',)
 
 @admin.register(FundStockHolding)
-class FundStockHoldingAdmin(admin.ModelAdmin):
+class FundStockHoldingAdmin(LargeTableAdmin):
     list_display = ('fund', 'stock', 'weight')
-    list_filter = ('fund', 'stock')
\ No newline at end of file
+    list_filter = (FundIdFilter, StockIdFilter)
+    list_select_related = ('fund', 'stock')
+    autocomplete_fields = ('fund', 'stock')
+
+@admin.register(InvestmentHolding)
+class InvestmentHoldingAdmin(LargeTableAdmin):
+    list_display = ('investment', 'fund', 'units', 'cost')
+    list_filter = (InvestmentIdFilter, FundIdFilter)
+    list_select_related = ('investment', 'fund')
+    raw_id_fields = ('investment', 'fund')
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('task', 'key', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', TaskFilter)
+    search_fields = ('key',)
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
@@ -0,0 +1,52 @@
+"""
+Portfolio-wide rollups across every investor, computed with GROUP BY in the
+database so the response size and the work done in Python do not grow with
+the number of investors.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Max, Sum
+
+from .models import PerformanceHistory, SectorAllocation
+
+CENT = Decimal('0.01')
+
+
+def portfolio_totals(investments):
+    totals = investments.aggregate(
+        investors=Count('pk'),
+        total_value=Sum('current_value'),
+        total_invested=Sum('initial_value'),
+    )
+    total_value = totals['total_value'] or Decimal(0)
+    total_invested = totals['total_invested'] or Decimal(0)
+    growth = total_value - total_invested
+    return {
+        'investors': totals['investors'],
+        'total_value': total_value,
+        'total_invested': total_invested,
+        'total_growth': growth,
+        'growth_percentage': (growth / total_invested * 100).quantize(CENT) if total_invested else None,
+    }
+
+
+def sector_totals(investments):
+    """Allocation amounts summed per sector name, largest first, with each sector's share of the total."""
+    sectors = list(
+        SectorAllocation.objects.filter(investment__in=investments)
+        .values('name')
+        .annotate(amount=Sum('amount'), bgcolor=Max('bgcolor'))
+        .order_by('-amount', 'name')
+    )
+    total = sum(sector['amount'] for sector in sectors)
+    for sector in sectors:
+        sector['percentage'] = (sector['amount'] / total * 100).quantize(CENT) if total else Decimal(0)
+    return sectors
+
+
+def combined_history(investments, start=None):
+    """``(date, total value)`` of every investment's history summed per day, oldest first."""
+    history = PerformanceHistory.objects.filter(investment__in=investments)
+    if start is not None:
+        history = history.filter(date__gte=start)
+    return list(history.values('date').annotate(total=Sum('value')).order_by('date').values_list('date', 'total'))
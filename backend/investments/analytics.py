@@ -0,0 +1,322 @@
+"""
+Return and risk metrics over PerformanceHistory.
+
+A series is loaded into NumPy arrays with one query and every metric is
+computed on whole arrays, so a 10 year daily series costs about as much as a
+single Python loop over it would. Results are memoized in the cache per
+(investment, period start, history version, last point). The history version
+is bumped by ``record_history_change`` whenever any of an investment's points
+is written or deleted, so memos survive unrelated writes but not a backfill
+or a corrected value. ``refresh_metrics`` computes and stores them for every
+investment in batches, for nightly refreshes.
+"""
+import hashlib
+import time
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import packed
+from .models import Investment, PerformanceHistory
+from .timeseries import period_start
+
+DAYS_PER_YEAR = 365.25
+
+# Windows for rolling returns, in calendar days
+ROLLING_WINDOWS = {
+    '1M': 30,
+    '3M': 91,
+    '1Y': 365,
+    '3Y': 1096,
+}
+
+METRICS_KEY = 'metrics:{}'
+METRICS_TIMEOUT = 60 * 60 * 24
+HISTORY_VERSION_KEY = 'metrics:history:{}'
+
+# Investments whose full history is read at once by refresh_metrics
+METRICS_BATCH_SIZE = 100
+
+
+def xirr(cashflows, guess=0.1, tolerance=1e-7, max_iterations=100):
+    """
+    Annualized internal rate of return for irregular ``(date, amount)`` cash flows.
+
+    Investments are negative amounts and withdrawals or the current value are
+    positive. Returns the rate as a fraction (0.12 for 12%), or None when the
+    flows do not change sign or the solver does not converge.
+    """
+    if not cashflows:
+        return None
+    amounts = [float(amount) for _, amount in cashflows]
+    if not (any(a < 0 for a in amounts) and any(a > 0 for a in amounts)):
+        return None
+
+    start = min(day for day, _ in cashflows)
+    years = [(day - start).days / 365.0 for day, _ in cashflows]
+
+    def npv(rate):
+        return sum(a / (1 + rate) ** t for a, t in zip(amounts, years))
+
+    def d_npv(rate):
+        return sum(-t * a / (1 + rate) ** (t + 1) for a, t in zip(amounts, years))
+
+    rate = guess
+    for _ in range(max_iterations):
+        derivative = d_npv(rate)
+        if derivative == 0:
+            break
+        step = npv(rate) / derivative
+        rate -= step
+        if rate <= -1:
+            break
+        if abs(step) < tolerance:
+            return rate
+
+    # Newton diverged; fall back to bisection on a bracketing interval
+    low, high = -0.9999, 10.0
+    if npv(low) * npv(high) > 0:
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        if npv(low) * npv(mid) <= 0:
+            high = mid
+        else:
+            low = mid
+        if high - low < tolerance:
+            return mid
+    return None
+
+
+def history_rows(queryset):
+    """``values_list`` of (investment_id, date, value as float), cast in the database to skip Decimal."""
+    return (
+        queryset.annotate(value_float=Cast('value', FloatField()))
+        .order_by('investment_id', 'date')
+        .values_list('investment_id', 'date', 'value_float')
+    )
+
+
+def to_arrays(rows):
+    """Split (investment_id, date, value) rows into id, datetime64[D] and float64 arrays."""
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[D]'), np.empty(0)
+    ids, dates, values = zip(*rows)
+    return np.array(ids, dtype=np.int64), np.array(dates, dtype='datetime64[D]'), np.array(values, dtype=float)
+
+
+def _percent(fraction):
+    return None if fraction is None or not np.isfinite(fraction) else float(fraction) * 100
+
+
+def _rolling_returns(days, values):
+    """Latest, average, worst and best return over each window ending at every point."""
+    result = {}
+    for name, window in ROLLING_WINDOWS.items():
+        ends = np.flatnonzero(days - window >= days[0])
+        if not len(ends):
+            result[name] = None
+            continue
+        # Last point on or before the window start, for every window end
+        starts = np.searchsorted(days, days[ends] - window, side='right') - 1
+        returns = values[ends] / values[starts] - 1
+        result[name] = {
+            'latest': _percent(returns[-1]),
+            'average': _percent(returns.mean()),
+            'min': _percent(returns.min()),
+            'max': _percent(returns.max()),
+        }
+    return result
+
+
+def series_metrics(dates, values, invested=None, risk_free_rate=None):
+    """
+    Metrics for one series of ``dates`` (datetime64[D], ascending) and
+    ``values``. ``invested`` is the amount put in at the first date for XIRR
+    (defaults to the first value). Percentages are in percent; None where a
+    metric needs more history than there is.
+    """
+    if not len(values):
+        return None
+    if risk_free_rate is None:
+        risk_free_rate = getattr(settings, 'RISK_FREE_RATE', 0.0)
+
+    start_date, end_date = dates[0].item(), dates[-1].item()
+    days = (dates - dates[0]).astype(np.int64)
+    start_value, end_value = float(values[0]), float(values[-1])
+    years = days[-1] / DAYS_PER_YEAR
+    invested = start_value if invested is None else float(invested)
+
+    metrics = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'points': len(values),
+        'start_value': start_value,
+        'end_value': end_value,
+        'absolute_return': end_value - invested,
+        'total_return': _percent(end_value / invested - 1) if invested else None,
+        'cagr': None,
+        'xirr': None,
+        'volatility': None,
+        'sharpe': None,
+        'max_drawdown': None,
+        'max_drawdown_start': None,
+        'max_drawdown_end': None,
+        'day_change': None,
+        'day_change_percentage': None,
+        'rolling_returns': _rolling_returns(days, values),
+    }
+    if len(values) < 2 or days[-1] <= 0 or start_value <= 0:
+        return metrics
+
+    metrics['cagr'] = _percent((end_value / start_value) ** (1 / years) - 1)
+    metrics['xirr'] = _percent(xirr([(start_date, -invested), (end_date, end_value)]))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values[1:] / values[:-1] - 1
+    returns = returns[np.isfinite(returns)]
+    # Annualize by the observed sampling rate, so daily and trading-day series both work
+    periods_per_year = (len(values) - 1) / years
+    if len(returns) > 1:
+        volatility = returns.std(ddof=1) * np.sqrt(periods_per_year)
+        metrics['volatility'] = _percent(volatility)
+        if volatility > 0:
+            metrics['sharpe'] = float((returns.mean() * periods_per_year - risk_free_rate) / volatility)
+
+    peaks = np.maximum.accumulate(values)
+    drawdowns = values / peaks - 1
+    trough = int(drawdowns.argmin())
+    if drawdowns[trough] < 0:
+        peak = int(values[:trough + 1].argmax())
+        metrics['max_drawdown'] = _percent(drawdowns[trough])
+        metrics['max_drawdown_start'] = dates[peak].item()
+        metrics['max_drawdown_end'] = dates[trough].item()
+    else:
+        metrics['max_drawdown'] = 0.0
+
+    previous = float(values[-2])
+    metrics['day_change'] = end_value - previous
+    metrics['day_change_percentage'] = _percent(end_value / previous - 1) if previous else None
+    return metrics
+
+
+def record_history_change(investment_ids):
+    """
+    Give ``investment_ids`` a new history version once the transaction
+    commits, which retires their memoized metrics.
+    """
+    investment_ids = set(investment_ids)
+    if investment_ids:
+        transaction.on_commit(partial(_stamp_history, investment_ids))
+
+
+def _stamp_history(investment_ids):
+    # A fresh stamp rather than a counter, so the whole batch is one cache call
+    stamp = time.time_ns()
+    cache.set_many({HISTORY_VERSION_KEY.format(investment_id): stamp for investment_id in investment_ids}, None)
+
+
+def history_versions(investment_ids):
+    keys = {investment_id: HISTORY_VERSION_KEY.format(investment_id) for investment_id in investment_ids}
+    versions = cache.get_many(keys.values())
+    return {investment_id: versions.get(key) for investment_id, key in keys.items()}
+
+
+def metrics_key(investment_id, start, version, last_date, last_value, invested):
+    invested = None if invested is None else float(invested)
+    raw = f'{investment_id}:{start}:{version}:{last_date}:{float(last_value)!r}:{invested!r}'
+    return METRICS_KEY.format(hashlib.sha256(raw.encode()).hexdigest())
+
+
+def investment_metrics(investment, period, today=None):
+    """
+    Metrics for ``investment`` over ``period``, memoized per
+    (investment, period start, history version, last point).
+    """
+    start = period_start(period, today or timezone.localdate())
+    if packed.serves_reads():
+        # The whole series is one query either way, so read it up front
+        dates, paise = packed.read_series(investment.pk, start)
+        values = paise / packed.PAISE_PER_RUPEE
+        last = (dates[-1].item(), values[-1]) if len(dates) else None
+    else:
+        history = PerformanceHistory.objects.filter(investment=investment)
+        if start is not None:
+            history = history.filter(date__gte=start)
+        last = history.order_by('-date').values_list('date', 'value').first()
+        dates = None
+    if last is None:
+        return None
+    # A bounded period measures growth of the value at its start; MAX measures it against the amount invested
+    invested = investment.initial_value if start is None else None
+
+    version = cache.get(HISTORY_VERSION_KEY.format(investment.pk))
+    key = metrics_key(investment.pk, start, version, *last, invested)
+    metrics = cache.get(key)
+    if metrics is None:
+        if dates is None:
+            _, dates, values = to_arrays(list(history_rows(history)))
+        metrics = series_metrics(dates, values, invested=invested)
+        cache.set(key, metrics, METRICS_TIMEOUT)
+    return metrics
+
+
+def refresh_metrics(periods, investments=None, today=None, batch_size=METRICS_BATCH_SIZE):
+    """
+    Compute and memoize metrics for every investment and period. History is
+    read with one query per batch of ``batch_size`` investments and turned
+    into arrays one investment at a time. Returns the number computed.
+    """
+    today = today or timezone.localdate()
+    if investments is None:
+        investments = Investment.objects.all()
+    investments = investments.order_by('pk').values_list('pk', 'initial_value')
+
+    count = 0
+    batch = []
+    for row in investments.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            count += _refresh_batch(batch, periods, today)
+            batch = []
+    if batch:
+        count += _refresh_batch(batch, periods, today)
+    return count
+
+
+def _batch_series(investment_ids):
+    """``(investment_id, dates, values)`` for each of ``investment_ids`` with history, read in one query."""
+    if packed.serves_reads():
+        for investment_id, (dates, paise) in packed.read_many(investment_ids).items():
+            yield investment_id, dates, paise / packed.PAISE_PER_RUPEE
+        return
+    rows = history_rows(PerformanceHistory.objects.filter(investment_id__in=investment_ids))
+    # Rows are ordered by investment, so only one series is held as tuples at a time
+    for investment_id, series in groupby(rows.iterator(chunk_size=10000), key=itemgetter(0)):
+        _, dates, values = to_arrays(list(series))
+        yield investment_id, dates, values
+
+
+def _refresh_batch(investments, periods, today):
+    initial_values = dict(investments)
+    versions = history_versions(initial_values)
+    memos = {}
+    for investment_id, dates, values in _batch_series(list(initial_values)):
+        for period in periods:
+            start = period_start(period, today)
+            offset = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start)))
+            if offset == len(dates):
+                continue
+            invested = initial_values[investment_id] if start is None else None
+            key = metrics_key(investment_id, start, versions[investment_id], dates[-1].item(), values[-1], invested)
+            memos[key] = series_metrics(dates[offset:], values[offset:], invested=invested)
+    cache.set_many(memos, METRICS_TIMEOUT)
+    return len(memos)
@@ -0,0 +1,117 @@
+"""
+Async versions of the read endpoints, mounted under ``/api/async/``.
+
+Served from ``fundsight.asgi`` (e.g. ``uvicorn.workers.UvicornWorker``),
+these views await the database instead of holding a worker thread, so slow
+queries no longer saturate the worker pool. Dispatch, authentication and
+permissions go through adrf; queries use Django's async ORM (``aget``,
+``async for``).
+
+Django runs every async ORM call of a request on one shared thread, so
+awaiting several queries with ``asyncio.gather`` still runs them one after
+another. ``gather_queries`` runs independent units of work on separate
+executor threads instead, each with its own database connection.
+"""
+import asyncio
+
+from adrf import viewsets
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .analytics import investment_metrics
+from .cache import cached_response
+from .fastpath import RowSerializer
+from .models import Fund, Investment
+from .serializers import InvestmentMetricsSerializer, MetricsQuerySerializer
+from .views import FundEndpointMixin, InvestmentEndpointMixin
+
+
+def _on_own_connection(func):
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            # Executor threads outlive the request, so request_finished never closes their connections
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """Run the blocking ``funcs`` concurrently and return their results in order."""
+    return await asyncio.gather(*(
+        sync_to_async(_on_own_connection(func), thread_sensitive=False)() for func in funcs
+    ))
+
+
+class AsyncInvestmentViewSet(InvestmentEndpointMixin, viewsets.GenericViewSet):
+    @cached_response('investments')
+    async def list(self, request, *args, **kwargs):
+        columnar = self.columnar_series()
+        rows = RowSerializer(self.get_serializer())
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        # Cursor pagination reads its page synchronously
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is None:
+            return Response(await rows.aserialize([row async for row in queryset], columnar))
+        return self.get_paginated_response(await rows.aserialize(page, columnar))
+
+    @cached_response('investments')
+    async def retrieve(self, request, *args, **kwargs):
+        columnar = self.columnar_series()
+        rows = RowSerializer(self.get_serializer())
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            row = await rows.values(self.get_queryset()).aget(**{self.lookup_field: lookup})
+        except Investment.DoesNotExist:
+            raise Http404
+        self.check_object_permissions(request, row)
+        return Response((await rows.aserialize([row], columnar))[0])
+
+    @action(detail=True, methods=['get'])
+    @cached_response('investments', 'funds')
+    async def overview(self, request, pk=None):
+        """The investment, the fund list and the investment's metrics, queried concurrently."""
+        params = MetricsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        period = params.validated_data['period']
+        columnar = self.columnar_series()
+        rows = RowSerializer(self.get_serializer())
+        today = timezone.localdate()
+
+        def investment():
+            row = get_object_or_404(rows.values(self.get_queryset()), pk=pk)
+            return rows.serialize([row], columnar)[0]
+
+        def funds():
+            return list(Fund.objects.order_by('pk').values('id', 'name', 'color'))
+
+        def metrics():
+            investment = get_object_or_404(Investment.objects.only('pk', 'initial_value'), pk=pk)
+            return investment_metrics(investment, period, today)
+
+        investment, funds, metrics = await gather_queries(investment, funds, metrics)
+        return Response({
+            'investment': investment,
+            'funds': funds,
+            'metrics': None if metrics is None else InvestmentMetricsSerializer({'period': period, **metrics}).data,
+        })
+
+
+class AsyncFundViewSet(FundEndpointMixin, viewsets.GenericViewSet):
+    @cached_response('funds')
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is None:
+            return Response(self.get_serializer([fund async for fund in queryset], many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @cached_response('funds')
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
@@ -3,8 +3,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth import login, logout
 from django.middleware.csrf import get_token
+from .authentication import CachedTokenAuthentication
 from .serializers import LoginSerializer, UserSerializer
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
 import logging
@@ -15,23 +16,24 @@ class LoginView(APIView):
     permission_classes = [AllowAny]  # Allow any user to access login endpoint
     
     def post(self, request):
-        logger.debug(f"Login attempt with data: {request.data}")
+        # Lazy %-formatting, and never the password or token
+        logger.debug("Login attempt for %s", request.data.get('email'))
         serializer = LoginSerializer(data=request.data, context={'request': request})
         
         if serializer.is_valid():
             user = serializer.validated_data['user']
             login(request, user)
             token, created = Token.objects.get_or_create(user=user)
-            logger.debug(f"Login successful for user: {user.username}, token: {token.key}")
+            logger.debug("Login successful for user: %s", user.username)
             return Response({
                 'user': UserSerializer(user).data,
                 'token': token.key
             })
-        logger.error(f"Login failed: {serializer.errors}")
+        logger.error("Login failed: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LogoutView(APIView):
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [SessionAuthentication, CachedTokenAuthentication]
     
     def post(self, request):
         if request.user.is_authenticated:
@@ -41,7 +43,7 @@ class LogoutView(APIView):
         return Response({"detail": "Successfully logged out."})
 
 class UserView(APIView):
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [SessionAuthentication, CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
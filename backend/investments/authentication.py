@@ -0,0 +1,61 @@
+"""
+Authentication on the request hot path.
+
+``CachedTokenAuthentication`` keeps each token's user in the cache for
+``TOKEN_CACHE_TIMEOUT`` seconds, so authenticated requests skip the
+Token + User query. Deleting a token (logout) or saving its user drops the
+entry; with a per-process cache other workers notice within the timeout.
+
+``EmailBackend`` logs users in by email with a single query on the indexed
+``auth_user.email`` column, instead of looking the user up by email and then
+again by username.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth-token:{}'
+
+UserModel = get_user_model()
+
+
+def token_cache_key(key):
+    # Hashed so the cache does not hold usable credentials in its key space
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_tokens(*keys):
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        timeout = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300)
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key) if timeout else None
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        if timeout:
+            cache.set(cache_key, (user, token), timeout)
+        return user, token
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        # Email is not unique on auth_user, so an address shared by two accounts logs in neither
+        users = list(UserModel._default_manager.filter(email=email)[:2])
+        if len(users) != 1:
+            # Hash anyway, so response times do not reveal which addresses exist
+            UserModel().set_password(password)
+            return None
+        user = users[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,130 @@
+"""
+Micro and HTTP benchmarks for the API, used by the ``benchmark_api`` command.
+
+Every benchmark returns a dict of plain numbers so results can be written as
+JSON and compared between runs.
+"""
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+def summarize(timings_ms, **extra):
+    timings_ms = sorted(timings_ms)
+    count = len(timings_ms)
+    return {
+        'runs': count,
+        'mean_ms': round(statistics.fmean(timings_ms), 3),
+        'p50_ms': round(statistics.median(timings_ms), 3),
+        'p90_ms': round(timings_ms[max(int(count * 0.9) - 1, 0)], 3),
+        'p99_ms': round(timings_ms[max(int(count * 0.99) - 1, 0)], 3),
+        **extra,
+    }
+
+
+def time_callable(func, iterations, warmup=2):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def benchmark_serializer(serializer_class, instances, iterations):
+    """Time rendering ``instances`` (already fetched and prefetched) with ``serializer_class``."""
+    timings = time_callable(lambda: serializer_class(instances, many=True).data, iterations)
+    result = summarize(timings, rows=len(instances))
+    result['rows_per_sec'] = round(len(instances) / (result['p50_ms'] / 1000), 1) if result['p50_ms'] else None
+    return result
+
+
+def benchmark_request(client, method, path, iterations, **kwargs):
+    """Time a request through the full Django stack in-process and count its queries."""
+    call = getattr(client, method)
+    # With DEBUG on, earlier runs may have filled the capped query log, which would make the count 0
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = call(path, **kwargs)
+    timings = time_callable(lambda: call(path, **kwargs), iterations)
+    return summarize(timings, status=response.status_code, queries=len(queries), bytes=len(response.content))
+
+
+def benchmark_authentication(authentication, request, iterations):
+    """Time ``authentication.authenticate(request)`` once warm and count the queries it makes per call."""
+    authentication.authenticate(request)
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        authentication.authenticate(request)
+    timings = time_callable(lambda: authentication.authenticate(request), iterations)
+    return summarize(timings, queries=len(queries))
+
+
+def load_test(base_url, path, concurrency, duration, headers=None):
+    """
+    Hit ``base_url + path`` from ``concurrency`` keep-alive connections for
+    ``duration`` seconds and report latency percentiles and throughput.
+    """
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    full_path = url.path.rstrip('/') + path
+    timings, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        conn = connection_class(url.hostname, url.port)
+        local_timings, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', full_path, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = connection_class(url.hostname, url.port)
+                local_errors += 1
+                continue
+            local_timings.append((time.perf_counter() - started) * 1000)
+        with lock:
+            timings.extend(local_timings)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not timings:
+        return {'concurrency': concurrency, 'errors': sum(errors), 'requests': 0}
+    return summarize(
+        timings,
+        concurrency=concurrency,
+        requests=len(timings),
+        errors=sum(errors),
+        requests_per_sec=round(len(timings) / duration, 1),
+    )
+
+
+def compare(previous, current):
+    """
+    Yield ``(name, metric, before, after, change %)`` for p50 timings and
+    load test throughput present in both runs.
+    """
+    for name, result in current.items():
+        for metric in ('p50_ms', 'requests_per_sec'):
+            before = previous.get(name, {}).get(metric)
+            after = result.get(metric)
+            if before and after is not None:
+                yield name, metric, before, after, (after - before) / before * 100
@@ -0,0 +1,176 @@
+"""
+Admin changelists for tables with millions of rows.
+
+Django's changelist counts the filtered queryset exactly, pages with
+``OFFSET``, lists every related row as a filter choice, and finds the
+``date_hierarchy`` years with a ``DISTINCT`` over the whole table. Each of
+those reads every row. ``LargeTableAdmin`` swaps them for:
+
+* ``EstimatedCountPaginator``: the planner's row estimate on PostgreSQL
+  (``EXPLAIN``), counted exactly only when the estimate is small.
+* ``CursorChangeList``: pages continue after the last primary key shown
+  (``?after=``), so page 10,000 costs what page 1 does. Sorting by a column
+  falls back to numbered pages.
+* ``RelatedIdFilter``: filter on a foreign key by typing its id.
+* ``SkipScanQuerySet``: ``date_hierarchy`` buckets found with one indexed
+  ``MIN`` per year, month or day present, rather than a scan.
+"""
+import json
+from datetime import date
+
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Min, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'after'
+
+# Below this estimate the count is exact, which is cheap for that few rows
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for ``queryset`` on PostgreSQL, or None elsewhere."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class SkipScanQuerySet(QuerySet):
+    def dates(self, field_name, kind, order='ASC'):
+        """
+        The distinct ``kind`` buckets of ``field_name``, found by repeatedly
+        asking for the first date at or after the next bucket. Each probe is
+        one index lookup, so this costs one query per bucket present.
+        """
+        buckets = []
+        queryset = self
+        while (first := queryset.aggregate(first=Min(field_name))['first']) is not None:
+            if kind == 'year':
+                bucket, following = date(first.year, 1, 1), date(first.year + 1, 1, 1)
+            elif kind == 'month':
+                bucket = date(first.year, first.month, 1)
+                following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+            else:
+                bucket = following = first
+            buckets.append(bucket)
+            lookup = f'{field_name}__gt' if kind == 'day' else f'{field_name}__gte'
+            queryset = self.filter(**{lookup: following})
+        return buckets if order == 'ASC' else buckets[::-1]
+
+
+class CursorChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET[CURSOR_VAR])
+        except (KeyError, ValueError):
+            self.cursor = None
+        self.cursor_paginated = False
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        # Filter, search and sort links start again from the first page
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        self.cursor_paginated = True
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+
+        queryset = self.queryset.order_by('-pk')
+        if self.cursor is not None:
+            queryset = queryset.filter(pk__lt=self.cursor)
+        self.result_list = queryset[:self.list_per_page]
+        rows = list(self.result_list)
+        if len(rows) == self.list_per_page and queryset.filter(pk__lt=rows[-1].pk).exists():
+            self.next_cursor = rows[-1].pk
+        self.multi_page = self.cursor is not None or self.next_cursor is not None
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def first_page_url(self):
+        return self.get_query_string()
+
+
+class RelatedIdFilter(admin.SimpleListFilter):
+    """
+    Filter on the foreign key ``field_name`` by its id, typed into a box,
+    instead of Django's list of every related row.
+    """
+    template = 'admin/investments/related_id_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}_id'
+        super().__init__(request, params, model, model_admin)
+        self.related_model = model._meta.get_field(self.field_name).related_model
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{self.parameter_name: int(value)})
+        return queryset
+
+    def selected(self):
+        value = self.value()
+        if value and value.isdigit():
+            return self.related_model.objects.filter(pk=int(value)).first()
+        return None
+
+    def choices(self, changelist):
+        yield {
+            'parameter_name': self.parameter_name,
+            'value': self.value() or '',
+            'selected': self.selected(),
+            'clear_url': changelist.get_query_string(remove=[self.parameter_name]),
+            # Other filters, search and ordering, resubmitted with the typed id
+            'query_parts': [
+                (key, value) for key, value in changelist.params.items() if key != self.parameter_name
+            ],
+        }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return SkipScanQuerySet(model=queryset.model, query=queryset.query.chain(), using=queryset.db)
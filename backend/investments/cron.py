@@ -0,0 +1,70 @@
+"""
+Five-field cron expressions (minute hour day-of-month month day-of-week) for
+the job scheduler.
+
+Fields accept ``*``, numbers, ``a-b`` ranges, ``,`` lists and ``/step``.
+Day of week runs 0-6 from Sunday, and 7 is Sunday too. As in cron, when both
+day fields are restricted a day matching either one fires.
+"""
+from datetime import timedelta
+
+FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7)]
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        expression, _, step = part.partition('/')
+        if expression == '*':
+            start, end = low, high
+        elif '-' in expression:
+            start, end = (int(value) for value in expression.split('-', 1))
+        else:
+            start = end = int(expression)
+            if step:
+                end = high
+        step = int(step) if step else 1
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f'{part!r} is outside {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != len(FIELDS):
+            raise ValueError(f'{expression!r}: expected {len(FIELDS)} fields')
+        self.expression = expression
+        fields = {name: _parse_field(part, low, high) for part, (name, low, high) in zip(parts, FIELDS)}
+        self.minutes, self.hours, self.days, self.months = (
+            fields['minute'], fields['hour'], fields['day'], fields['month']
+        )
+        self.weekdays = {day % 7 for day in fields['weekday']}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def __repr__(self):
+        return f'CronSchedule({self.expression!r})'
+
+    def _day_matches(self, moment):
+        in_days = moment.day in self.days
+        # isoweekday() is 1 (Monday) to 7 (Sunday)
+        in_weekdays = moment.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def matches(self, moment):
+        return (
+            moment.minute in self.minutes and moment.hour in self.hours
+            and moment.month in self.months and self._day_matches(moment)
+        )
+
+    def fire_times(self, after, until):
+        """Minutes in ``(after, until]`` the schedule fires at, oldest first."""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while moment <= until:
+            if self.matches(moment):
+                yield moment
+            moment += timedelta(minutes=1)
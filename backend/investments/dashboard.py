@@ -0,0 +1,83 @@
+"""
+The ``/api/dashboard/`` bootstrap payload: the user, a page of investments
+with downsampled histories, the fund list and the portfolio totals, which the
+frontend used to fetch with one request after another.
+
+Investments are cursor paginated like ``/api/investments/`` (``next`` links
+to the following page), and histories default to the last year, so the
+payload stays bounded however many investors and days there are. It costs
+seven queries: one each for the page of investments, their sector
+allocations, their history, funds and fund holdings, and two for the
+portfolio totals, which cover every investor. History past the first
+``HISTORY_CHUNK_SIZE`` points takes one more query per chunk.
+
+History is read in (investment, date) keyset chunks with ``export_rows``, so
+it needs no server-side cursor, which the production profile disables for
+PgBouncer. It is downsampled one investor at a time, so only one chunk and
+one investor's series are held in memory.
+"""
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from .aggregates import portfolio_totals, sector_totals
+from .export import export_rows
+from .fastpath import RowSerializer
+from .models import Fund, FundStockHolding, Investment
+from .serializers import (
+    InvestmentSerializer, PerformanceHistorySerializer, PortfolioAggregateSerializer, UserSerializer,
+)
+from .timeseries import lttb, period_start
+
+HISTORY_CHUNK_SIZE = 10000
+
+
+def downsampled_histories(investments, start, points):
+    """``{investment id: [(date, value), ...]}`` with each series reduced to ``points`` with LTTB."""
+    rows = export_rows(start=start, investments=investments, chunk_size=HISTORY_CHUNK_SIZE)
+    return {
+        investment_id: lttb([(day, value) for _, day, value in series], points)
+        for investment_id, series in groupby(rows, key=itemgetter(0))
+    }
+
+
+def fund_rows(funds):
+    """What FundSerializer renders for ``funds``, built from column tuples (a holding's stock renders as its name)."""
+    holdings = defaultdict(list)
+    for fund_id, stock, weight in (
+        FundStockHolding.objects.filter(fund__in=funds).order_by('pk').values_list('fund_id', 'stock__name', 'weight')
+    ):
+        holdings[fund_id].append({'stock': stock, 'weight': weight})
+    return [
+        {'id': fund_id, 'name': name, 'color': color, 'holdings': holdings[fund_id]}
+        for fund_id, name, color in funds.values_list('id', 'name', 'color')
+    ]
+
+
+def investment_rows():
+    """The RowSerializer for dashboard investments, whose history is downsampled separately."""
+    serializer = InvestmentSerializer()
+    serializer.fields.pop('performance_history')
+    return RowSerializer(serializer)
+
+
+def dashboard_data(user, rows, page, period, points, series, today):
+    """The payload for ``page``, a page of ``rows.values()`` dicts."""
+    columnar = series == 'columnar'
+    items = rows.serialize(page, columnar)
+    histories = downsampled_histories([item['id'] for item in items], period_start(period, today), points)
+    history = RowSerializer(PerformanceHistorySerializer())
+    for item in items:
+        item['performance_history'] = history.render(histories.get(item['id'], []), columnar)
+
+    investments = Investment.objects.all()
+    return {
+        'user': UserSerializer(user).data,
+        'portfolio': PortfolioAggregateSerializer({
+            **portfolio_totals(investments),
+            'sectors': sector_totals(investments),
+        }).data,
+        'period': period,
+        'investments': [{name: item[name] for name in InvestmentSerializer.Meta.fields} for item in items],
+        'funds': fund_rows(Fund.objects.order_by('pk')),
+    }
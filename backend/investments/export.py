@@ -0,0 +1,139 @@
+"""
+Streaming PerformanceHistory exports as CSV or Parquet.
+
+Rows are read in keyset-paginated chunks, each query continuing after the
+last (investment, date) of the one before, and written out one chunk at a
+time. Memory stays flat no matter how many rows are exported, without
+relying on a server-side cursor, which the production profile disables for
+PgBouncer. The CSV uses the same
+``investment,date,value`` layout ``ingest_nav`` reads, so an export can be
+loaded straight back in. Parquet is written with one row group per chunk.
+"""
+import csv
+import io
+
+from django.db.models import Q
+
+from .ingest import chunked
+from .models import PerformanceHistory
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is in requirements.txt
+    pa = pq = None
+
+EXPORT_COLUMNS = ['investment', 'date', 'value']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+class ExportError(Exception):
+    pass
+
+
+def export_rows(start=None, end=None, investments=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate ``(investment_id, date, value)`` in (investment, date) order, ``chunk_size`` rows per query."""
+    history = PerformanceHistory.objects.all()
+    if start is not None:
+        history = history.filter(date__gte=start)
+    if end is not None:
+        history = history.filter(date__lte=end)
+    if investments is not None:
+        history = history.filter(investment__in=investments)
+    history = history.order_by('investment_id', 'date').values_list('investment_id', 'date', 'value')
+
+    chunk = list(history[:chunk_size])
+    while chunk:
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        investment_id, day, _ = chunk[-1]
+        # (investment, date) > the last row; investment_id >= is the part the unique index seeks on
+        chunk = list(
+            history.filter(Q(investment_id__gt=investment_id) | Q(date__gt=day), investment_id__gte=investment_id)
+            [:chunk_size]
+        )
+
+
+def csv_chunks(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield CSV text, the header first and then one string per ``chunk_size`` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in chunked(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+class _Sink:
+    """Write-only file object for ParquetWriter that hands its bytes over after each row group."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_schema():
+    return pa.schema([
+        ('investment', pa.int64()),
+        ('date', pa.date32()),
+        ('value', pa.decimal128(12, 2)),
+    ])
+
+
+def parquet_chunks(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield Parquet file bytes, one row group of up to ``chunk_size`` rows at a time."""
+    schema = parquet_schema()
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for chunk in chunked(rows, chunk_size):
+            investment_ids, dates, values = zip(*chunk)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(investment_ids, pa.int64()), pa.array(dates, pa.date32()),
+                 pa.array(values, pa.decimal128(12, 2))],
+                schema=schema,
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    # The footer is written on close
+    yield sink.take()
+
+
+def export_chunks(file_format, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Chunks of the export file. Raises ExportError up front, before anything is streamed."""
+    if file_format == 'parquet':
+        if pa is None:
+            raise ExportError('Parquet export requires pyarrow.')
+        return parquet_chunks(rows, chunk_size)
+    return csv_chunks(rows, chunk_size)
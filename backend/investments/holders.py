@@ -0,0 +1,133 @@
+"""
+Reverse index from stocks to the funds that hold them.
+
+``FundStockHolding`` is indexed by fund, so "which funds hold this stock"
+and an investor's exposure to a stock would otherwise scan every holding.
+``StockHoldersIndex`` keeps ``stock -> {fund: weight}`` in memory per worker
+and answers in O(holders).
+
+It is stamped with the version of the holdings change log in ``overlap.py``.
+Each lookup compares that version with the shared one and replays only the
+funds changed since, falling back to a rebuild when the log has gaps.
+"""
+import threading
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import FundStockHolding, InvestmentHolding
+from .overlap import CHANGE_KEY, MAX_INCREMENTAL_FUNDS, VERSION_KEY
+
+
+class StockHoldersIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        # stock id -> {fund id: weight}, and the same edges by fund to replace a fund's holdings
+        self.holders = {}
+        self.holdings = {}
+        self.totals = {}
+
+    def refresh(self):
+        current = cache.get(VERSION_KEY, 0)
+        with self._lock:
+            if self.version is None:
+                self._rebuild(current)
+            elif current != self.version:
+                self._apply_changes(current)
+
+    def _rebuild(self, version):
+        holders, holdings = {}, {}
+        for fund_id, stock_id, weight in FundStockHolding.objects.values_list('fund_id', 'stock_id', 'weight'):
+            holders.setdefault(stock_id, {})[fund_id] = weight
+            holdings.setdefault(fund_id, {})[stock_id] = weight
+        self.holders, self.holdings = holders, holdings
+        self.totals = {fund_id: sum(stocks.values()) for fund_id, stocks in holdings.items()}
+        self.version = version
+
+    def _apply_changes(self, version):
+        first = self.version + 1
+        if version < first or version - first + 1 > MAX_INCREMENTAL_FUNDS:
+            return self._rebuild(version)
+
+        keys = [CHANGE_KEY.format(v) for v in range(first, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            # Part of the log was evicted
+            return self._rebuild(version)
+
+        fund_ids = set(changes.values())
+        rows = FundStockHolding.objects.filter(fund_id__in=fund_ids).values_list('fund_id', 'stock_id', 'weight')
+        for fund_id in fund_ids:
+            self.totals.pop(fund_id, None)
+            for stock_id in self.holdings.pop(fund_id, {}):
+                self.holders[stock_id].pop(fund_id, None)
+                if not self.holders[stock_id]:
+                    del self.holders[stock_id]
+        for fund_id, stock_id, weight in rows:
+            self.holders.setdefault(stock_id, {})[fund_id] = weight
+            self.holdings.setdefault(fund_id, {})[stock_id] = weight
+            self.totals[fund_id] = self.totals.get(fund_id, 0) + weight
+        self.version = version
+
+    def funds_holding(self, stock_id):
+        """``{fund id: weight}`` for every fund holding ``stock_id``."""
+        self.refresh()
+        with self._lock:
+            return dict(self.holders.get(stock_id, {}))
+
+    def exposure_weights(self, stock_id, fund_ids=None):
+        """
+        ``{fund id: (weight, fund's total weight)}`` for the funds holding
+        ``stock_id``, optionally only those in ``fund_ids``. The stock's
+        share of a fund is ``weight / total``, as in ``sectors.py``.
+        """
+        self.refresh()
+        with self._lock:
+            holders = self.holders.get(stock_id, {})
+            if fund_ids is not None:
+                holders = {fund_id: holders[fund_id] for fund_id in fund_ids if fund_id in holders}
+            return {fund_id: (weight, self.totals[fund_id]) for fund_id, weight in holders.items()}
+
+
+holders_index = StockHoldersIndex()
+
+
+def investment_exposure(investment_id, stock_id):
+    """
+    How much of an investor's priced holdings sits in ``stock_id``: each
+    holding's value (units x NAV) times the stock's share of the fund. Costs
+    one query for the investor's holdings; the holders come from the index.
+    """
+    holdings = list(
+        InvestmentHolding.objects.filter(investment_id=investment_id, fund__nav__isnull=False)
+        .values_list('fund_id', 'fund__name', 'units', 'fund__nav')
+    )
+    weights = holders_index.exposure_weights(stock_id, [fund_id for fund_id, _, _, _ in holdings])
+
+    portfolio_value = sum((units * nav for _, _, units, nav in holdings), Decimal(0))
+    funds = []
+    for fund_id, name, units, nav in holdings:
+        if fund_id not in weights:
+            continue
+        weight, total = weights[fund_id]
+        if total <= 0:
+            continue
+        share = Decimal(weight) / Decimal(total)
+        funds.append({
+            'id': fund_id,
+            'name': name,
+            'weight': weight,
+            'share': share * 100,
+            'value': units * nav,
+            'amount': units * nav * share,
+        })
+    funds.sort(key=lambda fund: (-fund['amount'], fund['id']))
+
+    amount = sum((fund['amount'] for fund in funds), Decimal(0))
+    return {
+        'portfolio_value': portfolio_value,
+        'amount': amount,
+        'percentage': amount / portfolio_value * 100 if portfolio_value else Decimal(0),
+        'funds': funds,
+    }
@@ -0,0 +1,200 @@
+import csv
+import gzip
+import io
+import sys
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import islice
+
+from django.db import connection, transaction
+
+from . import analytics
+from .models import Fund, FundNav, Investment, PerformanceHistory
+
+AMFI_DATE_FORMAT = '%d-%b-%Y'  # e.g. 17-Oct-2024
+
+
+def open_source(path):
+    """Open ``path`` for streaming text reads; ``-`` is stdin and ``.gz`` is decompressed on the fly."""
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value, date_format=None):
+    # NAV files repeat the same few dates millions of times, so parsing is memoized
+    if date_format is None:
+        return date.fromisoformat(value)
+    return datetime.strptime(value, date_format).date()
+
+
+def parse_value(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def read_csv(stream, date_format=None, id_column='investment'):
+    """
+    Yield ``(id, date, value)`` from a CSV with an ``investment,date,value``
+    header, or ``fund,date,value`` with ``id_column='fund'``.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        value = parse_value(row['value'])
+        if value is None:
+            continue
+        yield int(row[id_column]), parse_date(row['date'], date_format), value
+
+
+def read_amfi(stream, scheme_map):
+    """
+    Yield ``(investment_id, date, value)`` from an AMFI ``NAVAll.txt`` dump.
+
+    AMFI publishes one NAV per scheme, so ``scheme_map`` maps scheme codes to
+    the investment ids whose history should receive that NAV. Section
+    headings, blank lines and "N.A." NAVs are skipped.
+    """
+    for line in stream:
+        parts = line.rstrip('\r\n').split(';')
+        if len(parts) != 6 or not parts[0].isdigit():
+            continue
+        investment_ids = scheme_map.get(parts[0])
+        if not investment_ids:
+            continue
+        value = parse_value(parts[4])
+        if value is None:
+            continue
+        day = parse_date(parts[5], AMFI_DATE_FORMAT)
+        for investment_id in investment_ids:
+            yield investment_id, day, value
+
+
+def read_scheme_map(path, id_column='investment'):
+    """Load a ``scheme_code,investment`` (or ``scheme_code,fund``) CSV into ``{scheme_code: [id, ...]}``."""
+    scheme_map = {}
+    with open_source(path) as stream:
+        for row in csv.DictReader(stream):
+            scheme_map.setdefault(row['scheme_code'], []).append(int(row[id_column]))
+    return scheme_map
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def dedupe(chunk):
+    """Keep the last value for each ``(investment, date)`` within a chunk."""
+    return list({(investment_id, day): (investment_id, day, value) for investment_id, day, value in chunk}.values())
+
+
+class BulkLoader:
+    """
+    Portable upsert built on ``bulk_create(update_conflicts=True)`` against the
+    ``(investment, date)`` unique constraint.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+
+    def load(self, chunk):
+        chunk = dedupe(chunk)
+        investment_ids = {investment_id for investment_id, _, _ in chunk}
+        known = set(Investment.objects.filter(pk__in=investment_ids).values_list('pk', flat=True))
+        rows = [
+            PerformanceHistory(investment_id=investment_id, date=day, value=value)
+            for investment_id, day, value in chunk
+            if investment_id in known
+        ]
+        PerformanceHistory.objects.bulk_create(
+            rows,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['investment', 'date'],
+            update_fields=['value'],
+        )
+        # bulk_create skips the signal that retires memoized metrics
+        analytics.record_history_change(known)
+        return len(rows)
+
+
+class CopyLoader:
+    """
+    PostgreSQL upsert: each chunk is streamed into a temporary staging table
+    with ``COPY`` and merged into PerformanceHistory with a single
+    ``INSERT ... ON CONFLICT``. Rows for unknown investments are dropped by
+    the join.
+    """
+
+    staging_table = 'nav_staging'
+
+    def load(self, chunk):
+        chunk = dedupe(chunk)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for investment_id, day, value in chunk:
+            writer.writerow((investment_id, day.isoformat(), value))
+        buffer.seek(0)
+
+        table = PerformanceHistory._meta.db_table
+        investments = Investment._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {self.staging_table} '
+                '(investment_id bigint, date date, value numeric(12, 2)) ON COMMIT DELETE ROWS'
+            )
+            # The surrounding transaction may be an outer one that has not committed yet
+            cursor.execute(f'TRUNCATE {self.staging_table}')
+            copy_from(
+                cursor, f'COPY {self.staging_table} (investment_id, date, value) FROM STDIN WITH (FORMAT csv)', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (investment_id, date, value) '
+                f'SELECT s.investment_id, s.date, s.value FROM {self.staging_table} AS s '
+                f'JOIN {investments} AS i ON i.id = s.investment_id '
+                'ON CONFLICT (investment_id, date) DO UPDATE SET value = EXCLUDED.value'
+            )
+            analytics.record_history_change({investment_id for investment_id, _, _ in chunk})
+            return cursor.rowcount
+
+
+class FundNavLoader:
+    """Upserts ``(fund_id, date, nav)`` rows into FundNav on the ``(fund, date)`` unique constraint."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+
+    def load(self, chunk):
+        chunk = dedupe(chunk)
+        known = set(Fund.objects.filter(pk__in={fund_id for fund_id, _, _ in chunk}).values_list('pk', flat=True))
+        rows = [FundNav(fund_id=fund_id, date=day, nav=nav) for fund_id, day, nav in chunk if fund_id in known]
+        FundNav.objects.bulk_create(
+            rows,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['fund', 'date'],
+            update_fields=['nav'],
+        )
+        return len(rows)
+
+
+def copy_from(cursor, sql, buffer):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def default_loader():
+    if connection.vendor == 'postgresql':
+        return CopyLoader()
+    return BulkLoader()
@@ -0,0 +1,240 @@
+"""
+Database-backed background jobs, run by ``python manage.py run_workers``.
+
+A job is a row naming a registered task and its keyword arguments. Workers
+claim the oldest due job with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it (PostgreSQL), or with a conditional update otherwise
+(SQLite), so no broker is needed. A failed job is retried with exponential
+backoff until ``max_attempts``. A job whose worker died is requeued once its
+heartbeat is older than ``JOB_TIMEOUT``.
+
+Jobs enqueued with a ``key`` are idempotent. Enqueueing an existing key
+returns the existing job, so a scheduler that fires twice, or a fan-out that
+is retried, does not duplicate work.
+
+``Scheduler`` enqueues tasks on cron expressions from ``JOB_SCHEDULE``. The
+nightly refresh moves funds to their latest loaded NAV and fans out into one
+``refresh_investments`` job per chunk of investment ids, which the worker
+pool runs in parallel. Each chunk values its investors from their fund units
+(see valuation.py) before recomputing what derives from their history.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import refresh_metrics
+from .cron import CronSchedule
+from .ingest import chunked
+from .models import Investment, Job
+from .sectors import refresh_sector_allocations
+from .summary import refresh_current_values, refresh_summaries
+from .timeseries import PERIOD_MONTHS
+from .valuation import latest_nav_date, refresh_fund_navs, revalue
+
+logger = logging.getLogger(__name__)
+
+# Registered task functions by name; each is called as func(job, **job.payload)
+TASKS = {}
+
+
+def task(func):
+    TASKS[func.__name__] = func
+    return func
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(task_name, key=None, run_at=None, max_attempts=None, **payload):
+    """Queue ``task_name(**payload)``; with a ``key`` that was enqueued before, return that job instead."""
+    if task_name not in TASKS:
+        raise ValueError(f'Unknown task {task_name!r}')
+    fields = {
+        'task': task_name,
+        'payload': payload,
+        'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(key=key, defaults=fields)
+    return job
+
+
+def claim(worker):
+    """Mark the oldest due job as running for ``worker`` and return it, or None when nothing is due."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:1])
+        else:
+            candidates = list(due.values_list('pk', flat=True)[:10])
+        for pk in candidates:
+            # Conditional on still being queued, so workers racing without row locks cannot both win
+            claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns True when it succeeded."""
+    started = time.perf_counter()
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func(job, **job.payload)
+    except Exception:
+        now = timezone.now()
+        retry = job.attempts < job.max_attempts
+        logger.exception('Job %s (%s) failed on attempt %s of %s', job.pk, job.task, job.attempts, job.max_attempts)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_at=now + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)) if retry else job.run_at,
+            finished_at=None if retry else now,
+            locked_by='', locked_at=None,
+            last_error=traceback.format_exc(),
+        )
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), locked_by='', locked_at=None)
+    logger.info('Job %s (%s) done in %.1fs', job.pk, job.task, time.perf_counter() - started)
+    return True
+
+
+def requeue_stale(timeout=None):
+    """Requeue running jobs whose worker stopped sending heartbeats, or fail them when out of attempts."""
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=timeout or settings.JOB_TIMEOUT)
+    )
+    error = 'Worker stopped responding'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', locked_at=None, last_error=error,
+    )
+    requeued = stale.update(status=Job.QUEUED, run_at=now, locked_by='', locked_at=None, last_error=error)
+    return requeued + failed
+
+
+class Worker:
+    """Claims and runs jobs one at a time until ``stop`` is set."""
+
+    def __init__(self, stop=None, poll_interval=None):
+        self.name = worker_name()
+        self.stop = stop or threading.Event()
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.current = None
+
+    def run_once(self):
+        """Run one due job; returns False when there was none."""
+        close_old_connections()
+        job = claim(self.name)
+        if job is None:
+            return False
+        self.current = job.pk
+        try:
+            run_job(job)
+        finally:
+            self.current = None
+            close_old_connections()
+        return True
+
+    def run(self, burst=False):
+        """Work until stopped, or with ``burst`` until no job is due."""
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(finished,), daemon=True)
+        heartbeat.start()
+        try:
+            while not self.stop.is_set():
+                if not self.run_once():
+                    if burst:
+                        break
+                    self.stop.wait(self.poll_interval)
+        finally:
+            finished.set()
+
+    def heartbeat(self, finished):
+        # Long jobs stay locked while this process is alive; see requeue_stale
+        interval = settings.JOB_TIMEOUT / 3
+        while not finished.wait(interval):
+            current = self.current
+            if current is not None:
+                Job.objects.filter(pk=current, status=Job.RUNNING, locked_by=self.name).update(
+                    locked_at=timezone.now()
+                )
+            close_old_connections()
+
+
+class Scheduler:
+    """Enqueues ``(cron expression, task, payload)`` entries when they come due."""
+
+    def __init__(self, entries=None, now=None):
+        entries = settings.JOB_SCHEDULE if entries is None else entries
+        self.entries = [(CronSchedule(expression), task_name, payload) for expression, task_name, payload in entries]
+        # Start from now: fire times missed while no scheduler was running are not caught up
+        self.last = now or timezone.localtime()
+
+    def tick(self, now=None):
+        """Enqueue everything due since the last tick; returns the jobs."""
+        now = now or timezone.localtime()
+        jobs = []
+        for schedule, task_name, payload in self.entries:
+            for moment in schedule.fire_times(self.last, now):
+                # The key makes schedulers on several hosts enqueue each firing once
+                jobs.append(enqueue(task_name, key=f'{task_name}:{moment:%Y-%m-%dT%H:%M}', **payload))
+        self.last = now
+        return jobs
+
+
+@task
+def nightly_refresh(job, chunk_size=None):
+    """Move funds to their latest NAV, then fan out one ``refresh_investments`` job per chunk of investment ids."""
+    chunk_size = chunk_size or settings.JOB_CHUNK_SIZE
+    prefix = job.key or f'job-{job.pk}'
+    now = timezone.now()
+    refresh_fund_navs()
+    day = latest_nav_date()
+    ids = Investment.objects.order_by('pk').values_list('pk', flat=True)
+    # Keyed by the parent, so a retried fan-out skips the chunks it already enqueued
+    Job.objects.bulk_create(
+        [
+            Job(
+                task='refresh_investments',
+                payload={'first': chunk[0], 'last': chunk[-1], 'day': day and day.isoformat()},
+                key=f'{prefix}:{chunk[0]}-{chunk[-1]}',
+                run_at=now,
+                max_attempts=settings.JOB_MAX_ATTEMPTS,
+            )
+            for chunk in chunked(ids.iterator(chunk_size=chunk_size), chunk_size)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@task
+def refresh_investments(job, first, last, day=None):
+    """
+    Value investments with ids in ``[first, last]`` from their fund units on
+    ``day`` (an ISO date, when fund NAVs are loaded), then recompute
+    everything derived from their NAV history.
+    """
+    investments = Investment.objects.filter(pk__range=(first, last))
+    if day is not None:
+        revalue(date.fromisoformat(day), investments)
+    refresh_current_values(investments)
+    refresh_summaries(investments)
+    refresh_sector_allocations(investments.values_list('pk', flat=True))
+    refresh_metrics(list(PERIOD_MONTHS), investments)
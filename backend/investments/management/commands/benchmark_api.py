@@ -0,0 +1,198 @@
+import json
+import platform
+import secrets
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Prefetch
+from django.test.utils import override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from investments import benchmarks, synthetic
+from investments.authentication import CachedTokenAuthentication
+from investments.models import Investment, PerformanceHistory, Fund, FundStockHolding
+from investments.serializers import InvestmentSerializer, FundSerializer
+
+BENCHMARK_EMAIL = 'benchmark@fundsight.com'
+
+class Command(BaseCommand):
+    help = 'Run serializer, endpoint and optional HTTP load benchmarks and store the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=100, help='Rows rendered by the serializer benchmarks')
+        parser.add_argument('--generate', action='store_true', help='Generate synthetic data first')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--funds', type=int, default=50)
+        parser.add_argument('--stocks', type=int, default=500)
+        parser.add_argument('--url', help='Base API URL for an HTTP load test, e.g. http://localhost:8000/api')
+        parser.add_argument('--token', help='Token for the HTTP load test (default: the benchmark user)')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument(
+            '--paths', nargs='+', default=['/investments/', '/funds/'],
+            help='Paths under --url for the HTTP load test, e.g. /async/investments/',
+        )
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per load test step')
+        parser.add_argument('--output', help='Result file (default: benchmark-results/<timestamp>.json)')
+        parser.add_argument('--compare', help='Previous result file to compare against')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            synthetic.clear()
+            counts = synthetic.generate(
+                users=options['users'], days=options['days'], funds=options['funds'], stocks=options['stocks']
+            )
+            self.stdout.write(f"Generated {counts}")
+
+        password = secrets.token_urlsafe()
+        user = self.benchmark_user(password)
+        try:
+            results = {}
+            results.update(self.serializer_benchmarks(options['limit'], options['iterations']))
+            results.update(self.authentication_benchmarks(user, options['iterations']))
+            results.update(self.endpoint_benchmarks(user, password, options['iterations']))
+            if options['url']:
+                token = options['token'] or user.auth_token.key
+                results.update(self.load_benchmarks(
+                    options['url'], token, options['paths'], options['concurrency'], options['duration']
+                ))
+        finally:
+            # Runs against production-like deployments must not leave a login behind
+            user.delete()
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<48} p50 {result.get('p50_ms', 0):9.3f} ms  p99 {result.get('p99_ms', 0):9.3f} ms"
+            )
+
+        report = {'meta': self.metadata(), 'results': results}
+        output = Path(options['output'] or f"benchmark-results/{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def benchmark_user(self, password):
+        """The benchmark login with this run's ``password``, replacing one left by an interrupted run."""
+        user = User.objects.filter(email=BENCHMARK_EMAIL).first()
+        if user is None:
+            user = User.objects.create_user(username='benchmark', email=BENCHMARK_EMAIL, password=password)
+        else:
+            user.set_password(password)
+            user.save(update_fields=['password'])
+        Token.objects.get_or_create(user=user)
+        return user
+
+    def serializer_benchmarks(self, limit, iterations):
+        investments = list(
+            Investment.objects.order_by('pk').prefetch_related('performance_history', 'sector_allocations')[:limit]
+        )
+        funds = list(
+            Fund.objects.order_by('pk').prefetch_related(
+                Prefetch('holdings', queryset=FundStockHolding.objects.select_related('stock'))
+            )[:limit]
+        )
+        if not investments or not funds:
+            raise CommandError('No data to benchmark; run populate_data or pass --generate')
+        return {
+            'serializer.InvestmentSerializer': benchmarks.benchmark_serializer(
+                InvestmentSerializer, investments, iterations
+            ),
+            'serializer.FundSerializer': benchmarks.benchmark_serializer(FundSerializer, funds, iterations),
+        }
+
+    def authentication_benchmarks(self, user, iterations):
+        """Per-request cost of checking the token, with and without the token cache."""
+        request = APIRequestFactory().get('/api/investments/', HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        return {
+            f'auth.{authentication_class.__name__}': benchmarks.benchmark_authentication(
+                authentication_class(), request, iterations * 10
+            )
+            for authentication_class in (TokenAuthentication, CachedTokenAuthentication)
+        }
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def endpoint_benchmarks(self, user, password, iterations):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        investment_id = Investment.objects.order_by('pk').values_list('pk', flat=True).first()
+        # The most widely held stock is the worst case for the reverse index
+        stock_id = (
+            FundStockHolding.objects.values('stock_id').annotate(holders=Count('fund_id'))
+            .order_by('-holders').values_list('stock_id', flat=True).first()
+        )
+        results = {}
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+            for path in [
+                '/api/investments/',
+                '/api/investments/?expand=',
+                '/api/investments/?series=columnar',
+                f'/api/investments/{investment_id}/performance/?period=1Y&points=200',
+                f'/api/investments/{investment_id}/summary/',
+                '/api/funds/',
+                f'/api/stocks/{stock_id}/funds/',
+                f'/api/investments/{investment_id}/exposure/?stock={stock_id}',
+                '/api/dashboard/',
+            ]:
+                results[f'endpoint.GET {path}'] = benchmarks.benchmark_request(client, 'get', path, iterations)
+        results['endpoint.GET /api/investments/ (cached)'] = benchmarks.benchmark_request(
+            client, 'get', '/api/investments/', iterations
+        )
+
+        # Password hashing dominates login, so fewer iterations are enough
+        login_client = APIClient()
+        results['endpoint.POST /api/auth/login/'] = benchmarks.benchmark_request(
+            login_client, 'post', '/api/auth/login/', max(iterations // 10, 3),
+            data={'email': BENCHMARK_EMAIL, 'password': password}, format='json',
+        )
+        return results
+
+    def load_benchmarks(self, base_url, token, paths, concurrency_levels, duration):
+        headers = {'Authorization': f'Token {token}'}
+        results = {}
+        for path in paths:
+            for concurrency in concurrency_levels:
+                self.stdout.write(f"Load testing {path} at concurrency {concurrency}...")
+                results[f'http.GET {path} c={concurrency}'] = benchmarks.load_test(
+                    base_url, path, concurrency, duration, headers
+                )
+        return results
+
+    def metadata(self):
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': revision,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': {
+                'investments': Investment.objects.count(),
+                'performance_history': PerformanceHistory.objects.count(),
+                'funds': Fund.objects.count(),
+                'holdings': FundStockHolding.objects.count(),
+            },
+        }
+
+    def compare(self, path, results):
+        previous = json.loads(Path(path).read_text())['results']
+        self.stdout.write(f"Compared with {path}:")
+        for name, metric, before, after, change in benchmarks.compare(previous, results):
+            # Lower latency is better, higher throughput is better
+            regression = change if metric == 'p50_ms' else -change
+            style = self.style.ERROR if regression > 10 else self.style.SUCCESS if regression < -10 else str
+            self.stdout.write(style(f"{name:<48} {metric} {before:9.3f} -> {after:9.3f} ({change:+.1f}%)"))
@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from investments.models import Investment, PackedHistory, PerformanceHistory
+from investments.packed import pack_investments, read_series
+from investments.timeseries import PERIOD_MONTHS, subtract_months
+
+BENCHMARK_PREFIX = 'benchmark-'
+
+class Command(BaseCommand):
+    help = 'Measure PerformanceHistory range-query latency on a synthetic table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--investments', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=5000, help='Daily rows per investment')
+        parser.add_argument('--queries', type=int, default=200, help='Queries per period')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reuse', action='store_true', help='Reuse benchmark rows left by --keep')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic rows afterwards')
+        parser.add_argument('--packed', action='store_true', help='Also pack the rows and time packed reads')
+
+    def handle(self, *args, **options):
+        end = date(2025, 12, 31)
+        start = end - timedelta(days=options['days'] - 1)
+        investment_ids = list(
+            Investment.objects.filter(user_name__startswith=BENCHMARK_PREFIX).values_list('pk', flat=True)
+        )
+        if not (options['reuse'] and investment_ids):
+            self.cleanup()
+            investment_ids = self.generate(options['investments'], start, options['days'])
+
+        rows = PerformanceHistory.objects.filter(investment_id__in=investment_ids[:1]).count() * len(investment_ids)
+        self.stdout.write(f"~{rows:,} rows across {len(investment_ids)} investments on {connection.vendor}")
+
+        def read_rows(investment_id, start):
+            history = PerformanceHistory.objects.filter(investment_id=investment_id)
+            if start is not None:
+                history = history.filter(date__gte=start)
+            return list(history.order_by('date').values_list('date', 'value'))
+
+        def read_packed(investment_id, start):
+            dates, _ = read_series(investment_id, start)
+            return dates
+
+        self.time_periods('Rows', read_rows, investment_ids, end, options)
+
+        if options['packed']:
+            started = time.perf_counter()
+            pack_investments(Investment.objects.filter(pk__in=investment_ids))
+            self.stdout.write(f"Packed in {time.perf_counter() - started:.1f}s")
+            self.time_periods('Packed', read_packed, investment_ids, end, options)
+            if connection.vendor == 'postgresql':
+                self.stdout.write(
+                    f"Bytes per point: rows {self.bytes_per_point(PerformanceHistory, rows):.1f}, "
+                    f"packed {self.bytes_per_point(PackedHistory, rows):.1f}"
+                )
+
+        history = PerformanceHistory.objects.filter(
+            investment_id=investment_ids[0], date__gte=subtract_months(end, 12)
+        ).order_by('date').values_list('date', 'value')
+        self.stdout.write('Plan for a 1Y range query:')
+        self.stdout.write(history.explain())
+
+        if not options['keep']:
+            self.cleanup()
+
+    def time_periods(self, label, read, investment_ids, end, options):
+        self.stdout.write(f"{label}:")
+        rng = random.Random(options['seed'])
+        for period, months in PERIOD_MONTHS.items():
+            start = None if months is None else subtract_months(end, months)
+            timings = []
+            for _ in range(options['queries']):
+                investment_id = rng.choice(investment_ids)
+                started = time.perf_counter()
+                points = read(investment_id, start)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{period:>4}: {len(points):>5} points  "
+                f"p50 {statistics.median(timings):7.2f} ms  "
+                f"p99 {timings[int(len(timings) * 0.99) - 1]:7.2f} ms"
+            )
+
+    def bytes_per_point(self, model, points):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            # Dead tuples from earlier runs would inflate the size
+            cursor.execute(f'VACUUM FULL {table}')
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            return cursor.fetchone()[0] / points
+
+    def generate(self, count, start, days):
+        Investment.objects.bulk_create([
+            Investment(user_name=f'{BENCHMARK_PREFIX}{i}', current_value=110000, initial_value=100000)
+            for i in range(count)
+        ], batch_size=1000)
+        investment_ids = list(
+            Investment.objects.filter(user_name__startswith=BENCHMARK_PREFIX).values_list('pk', flat=True)
+        )
+        table = PerformanceHistory._meta.db_table
+        started = time.perf_counter()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (investment_id, date, value) '
+                    'SELECT i.id, d::date, round((100000 + random() * 10000)::numeric, 2) '
+                    f'FROM {Investment._meta.db_table} i '
+                    "CROSS JOIN generate_series(%s::date, %s::date, interval '1 day') d "
+                    'WHERE i.user_name LIKE %s',
+                    [start, start + timedelta(days=days - 1), f'{BENCHMARK_PREFIX}%'],
+                )
+                cursor.execute(f'ANALYZE {table}')
+        else:
+            for investment_id in investment_ids:
+                PerformanceHistory.objects.bulk_create([
+                    PerformanceHistory(investment_id=investment_id, date=start + timedelta(days=d), value=100000 + d % 97)
+                    for d in range(days)
+                ], batch_size=5000)
+        self.stdout.write(f"Generated synthetic history in {time.perf_counter() - started:.1f}s")
+        return investment_ids
+
+    def cleanup(self):
+        investments = Investment.objects.filter(user_name__startswith=BENCHMARK_PREFIX)
+        # Delete the history in SQL first; cascading millions of rows through the ORM is far slower
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {PerformanceHistory._meta.db_table} WHERE investment_id IN '
+                f'(SELECT id FROM {Investment._meta.db_table} WHERE user_name LIKE %s)',
+                [f'{BENCHMARK_PREFIX}%'],
+            )
+        investments.delete()
@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from investments.jobs import TASKS, enqueue
+
+class Command(BaseCommand):
+    help = 'Queue a background job for run_workers, e.g. nightly_refresh after loading NAVs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('task', choices=sorted(TASKS))
+        parser.add_argument('--payload', default='{}', help='Task keyword arguments as a JSON object')
+        parser.add_argument('--key', help='Idempotency key; a job already queued under it is reused')
+
+    def handle(self, *args, **options):
+        try:
+            payload = json.loads(options['payload'])
+        except ValueError as exc:
+            raise CommandError(f'--payload is not valid JSON: {exc}')
+        if not isinstance(payload, dict):
+            raise CommandError('--payload must be a JSON object')
+        job = enqueue(options['task'], key=options['key'], **payload)
+        self.stdout.write(self.style.SUCCESS(f"Queued {job}"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from investments import synthetic
+
+class Command(BaseCommand):
+    help = 'Generate synthetic investments, history, funds and holdings at configurable scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--funds', type=int, default=50)
+        parser.add_argument('--stocks', type=int, default=500)
+        parser.add_argument('--holdings-per-fund', type=int, default=40)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Only delete previously generated data')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        synthetic.clear()
+        if options['clear']:
+            self.stdout.write(self.style.SUCCESS('Removed synthetic data'))
+            return
+
+        counts = synthetic.generate(
+            users=options['users'],
+            days=options['days'],
+            funds=options['funds'],
+            stocks=options['stocks'],
+            holdings_per_fund=options['holdings_per_fund'],
+            seed=options['seed'],
+        )
+        summary = ', '.join(f"{count:,} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from investments import cache, packed
+from investments.ingest import (
+    BulkLoader, CopyLoader, FundNavLoader, chunked, default_loader, open_source, read_amfi, read_csv, read_scheme_map,
+)
+from investments.models import Fund, Investment
+from investments.sectors import affected_investments, refresh_sector_allocations
+from investments.summary import refresh_summaries
+from investments.valuation import refresh_fund_navs
+
+class Command(BaseCommand):
+    help = 'Stream NAV files into PerformanceHistory, upserting on (investment, date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or AMFI NAV file (.gz supported, "-" for stdin)')
+        parser.add_argument('--format', choices=['csv', 'amfi'], default='csv')
+        parser.add_argument('--scheme-map', help='CSV of scheme_code,investment used with --format amfi')
+        parser.add_argument('--date-format', help='strptime format for CSV dates (default ISO 8601)')
+        parser.add_argument('--chunk-size', type=int, default=50000)
+        parser.add_argument('--loader', choices=['auto', 'copy', 'bulk'], default='auto')
+        parser.add_argument('--no-refresh', action='store_true', help='Skip refreshing portfolio summaries')
+        parser.add_argument(
+            '--funds', action='store_true',
+            help='Load fund NAVs into FundNav instead: a fund,date,value CSV, or AMFI with a scheme_code,fund map',
+        )
+
+    def handle(self, *args, **options):
+        if options['format'] == 'amfi' and not options['scheme_map']:
+            raise CommandError('--scheme-map is required with --format amfi')
+
+        funds = options['funds']
+        id_column = 'fund' if funds else 'investment'
+        if funds:
+            loader = FundNavLoader()
+        else:
+            loader = {'auto': default_loader, 'copy': CopyLoader, 'bulk': BulkLoader}[options['loader']]()
+        touched = set()
+        total = 0
+        started = time.perf_counter()
+
+        with open_source(options['path']) as stream:
+            if options['format'] == 'amfi':
+                rows = read_amfi(stream, read_scheme_map(options['scheme_map'], id_column))
+            else:
+                rows = read_csv(stream, options['date_format'], id_column)
+
+            for chunk in chunked(rows, options['chunk_size']):
+                touched.update(row_id for row_id, _, _ in chunk)
+                total += loader.load(chunk)
+                if packed.mirrored() and not funds:
+                    packed.write_points(chunk)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{total} rows loaded ({total / elapsed:,.0f} rows/sec)")
+
+        if funds:
+            # Holdings are valued at Fund.nav, so sector amounts move with it; revalue writes the history
+            if touched and not options['no_refresh'] and refresh_fund_navs(Fund.objects.filter(pk__in=touched)):
+                refresh_sector_allocations(affected_investments(funds=touched))
+        else:
+            # Bulk loading bypasses the post_save signals that keep summaries fresh
+            if touched and not options['no_refresh']:
+                refresh_summaries(Investment.objects.filter(pk__in=touched))
+            cache.invalidate('investments')
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} NAV rows for {len(touched)} {'funds' if funds else 'investments'} "
+            f"in {elapsed:.1f}s ({rate:,.0f} rows/sec)"
+        ))
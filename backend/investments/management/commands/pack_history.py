@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from investments.ingest import chunked
+from investments.models import Investment, PackedHistory, PerformanceHistory
+from investments.packed import pack_investments, read_many
+
+class Command(BaseCommand):
+    help = 'Pack PerformanceHistory rows into year-chunked arrays (see investments/packed.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--investment', type=int, action='append', help='Only this investment (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Investments read per query')
+        parser.add_argument('--verify', action='store_true', help='Check every packed series against its rows')
+
+    def handle(self, *args, **options):
+        investments = Investment.objects.all()
+        if options['investment']:
+            investments = investments.filter(pk__in=options['investment'])
+
+        started = time.perf_counter()
+        count, points = pack_investments(investments, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Packed {points:,} points for {count} investments in {time.perf_counter() - started:.1f}s"
+        ))
+        if connection.vendor == 'postgresql':
+            self.stdout.write(
+                f"Table sizes: {PerformanceHistory._meta.db_table} {self.table_size(PerformanceHistory)}, "
+                f"{PackedHistory._meta.db_table} {self.table_size(PackedHistory)}"
+            )
+        if options['verify']:
+            self.verify(investments, options['batch_size'])
+
+    def table_size(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_size_pretty(pg_total_relation_size(%s))', [model._meta.db_table])
+            return cursor.fetchone()[0]
+
+    def verify(self, investments, batch_size):
+        mismatched = []
+        investment_ids = investments.order_by('pk').values_list('pk', flat=True)
+        for batch in chunked(investment_ids.iterator(chunk_size=batch_size), batch_size):
+            rows = dict(
+                PerformanceHistory.objects.filter(investment_id__in=batch)
+                .values_list('investment_id').annotate(points=Count('*')).values_list('investment_id', 'points')
+            )
+            series = read_many(batch)
+            for investment_id in batch:
+                dates, _ = series.get(investment_id, ((), ()))
+                if len(dates) != rows.get(investment_id, 0):
+                    mismatched.append(investment_id)
+        if mismatched:
+            raise CommandError(f"Packed point counts differ from the rows for investments {mismatched[:20]}")
+        self.stdout.write(self.style.SUCCESS('Every packed series matches its rows'))
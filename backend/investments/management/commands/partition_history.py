@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+from investments.models import PerformanceHistory
+from investments.partitioning import convert_to_partitioned, create_partitions
+
+class Command(BaseCommand):
+    help = 'Partition PerformanceHistory by year (PostgreSQL) and create upcoming yearly partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Convert the existing table to a partitioned one')
+        parser.add_argument('--from-year', type=int, help='First yearly partition (default: oldest row)')
+        parser.add_argument('--years-ahead', type=int, default=2, help='Create partitions up to this many years ahead')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is only supported on PostgreSQL')
+
+        current_year = timezone.localdate().year
+        first_year = options['from_year']
+        if first_year is None:
+            oldest = PerformanceHistory.objects.aggregate(oldest=Min('date'))['oldest']
+            first_year = oldest.year if oldest else current_year
+        last_year = current_year + options['years_ahead']
+
+        if options['convert']:
+            if convert_to_partitioned(first_year, last_year):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Converted {PerformanceHistory._meta.db_table} to yearly partitions {first_year}-{last_year}"
+                ))
+                return
+            self.stdout.write(self.style.WARNING('Table is already partitioned'))
+
+        try:
+            created = create_partitions(first_year, last_year)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created partitions: {', '.join(created)}"))
+        else:
+            self.stdout.write('All partitions already exist')
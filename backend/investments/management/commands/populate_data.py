@@ -1,5 +1,8 @@
 from django.core.management.base import BaseCommand
-from investments.models import Investment, PerformanceHistory, SectorAllocation, Fund, Stock, FundStockHolding
+from investments import packed
+from investments.models import Investment, PerformanceHistory, Fund, Stock, FundStockHolding, InvestmentHolding
+from investments.sectors import refresh_sector_allocations
+from investments.summary import refresh_summaries
 from datetime import datetime, timedelta
 
 class Command(BaseCommand):
@@ -18,27 +21,27 @@ class Command(BaseCommand):
                 "current_value": 575000,
                 "initial_value": 500000,
                 "best_performing_scheme": "ICICI Prudential Midcap Fund",
-                "best_performance_change": "+19%",
+                "best_performance_change": 19,
                 "worst_performing_scheme": "Axis Flexi Cap Fund",
-                "worst_performance_change": "-5%"
+                "worst_performance_change": -5
             },
             {
                 "user_name": "Amit",
                 "current_value": 820000,
                 "initial_value": 750000,
                 "best_performing_scheme": "SBI Bluechip Fund",
-                "best_performance_change": "+22%",
+                "best_performance_change": 22,
                 "worst_performing_scheme": "HDFC Small Cap Fund",
-                "worst_performance_change": "-3%"
+                "worst_performance_change": -3
             },
             {
                 "user_name": "Priya",
                 "current_value": 430000,
                 "initial_value": 400000,
                 "best_performing_scheme": "Kotak Emerging Equity Fund",
-                "best_performance_change": "+15%",
+                "best_performance_change": 15,
                 "worst_performing_scheme": "Franklin India Flexi Cap Fund",
-                "worst_performance_change": "-7%"
+                "worst_performance_change": -7
             },
         ]
 
@@ -65,64 +68,36 @@ class Command(BaseCommand):
                 # Simulate some realistic fluctuations
                 fluctuation = (i % 10 - 5) * 1000 + (i * 50)  # Gradual growth with noise
                 value = current_value + fluctuation
-                performance_data.append({
-                    "date": date.strftime("%Y-%m-%d"),
-                    "value": value
-                })
-            for entry in performance_data:
-                PerformanceHistory.objects.create(
+                performance_data.append(PerformanceHistory(
                     investment=investment,
-                    date=datetime.strptime(entry["date"], "%Y-%m-%d").date(),
-                    value=entry["value"]
-                )
-
-        # Sector Allocations for each investment
-        sector_data_template = [
-            {"name": "Financial", "amount": 0.34, "bgcolor": "#9bb0c7"},
-            {"name": "Healthcare", "amount": 0.145, "bgcolor": "#adb8cf"},
-            {"name": "Technology", "amount": 0.19, "bgcolor": "#c6c4d8"},
-            {"name": "Consumer Goods", "amount": 0.095, "bgcolor": "#dad3e1"},
-            {"name": "Energy", "amount": 0.095, "bgcolor": "#ebe2ea"},
-            {"name": "Other Sectors", "amount": 0.095, "bgcolor": "#f8f3f5"},
-            {"name": "Automobile", "amount": 0.05, "bgcolor": "#d1e0e0"},
-            {"name": "Real Estate", "amount": 0.03, "bgcolor": "#e6d5e6"},
-            {"name": "Telecom", "amount": 0.02, "bgcolor": "#f0e4d7"},
-        ]
-
-        for investment in investments:
-            total_value = float(investment.current_value)
-            for sector in sector_data_template:
-                amount = total_value * sector["amount"]
-                # Format percentage to ensure it's not too long (max 10 chars)
-                percentage = f"{sector['amount'] * 100:.1f}%"
-                SectorAllocation.objects.create(
-                    investment=investment,
-                    name=sector["name"],
-                    amount=amount,
-                    percentage=percentage,  # Ensure this is max 10 chars
-                    bgcolor=sector["bgcolor"]
-                )
+                    date=date.date(),
+                    value=value
+                ))
+            PerformanceHistory.objects.bulk_create(performance_data)
 
         # Funds and Stocks (expanded dataset)
         funds_data = [
-            {"name": "Nippon Large Cap Fund - Direct Plan", "color": "#f8d07b"},
-            {"name": "Motilal Large Cap Fund - Direct Plan", "color": "#0070df"},
-            {"name": "HDFC Large Cap Fund", "color": "#c56a09"},
-            {"name": "ICICI Prudential Midcap Fund", "color": "#9e9d24"},
-            {"name": "SBI Bluechip Fund", "color": "#ff6f61"},
-            {"name": "Kotak Emerging Equity Fund", "color": "#4caf50"},
-            {"name": "Axis Midcap Fund", "color": "#ab47bc"},
-            {"name": "Franklin India Flexi Cap Fund", "color": "#ffca28"},
+            {"name": "Nippon Large Cap Fund - Direct Plan", "color": "#f8d07b", "nav": 85.43},
+            {"name": "Motilal Large Cap Fund - Direct Plan", "color": "#0070df", "nav": 24.18},
+            {"name": "HDFC Large Cap Fund", "color": "#c56a09", "nav": 1120.65},
+            {"name": "ICICI Prudential Midcap Fund", "color": "#9e9d24", "nav": 276.90},
+            {"name": "SBI Bluechip Fund", "color": "#ff6f61", "nav": 92.37},
+            {"name": "Kotak Emerging Equity Fund", "color": "#4caf50", "nav": 131.02},
+            {"name": "Axis Midcap Fund", "color": "#ab47bc", "nav": 118.54},
+            {"name": "Franklin India Flexi Cap Fund", "color": "#ffca28", "nav": 1612.88},
         ]
 
         stocks_data = [
-            "HDFC LTD.", "RIL", "INFY", "TCS", "HDFCBANK", "BHARTIARTL",
-            "ICICIBANK", "SBIN", "LT", "WIPRO", "TATAMOTORS", "ASIANPAINT",
-            "MARUTI", "SUNPHARMA", "DRREDDY", "HINDUNILVR", "ITC", "ONGC"
+            ("HDFC LTD.", "Financial"), ("RIL", "Energy"), ("INFY", "Technology"), ("TCS", "Technology"),
+            ("HDFCBANK", "Financial"), ("BHARTIARTL", "Telecom"), ("ICICIBANK", "Financial"),
+            ("SBIN", "Financial"), ("LT", "Capital Goods"), ("WIPRO", "Technology"),
+            ("TATAMOTORS", "Automobile"), ("ASIANPAINT", "Consumer Goods"), ("MARUTI", "Automobile"),
+            ("SUNPHARMA", "Healthcare"), ("DRREDDY", "Healthcare"), ("HINDUNILVR", "Consumer Goods"),
+            ("ITC", "Consumer Goods"), ("ONGC", "Energy"),
         ]
 
-        funds = [Fund.objects.create(name=f["name"], color=f["color"]) for f in funds_data]
-        stocks = [Stock.objects.create(name=s) for s in stocks_data]
+        funds = [Fund.objects.create(name=f["name"], color=f["color"], nav=f["nav"]) for f in funds_data]
+        stocks = [Stock.objects.create(name=name, sector=sector) for name, sector in stocks_data]
 
         # Fund-Stock Holdings (expanded connections)
         connections = [
@@ -177,4 +152,29 @@ class Command(BaseCommand):
         for fund, stock, weight in connections:
             FundStockHolding.objects.create(fund=fund, stock=stock, weight=weight)
 
+        # Fund units held by each investor, split so that units x NAV adds up to the current value
+        portfolios = [
+            [(funds[3], 0.5), (funds[0], 0.3), (funds[7], 0.2)],
+            [(funds[4], 0.5), (funds[1], 0.3), (funds[2], 0.2)],
+            [(funds[5], 0.5), (funds[6], 0.3), (funds[7], 0.2)],
+        ]
+        InvestmentHolding.objects.bulk_create([
+            InvestmentHolding(
+                investment=investment,
+                fund=fund,
+                units=round(float(investment.current_value) * share / float(fund.nav), 4),
+                cost=round(float(investment.initial_value) * share, 2),
+            )
+            for investment, portfolio in zip(investments, portfolios)
+            for fund, share in portfolio
+        ])
+
+        # Sector allocations are derived from the fund holdings above
+        refresh_sector_allocations()
+
+        # bulk_create skips the post_save signals that keep summaries fresh
+        refresh_summaries()
+        if packed.mirrored():
+            packed.pack_investments()
+
         self.stdout.write(self.style.SUCCESS(f"Successfully populated the database with mock data for {len(investments)} users"))
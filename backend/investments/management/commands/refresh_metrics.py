@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from investments.analytics import METRICS_BATCH_SIZE, refresh_metrics
+from investments.models import Investment
+from investments.timeseries import PERIOD_MONTHS
+
+class Command(BaseCommand):
+    help = 'Precompute and memoize investment metrics, e.g. nightly after NAVs are loaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', action='append', choices=list(PERIOD_MONTHS), help='Default: every period')
+        parser.add_argument('--investment', type=int, action='append', help='Only refresh these investment ids')
+        parser.add_argument('--batch-size', type=int, default=METRICS_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        investments = Investment.objects.all()
+        if options['investment']:
+            investments = investments.filter(pk__in=options['investment'])
+        periods = options['period'] or list(PERIOD_MONTHS)
+        count = refresh_metrics(periods, investments, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Computed {count} investment metrics"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from investments.sectors import affected_investments, refresh_sector_allocations
+
+class Command(BaseCommand):
+    help = 'Recompute sector allocations from fund holdings, for everyone or only those affected by a change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--investment', type=int, action='append', help='Only refresh these investment ids')
+        parser.add_argument('--fund', type=int, action='append', help='Only refresh holders of these funds')
+        parser.add_argument('--stock', type=int, action='append', help='Only refresh holders of funds with these stocks')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        investment_ids = None
+        if options['investment'] or options['fund'] or options['stock']:
+            investment_ids = set(options['investment'] or ())
+            investment_ids |= affected_investments(funds=options['fund'] or (), stocks=options['stock'] or ())
+        count = refresh_sector_allocations(investment_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed sector allocations for {count} investors"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from investments.models import Investment
+from investments.summary import refresh_summaries
+
+class Command(BaseCommand):
+    help = 'Recompute materialized portfolio summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--investment', type=int, action='append', help='Only refresh these investment ids')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        investments = Investment.objects.all()
+        if options['investment']:
+            investments = investments.filter(pk__in=options['investment'])
+        count = refresh_summaries(investments, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} portfolio summaries"))
@@ -0,0 +1,26 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from investments.valuation import latest_nav_date, refresh_fund_navs, revalue
+
+class Command(BaseCommand):
+    help = 'Value every investor from fund units x NAV for one date and write the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Valuation date (default: latest fund NAV)')
+        parser.add_argument('--processes', type=int, default=1, help='Value partitions in this many processes')
+        parser.add_argument('--chunk-size', type=int, default=settings.JOB_CHUNK_SIZE, help='Investors per partition')
+
+    def handle(self, *args, **options):
+        day = options['date'] or latest_nav_date()
+        if day is None:
+            raise CommandError('No fund NAVs loaded; see ingest_nav --funds')
+
+        started = time.perf_counter()
+        refresh_fund_navs()
+        count = revalue(day, processes=options['processes'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Valued {count} investors on {day} in {time.perf_counter() - started:.2f}s"
+        ))
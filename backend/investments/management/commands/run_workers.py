@@ -0,0 +1,78 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from investments.jobs import Scheduler, Worker, requeue_stale
+
+# Seconds between sweeps for jobs whose worker died
+STALE_SWEEP_INTERVAL = 60
+
+
+def work(stop):
+    # Ctrl-C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Worker(stop=stop).run()
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of background job workers plus the cron scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Worker processes (default JOB_WORKERS)')
+        parser.add_argument(
+            '--no-scheduler', action='store_true', help='Only run jobs, e.g. when another host runs the scheduler',
+        )
+        parser.add_argument('--burst', action='store_true', help='Run due jobs in this process, then exit')
+
+    def handle(self, *args, **options):
+        if options['burst']:
+            Worker().run(burst=True)
+            return
+
+        processes = options['processes'] or settings.JOB_WORKERS
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        scheduler = None if options['no_scheduler'] else Scheduler()
+
+        stopping = []
+
+        def shutdown(signum, frame):
+            # Only note the signal: setting the shared event here could deadlock with stop.wait() below
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        workers = [self.start_worker(context, stop) for _ in range(processes)]
+        self.stdout.write(self.style.SUCCESS(
+            f"Started {processes} workers{'' if scheduler is None else ' and the scheduler'}"
+        ))
+        last_sweep = time.monotonic()
+        while not stopping:
+            if scheduler is not None:
+                for job in scheduler.tick():
+                    self.stdout.write(f"Scheduled {job}")
+            if time.monotonic() - last_sweep >= STALE_SWEEP_INTERVAL:
+                if count := requeue_stale():
+                    self.stdout.write(f"Requeued {count} jobs from workers that stopped responding")
+                last_sweep = time.monotonic()
+            for i, process in enumerate(workers):
+                if not process.is_alive() and not stopping:
+                    self.stderr.write(f"Worker {process.pid} exited with {process.exitcode}; restarting")
+                    workers[i] = self.start_worker(context, stop)
+            time.sleep(1)
+
+        self.stdout.write('Stopping after the running jobs finish...')
+        stop.set()
+        for process in workers:
+            process.join()
+
+    def start_worker(self, context, stop):
+        # A forked child must not share the parent's database connections
+        connections.close_all()
+        process = context.Process(target=work, args=(stop,), daemon=False)
+        process.start()
+        return process
@@ -0,0 +1,79 @@
+# Generated by Django 5.0 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def strip_percent_signs(apps, schema_editor):
+    # "+19%" / "34.0%" -> "19" / "34.0" so the column can be cast to numeric
+    Investment = apps.get_model('investments', 'Investment')
+    SectorAllocation = apps.get_model('investments', 'SectorAllocation')
+    for investment in Investment.objects.all():
+        for field in ('best_performance_change', 'worst_performance_change'):
+            value = getattr(investment, field)
+            if value is not None:
+                setattr(investment, field, value.strip().rstrip('%').lstrip('+') or None)
+        investment.save(update_fields=['best_performance_change', 'worst_performance_change'])
+    for allocation in SectorAllocation.objects.all():
+        allocation.percentage = allocation.percentage.strip().rstrip('%') or '0'
+        allocation.save(update_fields=['percentage'])
+
+
+def add_percent_signs(apps, schema_editor):
+    Investment = apps.get_model('investments', 'Investment')
+    SectorAllocation = apps.get_model('investments', 'SectorAllocation')
+    for investment in Investment.objects.all():
+        for field in ('best_performance_change', 'worst_performance_change'):
+            value = getattr(investment, field)
+            if value is not None:
+                setattr(investment, field, f"{float(value):+g}%")
+        investment.save(update_fields=['best_performance_change', 'worst_performance_change'])
+    for allocation in SectorAllocation.objects.all():
+        allocation.percentage = f"{float(allocation.percentage):.1f}%"
+        allocation.save(update_fields=['percentage'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_percent_signs, add_percent_signs),
+        migrations.AlterField(
+            model_name='investment',
+            name='best_performance_change',
+            field=models.DecimalField(decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.AlterField(
+            model_name='investment',
+            name='worst_performance_change',
+            field=models.DecimalField(decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sectorallocation',
+            name='percentage',
+            field=models.DecimalField(decimal_places=2, max_digits=5),
+        ),
+        migrations.CreateModel(
+            name='PortfolioSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(null=True)),
+                ('current_value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('invested_value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('absolute_return', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('return_percentage', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('xirr', models.DecimalField(decimal_places=2, max_digits=9, null=True)),
+                ('day_change', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('day_change_percentage', models.DecimalField(decimal_places=2, max_digits=9, null=True)),
+                ('best_performing_scheme', models.CharField(max_length=200, null=True)),
+                ('best_performance_change', models.DecimalField(decimal_places=2, max_digits=7, null=True)),
+                ('worst_performing_scheme', models.CharField(max_length=200, null=True)),
+                ('worst_performance_change', models.DecimalField(decimal_places=2, max_digits=7, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('investment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='investments.investment')),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_days(apps, schema_editor):
+    # Keep the most recently inserted row for each (investment, date)
+    PerformanceHistory = apps.get_model('investments', 'PerformanceHistory')
+    duplicates = (
+        PerformanceHistory.objects.values('investment_id', 'date')
+        .annotate(keep=Max('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        PerformanceHistory.objects.filter(
+            investment_id=duplicate['investment_id'], date=duplicate['date']
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0002_portfolio_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='performancehistory',
+            constraint=models.UniqueConstraint(fields=('investment', 'date'), name='performance_history_investment_date'),
+        ),
+        migrations.AlterField(
+            model_name='performancehistory',
+            name='investment',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='performance_history', to='investments.investment'),
+        ),
+    ]
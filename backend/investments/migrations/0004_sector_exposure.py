@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0003_performance_history_investment_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fund',
+            name='nav',
+            field=models.DecimalField(decimal_places=4, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='sector',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='InvestmentHolding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='investor_holdings', to='investments.fund')),
+                ('investment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fund_holdings', to='investments.investment')),
+            ],
+            options={
+                'unique_together': {('investment', 'fund')},
+            },
+        ),
+    ]
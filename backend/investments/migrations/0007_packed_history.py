@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.SmallIntegerField()),
+                ('days', models.BinaryField()),
+                ('paise', models.BinaryField()),
+                ('investment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='packed_history', to='investments.investment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='packedhistory',
+            constraint=models.UniqueConstraint(fields=('investment', 'year'), name='packed_history_investment_year'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0007_packed_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investmentholding',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='FundNav',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('nav', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('fund', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='nav_history', to='investments.fund')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fundnav',
+            constraint=models.UniqueConstraint(fields=('fund', 'date'), name='fund_nav_fund_date'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 23:10
+
+from django.db import migrations
+
+INDEXED_TABLES = ['investments_fund', 'investments_stock']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+        if not cursor.fetchone()[0]:
+            # Builds without the contrib modules search the in-process index instead
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in INDEXED_TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_name_trgm ON {table} USING gin (UPPER(name) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in INDEXED_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm')
+
+
+class Migration(migrations.Migration):
+    """
+    Trigram indexes for name search on PostgreSQL (see search.py). They are
+    on ``UPPER(name)``, the expression Django's ``icontains`` compares, so
+    the admin's ``search_fields`` use them too. Other databases, and
+    PostgreSQL builds without pg_trgm, search an in-process index instead.
+    """
+
+    dependencies = [
+        ('investments', '0008_fund_nav_and_holding_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
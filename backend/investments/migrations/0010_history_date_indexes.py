@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0009_name_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fundnav',
+            index=models.Index(fields=['date'], name='fund_nav_date'),
+        ),
+        migrations.AddIndex(
+            model_name='performancehistory',
+            index=models.Index(fields=['date'], name='performance_history_date'),
+        ),
+    ]
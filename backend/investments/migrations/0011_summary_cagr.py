@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 21:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0010_history_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='portfoliosummary',
+            old_name='xirr',
+            new_name='cagr',
+        ),
+    ]
@@ -5,9 +5,9 @@ class Investment(models.Model):
     current_value = models.DecimalField(max_digits=12, decimal_places=2)  # e.g., 575000
     initial_value = models.DecimalField(max_digits=12, decimal_places=2)  # e.g., 500000
     best_performing_scheme = models.CharField(max_length=200, null=True)  # e.g., "ICICI Prudential Midcap Fund"
-    best_performance_change = models.CharField(max_length=10, null=True)  # e.g., "+19%"
+    best_performance_change = models.DecimalField(max_digits=7, decimal_places=2, null=True)  # e.g., 19.00 (%)
     worst_performing_scheme = models.CharField(max_length=200, null=True)  # e.g., "Axis Flexi Cap Fund"
-    worst_performance_change = models.CharField(max_length=10, null=True)  # e.g., "-5%"
+    worst_performance_change = models.DecimalField(max_digits=7, decimal_places=2, null=True)  # e.g., -5.00 (%)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -15,25 +15,74 @@ class Investment(models.Model):
         return f"Investment for {self.user_name}"
 
 class PerformanceHistory(models.Model):
-    investment = models.ForeignKey(Investment, on_delete=models.CASCADE, related_name="performance_history")
+    # The (investment, date) unique index below also serves lookups by investment alone
+    investment = models.ForeignKey(
+        Investment, on_delete=models.CASCADE, related_name="performance_history", db_index=False
+    )
     date = models.DateField()  # e.g., "7 Feb"
     value = models.DecimalField(max_digits=12, decimal_places=2)  # e.g., 500000
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['investment', 'date'], name='performance_history_investment_date'),
+        ]
+        indexes = [
+            # Date ranges across every investment, e.g. the admin's date hierarchy
+            models.Index(fields=['date'], name='performance_history_date'),
+        ]
+
     def __str__(self):
         return f"Performance on {self.date}: ₹{self.value}"
 
+class PackedHistory(models.Model):
+    """One investment's NAV history for one calendar year, packed into arrays (see packed.py)."""
+    investment = models.ForeignKey(
+        Investment, on_delete=models.CASCADE, related_name="packed_history", db_index=False
+    )
+    year = models.SmallIntegerField()  # e.g., 2024
+    days = models.BinaryField()  # little-endian uint16 day offsets from 1 January, ascending
+    paise = models.BinaryField()  # little-endian int64 values in paise, aligned with days
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['investment', 'year'], name='packed_history_investment_year'),
+        ]
+
+    def __str__(self):
+        return f"Packed history for {self.investment_id} in {self.year}"
+
 class SectorAllocation(models.Model):
     investment = models.ForeignKey(Investment, on_delete=models.CASCADE, related_name="sector_allocations")
     name = models.CharField(max_length=100)  # e.g., "Financial"
     amount = models.DecimalField(max_digits=12, decimal_places=2)  # e.g., 195000
-    percentage = models.CharField(max_length=20)  # e.g., "34%"
+    percentage = models.DecimalField(max_digits=5, decimal_places=2)  # e.g., 34.00 (%)
     bgcolor = models.CharField(max_length=7)  # e.g., "#9bb0c7"
 
     def __str__(self):
         return f"{self.name} Allocation: {self.percentage}"
 
+class PortfolioSummary(models.Model):
+    investment = models.OneToOneField(Investment, on_delete=models.CASCADE, related_name="summary")
+    as_of = models.DateField(null=True)  # date of the latest PerformanceHistory row
+    current_value = models.DecimalField(max_digits=12, decimal_places=2)
+    invested_value = models.DecimalField(max_digits=12, decimal_places=2)
+    absolute_return = models.DecimalField(max_digits=12, decimal_places=2)
+    return_percentage = models.DecimalField(max_digits=9, decimal_places=2)
+    cagr = models.DecimalField(max_digits=9, decimal_places=2, null=True)  # annualized, in %
+    day_change = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    day_change_percentage = models.DecimalField(max_digits=9, decimal_places=2, null=True)
+    best_performing_scheme = models.CharField(max_length=200, null=True)
+    best_performance_change = models.DecimalField(max_digits=7, decimal_places=2, null=True)
+    worst_performing_scheme = models.CharField(max_length=200, null=True)
+    worst_performance_change = models.DecimalField(max_digits=7, decimal_places=2, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary for {self.investment_id} as of {self.as_of}"
+
 class Stock(models.Model):
     name = models.CharField(max_length=100, unique=True)  # e.g., "HDFC LTD."
+    sector = models.CharField(max_length=100, blank=True, default='')  # e.g., "Financial"
 
     def __str__(self):
         return self.name
@@ -41,10 +90,28 @@ class Stock(models.Model):
 class Fund(models.Model):
     name = models.CharField(max_length=200)  # e.g., "Nippon Large Cap Fund - Direct Plan"
     color = models.CharField(max_length=7)  # e.g., "#f8d07b"
+    nav = models.DecimalField(max_digits=12, decimal_places=4, null=True)  # latest NAV per unit, e.g., 85.4321
 
     def __str__(self):
         return self.name
 
+class FundNav(models.Model):
+    # The (fund, date) unique index below also serves lookups by fund alone
+    fund = models.ForeignKey(Fund, on_delete=models.CASCADE, related_name="nav_history", db_index=False)
+    date = models.DateField()
+    nav = models.DecimalField(max_digits=12, decimal_places=4)  # e.g., 85.4321
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fund', 'date'], name='fund_nav_fund_date'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='fund_nav_date'),
+        ]
+
+    def __str__(self):
+        return f"NAV of fund {self.fund_id} on {self.date}: {self.nav}"
+
 class FundStockHolding(models.Model):
     fund = models.ForeignKey(Fund, on_delete=models.CASCADE, related_name="holdings")
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name="funds")
@@ -55,3 +122,45 @@ class FundStockHolding(models.Model):
 
     def __str__(self):
         return f"{self.fund.name} holds {self.stock.name} (Weight: {self.weight})"
+
+class InvestmentHolding(models.Model):
+    investment = models.ForeignKey(Investment, on_delete=models.CASCADE, related_name="fund_holdings")
+    fund = models.ForeignKey(Fund, on_delete=models.CASCADE, related_name="investor_holdings")
+    units = models.DecimalField(max_digits=16, decimal_places=4)  # e.g., 1250.5000
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # amount invested, e.g., 100000.00
+
+    class Meta:
+        unique_together = ('investment', 'fund')
+
+    def __str__(self):
+        return f"{self.investment_id} holds {self.units} units of fund {self.fund_id}"
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``run_workers`` (see jobs.py)."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=100)  # e.g., "refresh_investments"
+    payload = models.JSONField(default=dict)  # keyword arguments for the task
+    # Enqueueing a key that already exists returns the existing job, e.g. "nightly_refresh:2025-01-01T02:00"
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField()  # not claimed before this, e.g. while backing off after a failure
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True, default='')  # "host:pid" of the worker running it
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for the oldest due job; only queued rows are indexed
+            models.Index(
+                fields=['run_at', 'id'], name='job_queued_run_at', condition=models.Q(status='queued'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} job {self.pk} ({self.status})"
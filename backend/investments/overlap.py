@@ -0,0 +1,190 @@
+import threading
+import time
+from functools import partial
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from scipy import sparse
+
+from .models import FundStockHolding
+
+VERSION_KEY = 'fund-overlap:version'
+CHANGE_KEY = 'fund-overlap:change:{}'
+
+# Past this many changed funds a full rebuild is cheaper than patching rows
+MAX_INCREMENTAL_FUNDS = 64
+
+
+def record_holding_change(fund_id):
+    """
+    Append ``fund_id`` to the change log shared by every worker.
+
+    Each change bumps a version counter in the cache and stores the fund id
+    under that version, so engines in other processes can replay exactly the
+    funds they missed instead of rebuilding everything.
+
+    The change is published once the transaction commits. Published earlier,
+    another worker could replay it, read the holdings from before the write,
+    and still mark itself current.
+    """
+    transaction.on_commit(partial(_publish_holding_change, fund_id))
+
+
+def _publish_holding_change(fund_id):
+    # Start from the clock, not 0, so a counter lost with a cache flush does
+    # not restart at a version an engine already holds
+    cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+    version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), fund_id, timeout=None)
+
+
+def _min_overlap(left, right, levels):
+    """
+    Sum of ``min(left[i, s], right[j, s])`` over stocks for every row pair.
+
+    ``min(a, b)`` equals the sum over weight levels ``l`` of
+    ``(l - l_prev) * [a >= l] * [b >= l]``, which turns the element-wise
+    minimum into a handful of sparse matrix products.
+    """
+    total = np.zeros((left.shape[0], right.shape[0]))
+    previous = 0.0
+    for level in levels:
+        left_mask = (left >= level).astype(np.float64)
+        right_mask = (right >= level).astype(np.float64)
+        total += (level - previous) * (left_mask @ right_mask.T).toarray()
+        previous = level
+    return total
+
+
+class FundOverlapEngine:
+    """
+    Pairwise overlap between funds computed from a sparse fund x stock matrix.
+
+    ``common`` holds the number of stocks two funds share and ``overlap`` the
+    sum of the smaller weight of each shared stock, both as dense
+    ``n_funds x n_funds`` arrays. Holding changes only recompute the rows and
+    columns of the funds that changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.fund_index = {}
+        self.stock_index = {}
+        self.weights = None
+        self.common = None
+        self.overlap = None
+
+    def refresh(self):
+        with self._lock:
+            current = cache.get(VERSION_KEY, 0)
+            if self.weights is None:
+                self._rebuild(current)
+            elif current != self.version:
+                self._apply_changes(current)
+
+    def _rebuild(self, version):
+        rows = list(FundStockHolding.objects.values_list('fund_id', 'stock_id', 'weight'))
+        fund_ids = sorted({fund_id for fund_id, _, _ in rows})
+        stock_ids = sorted({stock_id for _, stock_id, _ in rows})
+        self.fund_index = {fund_id: i for i, fund_id in enumerate(fund_ids)}
+        self.stock_index = {stock_id: i for i, stock_id in enumerate(stock_ids)}
+
+        self.weights = sparse.csr_matrix(
+            (
+                [float(weight) for _, _, weight in rows],
+                ([self.fund_index[f] for f, _, _ in rows], [self.stock_index[s] for _, s, _ in rows]),
+            ),
+            shape=(len(fund_ids), len(stock_ids)),
+        )
+        held = (self.weights > 0).astype(np.float64)
+        self.common = (held @ held.T).toarray().astype(np.int64)
+        self.overlap = _min_overlap(self.weights, self.weights, self._levels())
+        self.version = version
+
+    def _apply_changes(self, version):
+        first = (self.version or 0) + 1
+        if version < first or version - first + 1 > MAX_INCREMENTAL_FUNDS:
+            return self._rebuild(version)
+
+        keys = [CHANGE_KEY.format(v) for v in range(first, version + 1)]
+        changes = cache.get_many(keys)
+        fund_ids = set(changes.values())
+        if len(changes) != len(keys) or not fund_ids <= self.fund_index.keys():
+            # Part of the log was evicted or a new fund appeared
+            return self._rebuild(version)
+
+        rows = list(
+            FundStockHolding.objects.filter(fund_id__in=fund_ids).values_list('fund_id', 'stock_id', 'weight')
+        )
+        if any(stock_id not in self.stock_index for _, stock_id, _ in rows):
+            return self._rebuild(version)
+
+        weights = self.weights.tolil()
+        changed = sorted(self.fund_index[fund_id] for fund_id in fund_ids)
+        for i in changed:
+            weights[i, :] = 0
+        for fund_id, stock_id, weight in rows:
+            weights[self.fund_index[fund_id], self.stock_index[stock_id]] = float(weight)
+        self.weights = weights.tocsr()
+        self.weights.eliminate_zeros()
+
+        held = (self.weights > 0).astype(np.float64)
+        common = (held[changed] @ held.T).toarray().astype(np.int64)
+        self.common[changed, :] = common
+        self.common[:, changed] = common.T
+
+        overlap = _min_overlap(self.weights[changed], self.weights, self._levels())
+        self.overlap[changed, :] = overlap
+        self.overlap[:, changed] = overlap.T
+        self.version = version
+
+    def _levels(self):
+        return np.unique(self.weights.data[self.weights.data > 0])
+
+    def compare(self, fund_ids):
+        """
+        Overlap between every pair of ``fund_ids``.
+
+        Returns a dict with one entry per pair plus a summary: the number of
+        stocks held by at least two of the funds and the mean pairwise weight
+        overlap.
+        """
+        self.refresh()
+        rows = [self.fund_index.get(fund_id) for fund_id in fund_ids]
+        known = [i for i in rows if i is not None]
+
+        held = (self.weights[known] > 0).astype(np.int64) if known else None
+        holdings_count = np.asarray(held.sum(axis=1)).ravel() if known else []
+        counts = dict(zip(known, holdings_count))
+
+        pairs = []
+        for a in range(len(fund_ids)):
+            for b in range(a + 1, len(fund_ids)):
+                i, j = rows[a], rows[b]
+                if i is None or j is None:
+                    common, overlap = 0, 0.0
+                else:
+                    common, overlap = int(self.common[i, j]), float(self.overlap[i, j])
+                union = (counts.get(i, 0) + counts.get(j, 0)) - common
+                pairs.append({
+                    'fund_a': fund_ids[a],
+                    'fund_b': fund_ids[b],
+                    'common_stocks': common,
+                    'weight_overlap': round(overlap, 2),
+                    'jaccard': round(common / union, 4) if union else 0.0,
+                })
+
+        shared = int((np.asarray(held.sum(axis=0)).ravel() >= 2).sum()) if known else 0
+        average = sum(p['weight_overlap'] for p in pairs) / len(pairs) if pairs else 0.0
+        return {
+            'pairs': pairs,
+            'summary': {
+                'overlapping_stocks': shared,
+                'average_overlap': round(average, 2),
+            },
+        }
+
+
+overlap_engine = FundOverlapEngine()
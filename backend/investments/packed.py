@@ -0,0 +1,231 @@
+"""
+Packed NAV history: one PackedHistory row per investment per calendar year.
+
+A chunk holds two binary columns: little-endian uint16 day offsets from
+1 January, and little-endian int64 values in paise. A year of daily history
+is one ~3.6 KB row instead of 365 rows with ~60 bytes of tuple overhead each.
+Reads decode with ``numpy.frombuffer``, so values are read-only views of the
+fetched bytes rather than one Decimal per point. A series that fits in one
+chunk is returned without copying its values.
+
+``HISTORY_STORAGE`` selects how it is used:
+
+* ``rows`` (default): PerformanceHistory only.
+* ``mirror``: every history write is also packed; reads still use rows.
+* ``packed``: as ``mirror``, and metrics and the performance endpoint read
+  the packed chunks.
+
+PerformanceHistory stays the source of truth for the SQL aggregates
+(summaries, combined history, exports). A saved row is merged into its chunk
+with ``write_points``; deletes and rows moved to another date or investment
+are repacked from the rows once the transaction commits, once per
+investment however many rows changed. To migrate, set ``mirror``, run
+``pack_history`` to pack the existing rows, then switch to ``packed``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .ingest import chunked
+from .models import Investment, PackedHistory, PerformanceHistory
+
+DAY = np.dtype('<u2')
+PAISE = np.dtype('<i8')
+PAISE_PER_RUPEE = 100
+
+
+def mirrored():
+    """Whether history writes must also update the packed chunks."""
+    return settings.HISTORY_STORAGE in ('mirror', 'packed')
+
+
+def serves_reads():
+    return settings.HISTORY_STORAGE == 'packed'
+
+
+def to_paise(value):
+    return int((Decimal(value) * PAISE_PER_RUPEE).to_integral_value())
+
+
+def _year_start(year):
+    return np.datetime64(f'{year:04d}-01-01', 'D')
+
+
+def decode(year, days, paise):
+    """``(dates, paise)`` arrays of one chunk; ``paise`` is a read-only view of the column's bytes."""
+    return _year_start(year) + np.frombuffer(days, dtype=DAY), np.frombuffer(paise, dtype=PAISE)
+
+
+def _empty():
+    return np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=PAISE)
+
+
+def _trim(dates, paise, start, end):
+    first = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 'D')))
+    last = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+    return dates[first:last], paise[first:last]
+
+
+def _chunks(investment_ids, start=None, end=None):
+    chunks = PackedHistory.objects.filter(investment_id__in=investment_ids)
+    if start is not None:
+        chunks = chunks.filter(year__gte=start.year)
+    if end is not None:
+        chunks = chunks.filter(year__lte=end.year)
+    return chunks.order_by('investment_id', 'year').values_list('investment_id', 'year', 'days', 'paise')
+
+
+def read_many(investment_ids, start=None, end=None):
+    """
+    ``{investment_id: (dates, paise)}`` for ``investment_ids`` between
+    ``start`` and ``end`` (inclusive, either optional), in one query.
+    ``dates`` are datetime64[D] ascending and ``paise`` int64, aligned.
+    Investments without history are left out.
+    """
+    parts = defaultdict(list)
+    for investment_id, year, days, paise in _chunks(investment_ids, start, end):
+        parts[investment_id].append(decode(year, days, paise))
+
+    series = {}
+    for investment_id, chunks in parts.items():
+        if len(chunks) == 1:
+            dates, paise = chunks[0]
+        else:
+            dates = np.concatenate([dates for dates, _ in chunks])
+            paise = np.concatenate([paise for _, paise in chunks])
+        series[investment_id] = _trim(dates, paise, start, end)
+    return series
+
+
+def read_series(investment_id, start=None, end=None):
+    """``(dates, paise)`` arrays for one investment; empty when it has no history in range."""
+    return read_many([investment_id], start, end).get(investment_id) or _empty()
+
+
+def to_points(dates, paise):
+    """``(date, Decimal)`` tuples, as ``values_list('date', 'value')`` returns them."""
+    return [(day, Decimal(value).scaleb(-2)) for day, value in zip(dates.tolist(), paise.tolist())]
+
+
+def _pack(offsets, paise):
+    return np.asarray(offsets, dtype=DAY).tobytes(), np.asarray(paise, dtype=PAISE).tobytes()
+
+
+def write_points(rows, batch_size=500):
+    """
+    Merge ``(investment_id, date, value)`` rows into the packed chunks; the
+    last value for a date wins and unknown investments are skipped.
+
+    Points after a chunk's last day, the daily NAV case, are appended to its
+    bytes without decoding them. Earlier points are merged. Returns the
+    number of points written.
+    """
+    by_chunk = defaultdict(dict)
+    for investment_id, day, value in rows:
+        by_chunk[investment_id, day.year][day.timetuple().tm_yday - 1] = to_paise(value)
+    if not by_chunk:
+        return 0
+    known = set(
+        Investment.objects.filter(pk__in={investment_id for investment_id, _ in by_chunk}).values_list('pk', flat=True)
+    )
+
+    written = 0
+    created, updated = [], []
+    with transaction.atomic():
+        existing = {
+            (chunk.investment_id, chunk.year): chunk
+            for chunk in PackedHistory.objects.select_for_update().filter(
+                investment_id__in=known, year__in={year for _, year in by_chunk}
+            )
+        }
+        for (investment_id, year), points in by_chunk.items():
+            if investment_id not in known:
+                continue
+            offsets = sorted(points)
+            written += len(offsets)
+            days, paise = _pack(offsets, [points[offset] for offset in offsets])
+            chunk = existing.get((investment_id, year))
+            if chunk is None:
+                created.append(PackedHistory(investment_id=investment_id, year=year, days=days, paise=paise))
+                continue
+            old_days = np.frombuffer(chunk.days, dtype=DAY)
+            if not len(old_days) or offsets[0] > old_days[-1]:
+                chunk.days, chunk.paise = bytes(chunk.days) + days, bytes(chunk.paise) + paise
+            else:
+                old_paise = np.frombuffer(chunk.paise, dtype=PAISE)
+                keep = ~np.isin(old_days, offsets)
+                merged_days = np.concatenate([old_days[keep], np.frombuffer(days, dtype=DAY)])
+                merged_paise = np.concatenate([old_paise[keep], np.frombuffer(paise, dtype=PAISE)])
+                order = np.argsort(merged_days, kind='stable')
+                chunk.days, chunk.paise = _pack(merged_days[order], merged_paise[order])
+            updated.append(chunk)
+        PackedHistory.objects.bulk_create(created, batch_size=batch_size)
+        PackedHistory.objects.bulk_update(updated, ['days', 'paise'], batch_size=batch_size)
+    return written
+
+
+def pack_investments(investments=None, batch_size=200):
+    """
+    Rebuild the packed chunks of ``investments`` (all by default) from their
+    PerformanceHistory rows, replacing whatever was packed before. History is
+    read one batch of investments at a time, with values converted to paise
+    in the database. Returns ``(investments, points)`` packed.
+    """
+    if investments is None:
+        investments = Investment.objects.all()
+    investment_ids = investments.order_by('pk').values_list('pk', flat=True)
+
+    packed = points = 0
+    for batch in chunked(investment_ids.iterator(chunk_size=batch_size), batch_size):
+        rows = list(
+            PerformanceHistory.objects.filter(investment_id__in=batch)
+            .annotate(paise=Cast(Round(F('value') * PAISE_PER_RUPEE), BigIntegerField()))
+            .order_by('investment_id', 'date')
+            .values_list('investment_id', 'date', 'paise')
+        )
+        chunks = []
+        if rows:
+            ids, dates, paise = zip(*rows)
+            ids, dates = np.array(ids, dtype=np.int64), np.array(dates, dtype='datetime64[D]')
+            years = dates.astype('datetime64[Y]')
+            offsets = dates - years.astype('datetime64[D]')
+            # Rows are ordered by investment and date, so each chunk is one contiguous slice
+            firsts = np.flatnonzero(np.r_[True, (ids[1:] != ids[:-1]) | (years[1:] != years[:-1])])
+            for first, end in zip(firsts, np.r_[firsts[1:], len(ids)]):
+                days, values = _pack(offsets[first:end].astype(np.int64), paise[first:end])
+                chunks.append(PackedHistory(
+                    investment_id=int(ids[first]), year=dates[first].item().year, days=days, paise=values,
+                ))
+            points += len(rows)
+        with transaction.atomic():
+            PackedHistory.objects.filter(investment_id__in=batch).delete()
+            PackedHistory.objects.bulk_create(chunks, batch_size=500)
+        packed += len(batch)
+    return packed, points
+
+
+def repack_on_commit(investment_ids, using=None):
+    """
+    Rebuild the chunks of ``investment_ids`` from their rows once the
+    transaction commits. Ids pend on the connection and the first callback to
+    run repacks all of them, so the rest find nothing to do. Ids left pending
+    by a rollback are repacked by the next commit, which is only extra work.
+    """
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, 'pending_repacks', None)
+    if pending is None:
+        pending = connection.pending_repacks = set()
+    pending.update(investment_ids)
+    transaction.on_commit(partial(_repack_pending, connection), using=using)
+
+
+def _repack_pending(connection):
+    investment_ids, connection.pending_repacks = connection.pending_repacks, set()
+    if investment_ids:
+        pack_investments(Investment.objects.filter(pk__in=investment_ids))
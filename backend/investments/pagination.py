@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over the primary key.
+
+    Pages are fetched with ``WHERE id > <cursor> ORDER BY id LIMIT n`` so deep
+    pages cost the same as the first one, unlike OFFSET based pagination.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
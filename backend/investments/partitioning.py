@@ -0,0 +1,127 @@
+"""
+Optional yearly range partitioning of PerformanceHistory on PostgreSQL.
+
+Partitioning is not expressed in Django migrations: the table stays a plain
+table on SQLite and on PostgreSQL until ``partition_history --convert`` is
+run. Partitioned or not, the Django model is the same, because the primary
+key becomes ``(id, date)`` while ``id`` stays unique through its identity
+sequence.
+"""
+from django.db import connection, transaction
+
+from .models import Investment, PerformanceHistory
+
+TABLE = PerformanceHistory._meta.db_table
+UNIQUE_CONSTRAINT = 'performance_history_investment_date'
+DATE_INDEX = 'performance_history_date'
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s',
+        [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def existing_partitions(cursor):
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = %s',
+        [TABLE],
+    )
+    return {name for name, in cursor.fetchall()}
+
+
+def convert_to_partitioned(first_year, last_year):
+    """
+    Rebuild PerformanceHistory as a table partitioned by year on ``date``.
+
+    Rows are copied into yearly partitions for ``first_year..last_year`` and
+    a default partition catches anything outside that range. Runs in one
+    transaction and holds an exclusive lock on the table while copying.
+    """
+    legacy = f'{TABLE}_legacy'
+    investments = Investment._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return False
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {legacy}')
+        cursor.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT {UNIQUE_CONSTRAINT} TO {UNIQUE_CONSTRAINT}_legacy')
+        cursor.execute(f'ALTER INDEX IF EXISTS {DATE_INDEX} RENAME TO {DATE_INDEX}_legacy')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} ('
+            'id bigint GENERATED BY DEFAULT AS IDENTITY, '
+            f'investment_id bigint NOT NULL REFERENCES {investments} (id) DEFERRABLE INITIALLY DEFERRED, '
+            'date date NOT NULL, '
+            'value numeric(12, 2) NOT NULL, '
+            'PRIMARY KEY (id, date), '
+            f'CONSTRAINT {UNIQUE_CONSTRAINT} UNIQUE (investment_id, date)'
+            ') PARTITION BY RANGE (date)'
+        )
+        cursor.execute(f'CREATE INDEX {DATE_INDEX} ON {TABLE} (date)')
+        for year in range(first_year, last_year + 1):
+            _create_partition(cursor, year)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (id, investment_id, date, value) '
+            f'SELECT id, investment_id, date, value FROM {legacy}'
+        )
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f'(SELECT COALESCE(MAX(id), 0) + 1 FROM {TABLE}), false)'
+        )
+        cursor.execute(f'DROP TABLE {legacy}')
+    return True
+
+
+def create_partitions(first_year, last_year):
+    """
+    Create any missing yearly partitions between ``first_year`` and ``last_year``.
+
+    Rows for a new year that already landed in the default partition are
+    moved into the new partition before it is attached. Returns the names of
+    the partitions created.
+    """
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise ValueError(f'{TABLE} is not partitioned; run partition_history --convert first')
+        existing = existing_partitions(cursor)
+        for year in range(first_year, last_year + 1):
+            if partition_name(year) in existing:
+                continue
+            _create_partition(cursor, year, default_exists=f'{TABLE}_default' in existing)
+            created.append(partition_name(year))
+    return created
+
+
+def _create_partition(cursor, year, default_exists=False):
+    name = partition_name(year)
+    bounds = f"FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    if not default_exists:
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}')
+        return
+
+    # Attaching a range the default partition already holds rows for fails,
+    # so move those rows across first
+    default = f'{TABLE}_default'
+    cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {default} '
+        f"WHERE date >= '{year}-01-01' AND date < '{year + 1}-01-01' RETURNING *) "
+        f'INSERT INTO {name} SELECT * FROM moved'
+    )
+    cursor.execute(
+        f'ALTER TABLE {name} ADD CONSTRAINT {name}_date_range '
+        f"CHECK (date >= '{year}-01-01' AND date < '{year + 1}-01-01')"
+    )
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}')
+    cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT {name}_date_range')
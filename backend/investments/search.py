@@ -0,0 +1,197 @@
+"""
+Ranked, typo-tolerant name search for funds and stocks.
+
+On PostgreSQL with ``pg_trgm`` the names are searched in SQL against the
+trigram GIN indexes from migration 0009. A name matches when it contains the
+query, or when the query is similar to a run of its words (``<%``), so
+"axsi midcap" still finds "Axis Midcap Fund". Containing the query ranks
+above similarity alone.
+
+Elsewhere ``NameIndex`` keeps a prefix trie over the distinct words of every
+name in memory per worker. Each query word must match the start of a word in
+the name, within one edit for words of four or more letters. Names rank by
+total edits, then whether they start with the query, then length. The index
+is stamped with a version kept in the cache, bumped by ``record_name_change``
+once a write changing names commits, and rebuilt when the two differ.
+"""
+import heapq
+import re
+import threading
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from .models import Fund, Stock
+
+VERSION_KEY = 'name-search:{}:version'
+
+WORD = re.compile(r'[a-z0-9]+')
+
+# Words this long or longer may be misspelt by one edit
+MIN_FUZZY_LENGTH = 4
+MAX_EDITS = 1
+
+# Below this pg_trgm word similarity, a name that does not contain the query is not a match
+MIN_SIMILARITY = 0.4
+
+# The trie's marker for the end of a word; every other key is one character
+END = ''
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def record_name_change(model):
+    """
+    Tell every worker's ``NameIndex`` for ``model`` that names were created,
+    renamed or deleted, once the transaction commits. Told earlier, a worker
+    could rebuild from the names before the write and keep that index.
+    """
+    transaction.on_commit(partial(_publish_name_change, model))
+
+
+def _publish_name_change(model):
+    key = VERSION_KEY.format(model._meta.label_lower)
+    # Start from the clock, as in overlap.py, so a lost counter does not restart at a version already seen
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    cache.incr(key)
+
+
+class NameIndex:
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self.version = None
+        self.ids, self.names, self.keys = [], [], []
+        # Distinct words, the positions of the names containing each, and a trie over them
+        self.vocabulary, self.postings, self.trie = [], [], {}
+
+    def refresh(self):
+        current = cache.get(VERSION_KEY.format(self.model._meta.label_lower), 0)
+        with self._lock:
+            if current != self.version:
+                self._rebuild(current)
+
+    def _rebuild(self, version):
+        rows = list(self.model.objects.order_by('pk').values_list('pk', 'name'))
+        word_ids, vocabulary, postings, trie = {}, [], [], {}
+        for position, (_, name) in enumerate(rows):
+            for word in dict.fromkeys(words(name)):
+                word_id = word_ids.get(word)
+                if word_id is None:
+                    word_id = word_ids[word] = len(vocabulary)
+                    vocabulary.append(word)
+                    postings.append([])
+                    node = trie
+                    for char in word:
+                        node = node.setdefault(char, {})
+                    node[END] = word_id
+                postings[word_id].append(position)
+        self.ids = [pk for pk, _ in rows]
+        self.names = [name for _, name in rows]
+        self.keys = [' '.join(words(name)) for _, name in rows]
+        self.vocabulary, self.postings, self.trie = vocabulary, postings, trie
+        self.version = version
+
+    def _matching_words(self, token):
+        """
+        ``{word id: edits}`` for the words that start with ``token``, or with
+        a string within the allowed edits of it. The trie is walked with one
+        Levenshtein row per node, pruned once every cell exceeds the budget.
+        """
+        budget = MAX_EDITS if len(token) >= MIN_FUZZY_LENGTH else 0
+        matches = {}
+        # (node, distances from token prefixes to the path so far, best full-token distance on the path)
+        stack = [(self.trie, list(range(len(token) + 1)), budget + 1)]
+        while stack:
+            node, row, best = stack.pop()
+            best = min(best, row[-1])
+            if best <= budget and END in node:
+                matches[node[END]] = best
+            for char, child in node.items():
+                if char == END:
+                    continue
+                next_row = [row[0] + 1]
+                for i, token_char in enumerate(token, 1):
+                    next_row.append(min(next_row[i - 1] + 1, row[i] + 1, row[i - 1] + (token_char != char)))
+                # Below a matching prefix every word matches; otherwise stop once no cell can recover
+                if best <= budget or min(next_row) <= budget:
+                    stack.append((child, next_row, best))
+        return matches
+
+    def search(self, query, limit=10):
+        """``(id, name)`` of the best ``limit`` names matching ``query``."""
+        tokens = words(query)
+        if not tokens:
+            return []
+        self.refresh()
+        with self._lock:
+            edits = None
+            for token in tokens:
+                found = {}
+                for word_id, distance in self._matching_words(token).items():
+                    for position in self.postings[word_id]:
+                        if distance < found.get(position, MAX_EDITS + 1):
+                            found[position] = distance
+                if edits is None:
+                    edits = found
+                else:
+                    edits = {position: total + found[position] for position, total in edits.items() if position in found}
+                if not edits:
+                    return []
+            key = ' '.join(tokens)
+            best = heapq.nsmallest(limit, edits, key=lambda position: (
+                edits[position], not self.keys[position].startswith(key), len(self.names[position]), self.ids[position],
+            ))
+            return [(self.ids[position], self.names[position]) for position in best]
+
+
+name_indexes = {Fund: NameIndex(Fund), Stock: NameIndex(Stock)}
+
+
+def trigram_enabled(using='default'):
+    """Whether pg_trgm is installed in the database, checked once per connection."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    enabled = getattr(connection, 'trigram_enabled', None)
+    if enabled is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            enabled = connection.trigram_enabled = cursor.fetchone()[0]
+    return enabled
+
+
+def _like_pattern(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _trigram_search(model, query, limit):
+    table = model._meta.db_table
+    with transaction.atomic(), connections['default'].cursor() as cursor:
+        # <% compares against this setting, scoped to the transaction
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(MIN_SIMILARITY)])
+        # Both conditions compare UPPER(name), so either can use the trigram index
+        cursor.execute(
+            f'SELECT id, name FROM {table} '
+            'WHERE UPPER(name) LIKE UPPER(%(pattern)s) OR UPPER(%(query)s) <%% UPPER(name) '
+            'ORDER BY UPPER(name) LIKE UPPER(%(pattern)s) DESC, UPPER(name) LIKE UPPER(%(prefix)s) DESC, '
+            'word_similarity(UPPER(%(query)s), UPPER(name)) DESC, length(name), id '
+            'LIMIT %(limit)s',
+            {'query': query, 'pattern': _like_pattern(query), 'prefix': _like_pattern(query)[1:], 'limit': limit},
+        )
+        return cursor.fetchall()
+
+
+def search_names(model, query, limit=10):
+    """``(id, name)`` of the funds or stocks best matching ``query``, best first."""
+    query = ' '.join(query.split())
+    if not query:
+        return []
+    if trigram_enabled():
+        return _trigram_search(model, query, limit)
+    return name_indexes[model].search(query, limit)
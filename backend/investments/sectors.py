@@ -0,0 +1,154 @@
+"""
+Sector exposure engine: derives investors' SectorAllocation rows from the
+funds they hold instead of storing fixed snapshots.
+
+A holding is worth ``units x fund NAV``. That value is spread over sectors in
+proportion to the fund's stock weights, grouped by ``Stock.sector``. For a
+batch of investors this is one sparse product, ``(investor x fund values) @
+(fund x sector fractions)``.
+
+Updates are incremental. The dependency edges are already indexed in the
+database: stock -> funds through FundStockHolding, and fund -> investors
+through InvestmentHolding. A change to a fund's holdings or NAV, or to a
+stock's sector, recomputes only the investors downstream of it. Investors
+without fund holdings keep whatever allocations are stored for them.
+"""
+import hashlib
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from scipy import sparse
+
+from . import cache
+from .bulk import delete_in
+from .models import FundStockHolding, InvestmentHolding, SectorAllocation
+
+CENT = Decimal('0.01')
+
+# Stocks without a sector, and funds without stock holdings, count here
+OTHER_SECTOR = 'Other Sectors'
+
+SECTOR_COLORS = {
+    'Financial': '#9bb0c7',
+    'Healthcare': '#adb8cf',
+    'Technology': '#c6c4d8',
+    'Consumer Goods': '#dad3e1',
+    'Energy': '#ebe2ea',
+    'Other Sectors': '#f8f3f5',
+    'Automobile': '#d1e0e0',
+    'Real Estate': '#e6d5e6',
+    'Telecom': '#f0e4d7',
+    'Capital Goods': '#dde5d4',
+}
+
+
+def sector_color(name):
+    """The dashboard colour for ``name``; sectors without one get a stable colour derived from the name."""
+    return SECTOR_COLORS.get(name) or '#' + hashlib.md5(name.encode()).hexdigest()[:6]
+
+
+def affected_investments(funds=(), stocks=()):
+    """Ids of the investors whose allocations depend on any of ``funds`` or ``stocks``."""
+    fund_ids = set(funds)
+    if stocks:
+        fund_ids.update(FundStockHolding.objects.filter(stock_id__in=stocks).values_list('fund_id', flat=True))
+    if not fund_ids:
+        return set()
+    return set(
+        InvestmentHolding.objects.filter(fund_id__in=fund_ids).values_list('investment_id', flat=True).distinct()
+    )
+
+
+def fund_compositions(fund_ids):
+    """
+    ``(sector names, fund index, fund x sector matrix)`` where each row holds
+    the fraction of the fund's weight in every sector.
+    """
+    rows = list(
+        FundStockHolding.objects.filter(fund_id__in=fund_ids)
+        .values_list('fund_id', 'stock__sector')
+        .annotate(weight=Sum('weight'))
+    )
+    fund_index = {fund_id: i for i, fund_id in enumerate(sorted(fund_ids))}
+    sectors = sorted({sector or OTHER_SECTOR for _, sector, _ in rows} | {OTHER_SECTOR})
+    sector_index = {sector: i for i, sector in enumerate(sectors)}
+
+    totals = np.zeros(len(fund_index))
+    for fund_id, _, weight in rows:
+        totals[fund_index[fund_id]] += weight
+    composition = sparse.lil_matrix((len(fund_index), len(sectors)))
+    for fund_id, sector, weight in rows:
+        row = fund_index[fund_id]
+        if totals[row] > 0:
+            composition[row, sector_index[sector or OTHER_SECTOR]] += weight / totals[row]
+    for fund_id, row in fund_index.items():
+        if totals[row] <= 0:
+            composition[row, sector_index[OTHER_SECTOR]] = 1.0
+    return sectors, fund_index, composition.tocsr()
+
+
+def compute_allocations(investment_ids):
+    """Unsaved SectorAllocation rows for the given investors that hold priced funds, largest sector first."""
+    holdings = list(
+        InvestmentHolding.objects.filter(investment_id__in=investment_ids, fund__nav__isnull=False)
+        .values_list('investment_id', 'fund_id', 'units', 'fund__nav')
+    )
+    if not holdings:
+        return []
+    investor_ids = sorted({investment_id for investment_id, _, _, _ in holdings})
+    investor_index = {investment_id: i for i, investment_id in enumerate(investor_ids)}
+    sectors, fund_index, composition = fund_compositions({fund_id for _, fund_id, _, _ in holdings})
+
+    values = sparse.coo_matrix(
+        (
+            [float(units * nav) for _, _, units, nav in holdings],
+            (
+                [investor_index[investment_id] for investment_id, _, _, _ in holdings],
+                [fund_index[fund_id] for _, fund_id, _, _ in holdings],
+            ),
+        ),
+        shape=(len(investor_ids), len(fund_index)),
+    ).tocsr()
+    exposure = (values @ composition).toarray()
+
+    allocations = []
+    for investment_id, amounts in zip(investor_ids, exposure):
+        total = amounts.sum()
+        for i in np.argsort(-amounts, kind='stable'):
+            if amounts[i] <= 0:
+                break
+            allocations.append(SectorAllocation(
+                investment_id=investment_id,
+                name=sectors[i],
+                amount=Decimal(amounts[i]).quantize(CENT),
+                percentage=Decimal(amounts[i] / total * 100).quantize(CENT),
+                bgcolor=sector_color(sectors[i]),
+            ))
+    return allocations
+
+
+def refresh_sector_allocations(investment_ids=None, batch_size=1000):
+    """
+    Rewrite SectorAllocation rows for ``investment_ids`` (every investor with
+    fund holdings by default). Returns the number of investors rewritten.
+    """
+    if investment_ids is None:
+        investment_ids = InvestmentHolding.objects.values_list('investment_id', flat=True).distinct()
+    investment_ids = sorted(set(investment_ids))
+
+    count = 0
+    for start in range(0, len(investment_ids), batch_size):
+        batch = investment_ids[start:start + batch_size]
+        allocations = compute_allocations(batch)
+        derived = {allocation.investment_id for allocation in allocations}
+        with transaction.atomic():
+            # In SQL: a per-row post_delete signal would bump the cache generation thousands of times
+            delete_in(SectorAllocation, 'investment', derived)
+            SectorAllocation.objects.bulk_create(allocations)
+        count += len(derived)
+    # bulk_create does not send the signals that invalidate cached responses
+    if count:
+        cache.invalidate('investments')
+    return count
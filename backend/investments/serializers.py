@@ -1,14 +1,125 @@
 from rest_framework import serializers
-from .models import Investment, PerformanceHistory, SectorAllocation, Fund, Stock, FundStockHolding
+from .models import Investment, PerformanceHistory, SectorAllocation, Fund, Stock, FundStockHolding, PortfolioSummary
+from .export import CONTENT_TYPES
+from .telemetry import timed
+from .timeseries import PERIOD_MONTHS
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 
+def split_field_list(value):
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+class PercentageField(serializers.DecimalField):
+    """
+    Percentages are stored as numbers but rendered as "+19%" (``signed``) or
+    "34.0%" strings, which is what the frontend displays as-is.
+    """
+
+    def __init__(self, signed=False, **kwargs):
+        self.signed = signed
+        kwargs.setdefault('max_digits', 7)
+        kwargs.setdefault('decimal_places', 2)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = data.strip().rstrip('%').lstrip('+')
+        return super().to_internal_value(data)
+
+    def to_representation(self, value):
+        if self.signed:
+            return f"{value.normalize():+f}%"
+        return f"{value:.1f}%"
+
+class SparseFieldsetMixin:
+    """
+    Lets clients trim a response with ``?fields=a,b`` and pick nested relations
+    with ``?expand=x,y``. Relations listed in ``Meta.expandable_fields`` are
+    only included when requested once ``expand`` is given, so ``?expand=``
+    returns the flat fields alone.
+    """
+
+    @classmethod
+    def requested_fields(cls, query_params, all_fields):
+        fields = split_field_list(query_params.get('fields'))
+        expand = split_field_list(query_params.get('expand'))
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+
+        selected = set(all_fields) if fields is None else set(fields) & set(all_fields)
+        if expand is not None:
+            selected = (selected - expandable) | (set(expand) & expandable)
+        return selected
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        selected = self.requested_fields(request.query_params, self.fields)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
 class PerformanceHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceHistory
         fields = ['date', 'value']
 
+class SeriesQuerySerializer(serializers.Serializer):
+    # "columnar" renders history as {"dates": [...], "values": [...]} instead of [{date, value}, ...]
+    series = serializers.ChoiceField(choices=['rows', 'columnar'], default='rows')
+
+class PerformanceQuerySerializer(SeriesQuerySerializer):
+    period = serializers.ChoiceField(choices=list(PERIOD_MONTHS), default='MAX')
+    points = serializers.IntegerField(min_value=3, max_value=2000, default=200)
+
+class DashboardQuerySerializer(PerformanceQuerySerializer):
+    # Every investor's full history would make the first paint grow with time
+    period = serializers.ChoiceField(choices=list(PERIOD_MONTHS), default='1Y')
+
+class MetricsQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=list(PERIOD_MONTHS), default='MAX')
+
+class ExportQuerySerializer(serializers.Serializer):
+    format = serializers.ChoiceField(choices=list(CONTENT_TYPES), default='csv')
+
+    def get_fields(self):
+        # "from" is a keyword, so the date bounds cannot be declared as class attributes
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        if attrs.get('from') and attrs.get('to') and attrs['from'] > attrs['to']:
+            raise serializers.ValidationError({'to': ['Must not be before "from".']})
+        return attrs
+
+class FundOverlapQuerySerializer(serializers.Serializer):
+    funds = serializers.CharField()
+
+    def validate_funds(self, value):
+        try:
+            fund_ids = list(dict.fromkeys(int(part) for part in split_field_list(value)))
+        except ValueError:
+            raise serializers.ValidationError('Expected a comma separated list of fund ids.')
+        if not 2 <= len(fund_ids) <= 50:
+            raise serializers.ValidationError('Compare between 2 and 50 funds.')
+        return fund_ids
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
 class SectorAllocationSerializer(serializers.ModelSerializer):
+    percentage = PercentageField(max_digits=5)
+
     class Meta:
         model = SectorAllocation
         fields = ['name', 'amount', 'percentage', 'bgcolor']
@@ -20,25 +131,113 @@ class FundStockHoldingSerializer(serializers.ModelSerializer):
         model = FundStockHolding
         fields = ['stock', 'weight']
 
-class FundSerializer(serializers.ModelSerializer):
+class FundSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     holdings = FundStockHoldingSerializer(many=True)
 
     class Meta:
         model = Fund
-        fields = ['name', 'color', 'holdings']
+        fields = ['id', 'name', 'color', 'holdings']
+        expandable_fields = ['holdings']
+
+class StockSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Stock
+        fields = ['id', 'name', 'sector']
 
-class InvestmentSerializer(serializers.ModelSerializer):
+class StockHolderSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    color = serializers.CharField()
+    weight = serializers.IntegerField()
+
+class ExposureQuerySerializer(serializers.Serializer):
+    stock = serializers.IntegerField(min_value=1)
+
+class FundExposureSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    weight = serializers.IntegerField()
+    share = PercentageField(max_digits=5)  # the stock's share of the fund
+    value = serializers.DecimalField(max_digits=16, decimal_places=2)  # units x NAV
+    amount = serializers.DecimalField(max_digits=16, decimal_places=2)  # value x share
+
+class StockExposureSerializer(serializers.Serializer):
+    investment = serializers.IntegerField()
+    stock = StockSerializer()
+    portfolio_value = serializers.DecimalField(max_digits=16, decimal_places=2)
+    amount = serializers.DecimalField(max_digits=16, decimal_places=2)
+    percentage = PercentageField(max_digits=5)
+    funds = FundExposureSerializer(many=True)
+
+class InvestmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    best_performance_change = PercentageField(signed=True, allow_null=True, required=False)
+    worst_performance_change = PercentageField(signed=True, allow_null=True, required=False)
     performance_history = PerformanceHistorySerializer(many=True)
     sector_allocations = SectorAllocationSerializer(many=True)
 
     class Meta:
         model = Investment
         fields = [
-            'user_name', 'current_value', 'initial_value',
+            'id', 'user_name', 'current_value', 'initial_value',
             'best_performing_scheme', 'best_performance_change',
             'worst_performing_scheme', 'worst_performance_change',
             'performance_history', 'sector_allocations'
         ]
+        expandable_fields = ['performance_history', 'sector_allocations']
+
+class PortfolioSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PortfolioSummary
+        fields = [
+            'investment', 'as_of', 'current_value', 'invested_value', 'absolute_return', 'return_percentage',
+            'cagr', 'day_change', 'day_change_percentage',
+            'best_performing_scheme', 'best_performance_change',
+            'worst_performing_scheme', 'worst_performance_change', 'updated_at',
+        ]
+
+class SectorTotalSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=16, decimal_places=2)
+    percentage = PercentageField(max_digits=5)
+    bgcolor = serializers.CharField()
+
+class PortfolioAggregateSerializer(serializers.Serializer):
+    investors = serializers.IntegerField()
+    total_value = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total_invested = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total_growth = serializers.DecimalField(max_digits=16, decimal_places=2)
+    growth_percentage = serializers.DecimalField(max_digits=9, decimal_places=2, allow_null=True)
+    sectors = SectorTotalSerializer(many=True)
+
+def metric_field(**kwargs):
+    return serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True, **kwargs)
+
+class RollingReturnSerializer(serializers.Serializer):
+    latest = metric_field()
+    average = metric_field()
+    min = metric_field()
+    max = metric_field()
+
+class InvestmentMetricsSerializer(serializers.Serializer):
+    """Output of ``analytics.series_metrics``; percentages are in percent."""
+    period = serializers.CharField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    points = serializers.IntegerField()
+    start_value = metric_field()
+    end_value = metric_field()
+    absolute_return = metric_field()
+    total_return = metric_field()
+    cagr = metric_field()
+    xirr = metric_field()
+    volatility = metric_field()
+    sharpe = metric_field()
+    max_drawdown = metric_field()
+    max_drawdown_start = serializers.DateField(allow_null=True)
+    max_drawdown_end = serializers.DateField(allow_null=True)
+    day_change = metric_field()
+    day_change_percentage = metric_field()
+    rolling_returns = serializers.DictField(child=RollingReturnSerializer(allow_null=True))
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -54,18 +253,8 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if email and password:
-            # Try to find user by email first
-            try:
-                user = User.objects.get(email=email)
-                # Use username for authentication
-                user = authenticate(
-                    request=self.context.get('request'),
-                    username=user.username,
-                    password=password
-                )
-            except User.DoesNotExist:
-                user = None
-                
+            # Resolved by investments.authentication.EmailBackend in a single query
+            user = authenticate(request=self.context.get('request'), email=email, password=password)
             if not user:
                 msg = 'Unable to log in with provided credentials.'
                 raise serializers.ValidationError(msg, code='authorization')
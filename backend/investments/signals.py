@@ -0,0 +1,133 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import cache, packed
+from .analytics import record_history_change
+from .authentication import forget_tokens
+from .models import (
+    Investment, PerformanceHistory, SectorAllocation, PortfolioSummary, Fund, FundNav, Stock, FundStockHolding,
+    InvestmentHolding,
+)
+from .overlap import record_holding_change
+from .search import record_name_change
+from .sectors import affected_investments, refresh_sector_allocations
+from .summary import refresh_summaries
+from .valuation import refresh_fund_navs
+
+
+@receiver([post_save, post_delete], sender=FundStockHolding)
+def holding_changed(sender, instance, **kwargs):
+    record_holding_change(instance.fund_id)
+    refresh_sector_allocations(affected_investments(funds=[instance.fund_id]))
+
+
+@receiver(post_save, sender=Fund)
+def fund_saved(sender, instance, **kwargs):
+    # The NAV may have changed, which moves every holder's sector amounts
+    refresh_sector_allocations(affected_investments(funds=[instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=FundNav)
+def fund_nav_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Fund):
+        return
+    # Fund.nav follows the latest NAV in the series
+    if refresh_fund_navs(Fund.objects.filter(pk=instance.fund_id)):
+        refresh_sector_allocations(affected_investments(funds=[instance.fund_id]))
+
+
+@receiver([post_save, post_delete], sender=Fund)
+@receiver([post_save, post_delete], sender=Stock)
+def name_changed(sender, instance, **kwargs):
+    record_name_change(sender)
+
+
+@receiver(post_save, sender=Stock)
+def stock_saved(sender, instance, **kwargs):
+    refresh_sector_allocations(affected_investments(stocks=[instance.pk]))
+
+
+@receiver(post_save, sender=InvestmentHolding)
+def investment_holding_saved(sender, instance, **kwargs):
+    refresh_sector_allocations([instance.investment_id])
+
+
+@receiver(post_delete, sender=InvestmentHolding)
+def investment_holding_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Investment):
+        # Cascaded from deleting the investment, whose allocations go with it
+        return
+    if InvestmentHolding.objects.filter(investment_id=instance.investment_id).exists():
+        refresh_sector_allocations([instance.investment_id])
+    else:
+        # Nothing left to derive from, so drop the allocations derived from the last holding
+        SectorAllocation.objects.filter(investment_id=instance.investment_id).delete()
+
+
+@receiver(pre_save, sender=PerformanceHistory)
+def performance_history_saving(sender, instance, **kwargs):
+    if instance.pk is None or not packed.mirrored():
+        return
+    stored = PerformanceHistory.objects.filter(pk=instance.pk).values_list('investment_id', 'date').first()
+    if stored is not None and stored != (instance.investment_id, instance.date):
+        # Moved to another date or investment, which leaves the old point packed
+        packed.repack_on_commit({stored[0], instance.investment_id})
+
+
+@receiver([post_save, post_delete], sender=PerformanceHistory)
+def performance_history_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Investment):
+        # Cascaded from deleting the investment, whose summary goes with it
+        return
+    record_history_change([instance.investment_id])
+    refresh_summaries(Investment.objects.filter(pk=instance.investment_id))
+
+
+@receiver(post_save, sender=PerformanceHistory)
+def performance_history_saved(sender, instance, **kwargs):
+    if packed.mirrored():
+        packed.write_points([(instance.investment_id, instance.date, instance.value)])
+
+
+@receiver(post_delete, sender=PerformanceHistory)
+def performance_history_deleted(sender, instance, origin=None, **kwargs):
+    if packed.mirrored() and not isinstance(origin, Investment):
+        packed.repack_on_commit([instance.investment_id])
+
+
+@receiver(post_save, sender=Investment)
+def investment_saved(sender, instance, **kwargs):
+    refresh_summaries(Investment.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Fund)
+@receiver([post_save, post_delete], sender=Stock)
+@receiver([post_save, post_delete], sender=FundStockHolding)
+def invalidate_funds(sender, **kwargs):
+    cache.invalidate('funds')
+
+
+@receiver([post_save, post_delete], sender=Investment)
+@receiver([post_save, post_delete], sender=InvestmentHolding)
+@receiver([post_save, post_delete], sender=PerformanceHistory)
+@receiver([post_save, post_delete], sender=SectorAllocation)
+@receiver([post_save, post_delete], sender=PortfolioSummary)
+def invalidate_investments(sender, **kwargs):
+    cache.invalidate('investments')
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_users(sender, instance, update_fields=None, **kwargs):
+    # Every login saves last_login, which neither cached responses nor token checks look at
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    cache.invalidate('users')
+    # Cached token lookups hold the user, e.g. a deactivated one
+    forget_tokens(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_tokens(instance.key)
@@ -0,0 +1,121 @@
+from decimal import Decimal
+
+from django.db.models import Exists, Max, Min, OuterRef, Subquery
+
+from . import cache
+from .models import Investment, PerformanceHistory, PortfolioSummary
+
+CENT = Decimal('0.01')
+
+# Largest annualized rate, in %, PortfolioSummary.cagr can store; a large gain over a few days exceeds it
+MAX_CAGR = Decimal('9999999.99')
+
+SUMMARY_FIELDS = [
+    'as_of', 'current_value', 'invested_value', 'absolute_return', 'return_percentage', 'cagr',
+    'day_change', 'day_change_percentage', 'best_performing_scheme', 'best_performance_change',
+    'worst_performing_scheme', 'worst_performance_change', 'updated_at',
+]
+
+
+def _percentage(part, whole):
+    if not whole:
+        return None
+    return (Decimal(part) / Decimal(whole) * 100).quantize(CENT)
+
+
+def _cagr(invested, current, first_date, last_date):
+    """
+    Annual growth rate, in %, from ``invested`` at ``first_date`` to
+    ``current`` at ``last_date``. Only these two values are known, not the
+    dated contributions in between, so this is a CAGR rather than an XIRR.
+    """
+    if not (first_date and last_date and last_date > first_date) or invested <= 0 or current < 0:
+        return None
+    years = (last_date - first_date).days / 365
+    try:
+        rate = (float(current) / float(invested)) ** (1 / years) - 1
+    except OverflowError:
+        return None
+    rate = (Decimal(rate) * 100).quantize(CENT)
+    return None if abs(rate) > MAX_CAGR else rate
+
+
+def build_summary(investment):
+    """Build an unsaved PortfolioSummary from an investment annotated by ``refresh_summaries``."""
+    absolute_return = investment.current_value - investment.initial_value
+
+    day_change = None
+    if investment.last_value is not None and investment.previous_value is not None:
+        day_change = investment.last_value - investment.previous_value
+
+    return PortfolioSummary(
+        investment=investment,
+        as_of=investment.last_date,
+        current_value=investment.current_value,
+        invested_value=investment.initial_value,
+        absolute_return=absolute_return,
+        return_percentage=_percentage(absolute_return, investment.initial_value) or Decimal(0),
+        cagr=_cagr(investment.initial_value, investment.current_value, investment.first_date, investment.last_date),
+        day_change=day_change,
+        day_change_percentage=None if day_change is None else _percentage(day_change, investment.previous_value),
+        best_performing_scheme=investment.best_performing_scheme,
+        best_performance_change=investment.best_performance_change,
+        worst_performing_scheme=investment.worst_performing_scheme,
+        worst_performance_change=investment.worst_performance_change,
+    )
+
+
+def refresh_current_values(investments=None):
+    """
+    Set ``current_value`` to the latest PerformanceHistory value for
+    ``investments`` (all by default) that have history, in one UPDATE.
+    Only rows whose value changed are written. Returns the number updated.
+    """
+    if investments is None:
+        investments = Investment.objects.all()
+    history = PerformanceHistory.objects.filter(investment=OuterRef('pk'))
+    latest = Subquery(history.order_by('-date').values('value')[:1])
+    # update() skips the post_save signals, so callers refresh summaries afterwards
+    return investments.filter(Exists(history)).exclude(current_value=latest).update(current_value=latest)
+
+
+def refresh_summaries(investments=None, batch_size=1000):
+    """
+    Recompute PortfolioSummary rows for ``investments`` (all by default).
+
+    Everything needed is fetched in a single annotated query, and the rows are
+    written with one upsert per batch, so refreshing one investment or the
+    whole table costs the same number of round trips per batch.
+    """
+    if investments is None:
+        investments = Investment.objects.all()
+    latest = PerformanceHistory.objects.filter(investment=OuterRef('pk')).order_by('-date').values('value')
+    investments = investments.annotate(
+        first_date=Min('performance_history__date'),
+        last_date=Max('performance_history__date'),
+        last_value=Subquery(latest[:1]),
+        previous_value=Subquery(latest[1:2]),
+    ).order_by('pk')
+
+    count = 0
+    batch = []
+    for investment in investments.iterator(chunk_size=batch_size):
+        batch.append(build_summary(investment))
+        if len(batch) >= batch_size:
+            count += _upsert(batch)
+            batch = []
+    if batch:
+        count += _upsert(batch)
+    # bulk_create does not send the signals that invalidate cached responses
+    cache.invalidate('investments')
+    return count
+
+
+def _upsert(summaries):
+    PortfolioSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['investment'],
+        update_fields=SUMMARY_FIELDS,
+    )
+    return len(summaries)
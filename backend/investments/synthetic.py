@@ -0,0 +1,196 @@
+"""
+Synthetic data generator for benchmarks and load tests.
+
+Produces the same shapes as ``populate_data`` at configurable scale. Every
+generated name starts with ``SYNTHETIC_PREFIX`` so the rows can be removed
+again without touching real data.
+"""
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from . import cache, packed
+from .bulk import delete_in
+from .ingest import FundNavLoader, chunked, default_loader
+from .models import (
+    Investment, PerformanceHistory, PackedHistory, SectorAllocation, PortfolioSummary, Fund, FundNav, Stock,
+    FundStockHolding, InvestmentHolding,
+)
+from .overlap import record_holding_change
+from .search import record_name_change
+from .sectors import SECTOR_COLORS, refresh_sector_allocations
+from .summary import refresh_summaries
+
+SYNTHETIC_PREFIX = 'synthetic-'
+
+SECTORS = list(SECTOR_COLORS)
+
+
+def clear():
+    """
+    Delete previously generated rows.
+
+    Everything is deleted in SQL with ``bulk.delete_in``, dependent rows
+    first. Cascading through the ORM would load every holding and allocation
+    and send its signals one row at a time: a sector refresh, a change log
+    entry and a cache bump each. The few derived caches they keep fresh are
+    updated once at the end.
+    """
+    investments = list(
+        Investment.objects.filter(user_name__startswith=SYNTHETIC_PREFIX).values_list('pk', flat=True)
+    )
+    funds = list(Fund.objects.filter(name__startswith=SYNTHETIC_PREFIX).values_list('pk', flat=True))
+    stocks = list(Stock.objects.filter(name__startswith=SYNTHETIC_PREFIX).values_list('pk', flat=True))
+    changed_funds = set(funds)
+    changed_funds.update(FundStockHolding.objects.filter(stock__in=stocks).values_list('fund_id', flat=True))
+    # Other investors holding an affected fund keep allocations derived from it
+    holders = set(
+        InvestmentHolding.objects.filter(fund_id__in=changed_funds).exclude(investment__in=investments)
+        .values_list('investment_id', flat=True)
+    )
+
+    using = Investment.objects.db
+    with transaction.atomic(using=using):
+        for model, field_name, ids in [
+            (PerformanceHistory, 'investment', investments),
+            (PackedHistory, 'investment', investments),
+            (SectorAllocation, 'investment', investments),
+            (PortfolioSummary, 'investment', investments),
+            (InvestmentHolding, 'investment', investments),
+            (InvestmentHolding, 'fund', funds),
+            (FundStockHolding, 'fund', funds),
+            (FundStockHolding, 'stock', stocks),
+            (FundNav, 'fund', funds),
+            (Investment, 'id', investments),
+            (Fund, 'id', funds),
+            (Stock, 'id', stocks),
+        ]:
+            delete_in(model, field_name, ids, using=using)
+
+    for fund_id in changed_funds:
+        record_holding_change(fund_id)
+    record_name_change(Fund)
+    record_name_change(Stock)
+    cache.invalidate('funds', 'investments')
+    refresh_sector_allocations(holders)
+
+
+def _history(investment_ids, start, days, rng):
+    for investment_id in investment_ids:
+        value = rng.uniform(100000, 1000000)
+        for day in range(days):
+            # Random walk with a small upward drift
+            value *= 1 + rng.gauss(0.0004, 0.01)
+            yield investment_id, start + timedelta(days=day), round(value, 2)
+
+
+def _fund_navs(funds, start, days, rng):
+    for fund in funds:
+        # Walk back from the latest NAV, so the series ends at Fund.nav
+        nav = float(fund.nav)
+        navs = []
+        for _ in range(days):
+            navs.append(round(nav, 4))
+            nav /= 1 + rng.gauss(0.0004, 0.01)
+        for day, value in enumerate(reversed(navs)):
+            yield fund.pk, start + timedelta(days=day), value
+
+
+def generate(users=100, days=365, funds=50, stocks=500, holdings_per_fund=40, funds_per_user=3, seed=42, end=None,
+             chunk_size=50000):
+    """
+    Create ``users`` investments with ``days`` of daily history each, plus
+    ``funds`` funds holding ``holdings_per_fund`` of ``stocks`` stocks.
+    Every investment holds units of ``funds_per_user`` funds, from which its
+    sector allocations are derived.
+
+    History goes through the NAV ingestion loaders (``COPY`` on PostgreSQL),
+    so generating tens of millions of rows stays constant-memory. Returns a
+    dict of row counts.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+
+    investments = Investment.objects.bulk_create([
+        Investment(
+            user_name=f'{SYNTHETIC_PREFIX}{i}',
+            current_value=0,
+            initial_value=0,
+            best_performing_scheme=f'{SYNTHETIC_PREFIX}fund-{rng.randrange(max(funds, 1))}',
+            best_performance_change=round(rng.uniform(0, 30), 2),
+            worst_performing_scheme=f'{SYNTHETIC_PREFIX}fund-{rng.randrange(max(funds, 1))}',
+            worst_performance_change=round(rng.uniform(-15, 0), 2),
+        )
+        for i in range(users)
+    ], batch_size=1000)
+    investment_ids = list(
+        Investment.objects.filter(user_name__startswith=SYNTHETIC_PREFIX).order_by('pk').values_list('pk', flat=True)
+    )
+
+    loader = default_loader()
+    first_values, last_values = {}, {}
+    history_rows = 0
+    for chunk in chunked(_history(investment_ids, start, days, rng), chunk_size):
+        for investment_id, _, value in chunk:
+            first_values.setdefault(investment_id, value)
+            last_values[investment_id] = value
+        history_rows += loader.load(chunk)
+
+    for investment in investments:
+        investment.initial_value = first_values.get(investment.pk, 0)
+        investment.current_value = last_values.get(investment.pk, 0)
+    Investment.objects.bulk_update(investments, ['initial_value', 'current_value'], batch_size=1000)
+
+    stock_objects = Stock.objects.bulk_create([
+        Stock(name=f'{SYNTHETIC_PREFIX}stock-{i}', sector=rng.choice(SECTORS)) for i in range(stocks)
+    ], batch_size=5000)
+    fund_objects = Fund.objects.bulk_create([
+        Fund(
+            name=f'{SYNTHETIC_PREFIX}fund-{i}',
+            color=f'#{rng.randrange(0x1000000):06x}',
+            nav=round(rng.uniform(10, 1500), 4),
+        )
+        for i in range(funds)
+    ], batch_size=5000)
+    holdings = [
+        FundStockHolding(fund=fund, stock=stock, weight=rng.randint(1, 10))
+        for fund in fund_objects
+        for stock in rng.sample(stock_objects, min(holdings_per_fund, len(stock_objects)))
+    ]
+    FundStockHolding.objects.bulk_create(holdings, batch_size=5000)
+    nav_loader = FundNavLoader(batch_size=5000)
+    fund_navs = sum(nav_loader.load(chunk) for chunk in chunked(_fund_navs(fund_objects, start, days, rng), chunk_size))
+
+    investor_holdings = []
+    for investment in investments:
+        held = rng.sample(fund_objects, min(funds_per_user, len(fund_objects)))
+        for fund in held:
+            value = float(investment.current_value) / len(held)
+            investor_holdings.append(InvestmentHolding(
+                investment=investment, fund=fund, units=round(value / float(fund.nav), 4),
+                cost=round(float(investment.initial_value) / len(held), 2),
+            ))
+    InvestmentHolding.objects.bulk_create(investor_holdings, batch_size=5000)
+
+    # bulk_create skips the signals that keep derived data and caches fresh
+    for fund in fund_objects:
+        record_holding_change(fund.pk)
+    record_name_change(Fund)
+    record_name_change(Stock)
+    cache.invalidate('funds')
+    refresh_sector_allocations(investment_ids)
+    refresh_summaries(Investment.objects.filter(user_name__startswith=SYNTHETIC_PREFIX))
+    if packed.mirrored():
+        packed.pack_investments(Investment.objects.filter(pk__in=investment_ids))
+
+    return {
+        'investments': len(investment_ids),
+        'performance_history': history_rows,
+        'investment_holdings': len(investor_holdings),
+        'fund_navs': fund_navs,
+        'funds': len(fund_objects),
+        'stocks': len(stock_objects),
+        'holdings': len(holdings),
+    }
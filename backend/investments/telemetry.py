@@ -0,0 +1,371 @@
+"""
+Per-request performance telemetry, enabled with ``TELEMETRY_ENABLED``.
+
+``TelemetryMiddleware`` measures each request's wall time, database queries
+and query time (through an execute wrapper on every connection), time spent
+serializing (``timed('serialize')`` spans in the serializers) and response
+size. It reports them to the client in a ``Server-Timing`` header and adds
+them to the metrics served as Prometheus text at ``/metrics``. Latency is a
+histogram per route, labelled with the URL name.
+
+Each worker counts into a local buffer and adds it to shared counters in the
+cache every ``TELEMETRY_FLUSH_INTERVAL`` seconds. ``/metrics`` therefore
+reports every worker's requests, and totals survive worker restarts.
+
+A request is profiled when it sends ``X-Profile: <PROFILE_TOKEN>``, or at
+random for ``PROFILE_SAMPLE_RATE`` of requests. The profile is written to
+``PROFILE_DIR`` with cProfile, or with pyinstrument when ``PROFILER`` is
+``pyinstrument`` and it is installed.
+
+When disabled the middleware removes itself from the stack and the spans
+cost one context variable lookup.
+"""
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import hashlib
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.crypto import constant_time_compare
+from django.utils.text import slugify
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional, for PROFILER=pyinstrument
+    Profiler = None
+
+CATALOG_KEY = 'telemetry:catalog'
+SERIES_KEY = 'telemetry:series:{}'
+
+# Upper bounds in seconds, as in prometheus_client's defaults
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# name: (type, help, scale); values are counted as integers and multiplied by scale on output
+METRICS = {
+    'fundsight_requests_total': ('counter', 'Requests served.', 1),
+    'fundsight_request_duration_seconds': ('histogram', 'Request wall time.', 1e-6),
+    'fundsight_request_db_queries_total': ('counter', 'Database queries run by requests.', 1),
+    'fundsight_request_db_seconds_total': ('counter', 'Time requests spent in database queries.', 1e-6),
+    'fundsight_request_serialize_seconds_total': ('counter', 'Time requests spent serializing.', 1e-6),
+    'fundsight_response_bytes_total': ('counter', 'Response body bytes, excluding streamed responses.', 1),
+}
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_current = contextvars.ContextVar('telemetry', default=None)
+_noop = contextlib.nullcontext()
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.spans = Counter()
+        self.open = set()
+
+
+class _Span:
+    __slots__ = ('timing', 'name', 'started')
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.timing.open.add(self.name)
+
+    def __exit__(self, *exc_info):
+        self.timing.open.discard(self.name)
+        self.timing.spans[self.name] += time.perf_counter() - self.started
+
+
+def timed(name):
+    """Context manager adding its duration to the current request's ``name`` span; nested spans count once."""
+    timing = _current.get()
+    if timing is None or name in timing.open:
+        return _noop
+    return _Span(timing, name)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.db += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def series(name, suffix='', **labels):
+    label_text = ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items())
+    return name, f'{name}{suffix}{{{label_text}}}'
+
+
+class MetricsBuffer:
+    """This worker's counts since the last flush to the shared counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = Counter()
+        self.last_flush = time.monotonic()
+        # Series keys per label combination, formatted once
+        self._series = {}
+
+    def route_series(self, route, method, status):
+        keys = self._series.get((route, method, status))
+        if keys is None:
+            name = 'fundsight_request_duration_seconds'
+            keys = self._series[route, method, status] = {
+                'requests': series('fundsight_requests_total', route=route, method=method, status=status),
+                'buckets': [
+                    series(name, '_bucket', route=route, method=method, le=bound)
+                    for bound in (*DURATION_BUCKETS, '+Inf')
+                ],
+                'count': series(name, '_count', route=route, method=method),
+                'sum': series(name, '_sum', route=route, method=method),
+                'queries': series('fundsight_request_db_queries_total', route=route),
+                'db': series('fundsight_request_db_seconds_total', route=route),
+                'serialize': series('fundsight_request_serialize_seconds_total', route=route),
+                'bytes': series('fundsight_response_bytes_total', route=route),
+            }
+        return keys
+
+    def observe(self, route, method, status, duration, timing, size):
+        if method not in HTTP_METHODS:
+            # Label values must come from a small set, whatever clients send
+            method = 'other'
+        keys = self.route_series(route, method, status)
+        counts = [
+            (keys['requests'], 1),
+            (keys['count'], 1),
+            (keys['sum'], round(duration * 1e6)),
+            (keys['queries'], timing.queries),
+            (keys['db'], round(timing.db * 1e6)),
+            (keys['serialize'], round(timing.spans['serialize'] * 1e6)),
+        ]
+        # Buckets are cumulative: every bucket from the first bound at or above the duration
+        counts.extend((key, 1) for key in keys['buckets'][bisect.bisect_left(DURATION_BUCKETS, duration):])
+        if size is not None:
+            counts.append((keys['bytes'], size))
+        with self._lock:
+            for key, value in counts:
+                self.pending[key] += value
+
+    def flush_due(self):
+        return time.monotonic() - self.last_flush >= getattr(settings, 'TELEMETRY_FLUSH_INTERVAL', 5)
+
+    def flush(self, force=False):
+        """Add the pending counts to the shared counters, at most every ``TELEMETRY_FLUSH_INTERVAL`` seconds."""
+        with self._lock:
+            if not force and not self.flush_due():
+                return
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+
+        keys = {key: hashlib.md5(key[1].encode()).hexdigest() for key in pending}
+        # Re-register anything missing on every flush, so a lost catalog update heals itself
+        catalog = cache.get(CATALOG_KEY) or {}
+        missing = {digest: key for key, digest in keys.items() if digest not in catalog}
+        if missing:
+            cache.set(CATALOG_KEY, {**catalog, **missing}, timeout=None)
+        for key, value in pending.items():
+            cache_key = SERIES_KEY.format(keys[key])
+            try:
+                cache.incr(cache_key, value)
+            except ValueError:
+                cache.add(cache_key, 0, timeout=None)
+                cache.incr(cache_key, value)
+
+
+buffer = MetricsBuffer()
+
+
+def _format_value(value, scale):
+    return repr(value * scale) if scale != 1 else str(value)
+
+
+def _sample_order(sample):
+    # Buckets in numeric rather than string order of their upper bound
+    line, _ = sample
+    head, _, bound = line.partition('le="')
+    return head, float(bound.rstrip('"}')) if bound else 0.0
+
+
+def render_metrics():
+    """Every shared counter in the Prometheus text exposition format."""
+    buffer.flush(force=True)
+    catalog = cache.get(CATALOG_KEY) or {}
+    values = cache.get_many([SERIES_KEY.format(digest) for digest in catalog])
+    by_metric = {}
+    for digest, (name, line) in catalog.items():
+        value = values.get(SERIES_KEY.format(digest))
+        if value is not None:
+            by_metric.setdefault(name, []).append((line, value))
+
+    lines = []
+    for name, (kind, help_text, scale) in METRICS.items():
+        samples = by_metric.get(name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for line, value in sorted(samples, key=_sample_order):
+            # Bucket and count samples are event counts, whatever the metric's unit
+            sample_scale = scale if not line.startswith((f'{name}_bucket', f'{name}_count')) else 1
+            lines.append(f'{line} {_format_value(value, sample_scale)}')
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(duration, timing):
+    parts = [
+        f'db;dur={timing.db * 1000:.1f};desc="{timing.queries} queries"',
+        *(f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(timing.spans.items())),
+        f'total;dur={duration * 1000:.1f}',
+    ]
+    return ', '.join(parts)
+
+
+def _profile_requested(request):
+    """``(profile, asked)``: whether to profile, and whether the client asked for it with the token."""
+    token = getattr(settings, 'PROFILE_TOKEN', '')
+    header = request.META.get('HTTP_X_PROFILE')
+    if token and header and constant_time_compare(header, token):
+        return True, True
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate, False
+
+
+class _RequestProfiler:
+    def __init__(self):
+        self.pyinstrument = getattr(settings, 'PROFILER', 'cprofile') == 'pyinstrument' and Profiler is not None
+        self.profiler = Profiler() if self.pyinstrument else cProfile.Profile()
+
+    def __enter__(self):
+        if self.pyinstrument:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def __exit__(self, *exc_info):
+        if self.pyinstrument:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def dump(self, request):
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = slugify(request.path.strip('/').replace('/', '-')) or 'root'
+        path = directory / f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{random.getrandbits(32):08x}'
+        if self.pyinstrument:
+            path = path.with_suffix('.html')
+            path.write_text(self.profiler.output_html())
+        else:
+            path = path.with_suffix('.prof')
+            self.profiler.dump_stats(path)
+        return path
+
+
+class TelemetryMiddleware:
+    """
+    Goes first in ``MIDDLEWARE`` so its wall time covers the rest of the stack.
+
+    Both sync and async capable: under ASGI it awaits the async stack
+    instead of Django running it on a thread through ``async_to_sync``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TELEMETRY_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder, dispatch_uid='telemetry-query-recorder')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = _current.set(timing)
+        profile, asked = _profile_requested(request)
+        profiler = _RequestProfiler() if profile else None
+        started = time.perf_counter()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                with profiler:
+                    response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        path = profiler.dump(request) if profiler is not None else None
+        self.record(request, response, duration, timing, path if asked else None)
+        buffer.flush()
+        return response
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        profile, asked = _profile_requested(request)
+        # The profiler sees every task on the event loop thread while it runs, not just this request
+        profiler = _RequestProfiler() if profile else None
+        started = time.perf_counter()
+        try:
+            if profiler is None:
+                response = await self.get_response(request)
+            else:
+                with profiler:
+                    response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        path = await sync_to_async(profiler.dump)(request) if profiler is not None else None
+        self.record(request, response, duration, timing, path if asked else None)
+        # Flushing talks to the cache, so keep it off the event loop, and only when one is due
+        if buffer.flush_due():
+            await sync_to_async(buffer.flush)()
+        return response
+
+    def record(self, request, response, duration, timing, profile_path):
+        response['Server-Timing'] = server_timing(duration, timing)
+        if profile_path is not None:
+            response['X-Profile-File'] = profile_path.name
+
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        buffer.observe(route, request.method, response.status_code, duration, timing, size)
@@ -1,3 +1,1511 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pstats
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .models import (
+    Investment, PerformanceHistory, SectorAllocation, Fund, Stock, FundStockHolding, PortfolioSummary,
+    InvestmentHolding, Job, PackedHistory, FundNav,
+)
+from .analytics import investment_metrics, refresh_metrics, series_metrics, to_arrays
+from .authentication import EmailBackend
+from .bulk import delete_in
+from .changelist import SkipScanQuerySet
+from .cron import CronSchedule
+from .holders import StockHoldersIndex
+from .ingest import default_loader
+from .jobs import Scheduler, Worker, claim, enqueue, requeue_stale, run_job
+from .overlap import VERSION_KEY as OVERLAP_VERSION_KEY, FundOverlapEngine
+from .packed import pack_investments, read_series, write_points
+from .partitioning import TABLE as PARTITIONED_TABLE, convert_to_partitioned, create_partitions, existing_partitions, partition_name
+from .renderers import ORJSONRenderer
+from .search import NameIndex
+from .sectors import affected_investments, refresh_sector_allocations
+from .serializers import InvestmentSerializer
+from .telemetry import TelemetryMiddleware
+from .valuation import navs_on, revalue
+
+
+def create_investments(count, days=5):
+    investments = []
+    for i in range(count):
+        investment = Investment.objects.create(
+            user_name=f'User {i}',
+            current_value=110000,
+            initial_value=100000,
+        )
+        PerformanceHistory.objects.bulk_create([
+            PerformanceHistory(investment=investment, date=date(2024, 9, 1) + timedelta(days=d), value=100000 + d)
+            for d in range(days)
+        ])
+        SectorAllocation.objects.bulk_create([
+            SectorAllocation(investment=investment, name=name, amount=55000, percentage=50, bgcolor='#9bb0c7')
+            for name in ('Financial', 'Technology')
+        ])
+        investments.append(investment)
+    return investments
+
+
+def create_funds(count, stocks_per_fund=4):
+    stocks = [Stock.objects.get_or_create(name=f'STOCK{i}')[0] for i in range(stocks_per_fund * 2)]
+    funds = []
+    for i in range(count):
+        fund = Fund.objects.create(name=f'Fund {i}', color='#f8d07b')
+        FundStockHolding.objects.bulk_create([
+            FundStockHolding(fund=fund, stock=stock, weight=5 + j)
+            for j, stock in enumerate(stocks[i % 2:i % 2 + stocks_per_fund])
+        ])
+        funds.append(fund)
+    return funds
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='demo', email='demo@fundsight.com', password='SecurePass123!')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
+class QueryBudgetTests(APITestCase):
+    """List endpoints must run a fixed number of queries regardless of row count."""
+
+    def assert_budget(self, url, budget):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_investment_list(self):
+        create_investments(2)
+        self.assert_budget('/api/investments/', 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_investments(10)
+        response = self.assert_budget('/api/investments/', 3)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_investment_detail(self):
+        investment = create_investments(1)[0]
+        response = self.assert_budget(f'/api/investments/{investment.pk}/', 3)
+        self.assertEqual(len(response.data['performance_history']), 5)
+
+    def test_fund_list(self):
+        create_funds(2)
+        self.assert_budget('/api/funds/', 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_funds(10)
+        response = self.assert_budget('/api/funds/', 2)
+        self.assertEqual(response.data['results'][0]['holdings'][0]['stock'], 'STOCK0')
+
+
+class PaginationTests(APITestCase):
+    def test_cursor_pages_cover_every_investment(self):
+        create_investments(7, days=1)
+        seen = []
+        url = '/api/investments/?page_size=3'
+        while url:
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Investment.objects.values_list('id', flat=True)))
+
+    def test_expand_skips_unrequested_relations(self):
+        create_investments(3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/investments/', {'fields': 'id,user_name,current_value', 'expand': ''})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'user_name', 'current_value'})
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/investments/', {'expand': 'sector_allocations'})
+        row = response.data['results'][0]
+        self.assertIn('sector_allocations', row)
+        self.assertNotIn('performance_history', row)
+        self.assertIn('best_performing_scheme', row)
+
+    def test_fund_fields(self):
+        create_funds(2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/funds/', {'fields': 'id,name'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+
+class PerformanceEndpointTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.investment = create_investments(1, days=0)[0]
+        today = timezone.localdate()
+        PerformanceHistory.objects.bulk_create([
+            PerformanceHistory(investment=self.investment, date=today - timedelta(days=d), value=100000 + d % 7)
+            for d in range(1000)
+        ])
+        self.url = f'/api/investments/{self.investment.pk}/performance/'
+
+    def test_period_filters_in_database(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'period': '1M', 'points': 2000})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(response.data['total_points'], 32)
+        self.assertEqual(len(response.data['performance_history']), response.data['total_points'])
+
+    def test_downsamples_to_requested_points(self):
+        response = self.client.get(self.url, {'period': 'MAX', 'points': 100})
+        self.assertEqual(response.data['total_points'], 1000)
+        history = response.data['performance_history']
+        self.assertEqual(len(history), 100)
+        self.assertEqual(history[-1]['date'], timezone.localdate().isoformat())
+
+    def test_rejects_unknown_period(self):
+        response = self.client.get(self.url, {'period': '2W'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_columnar_series(self):
+        rows = self.client.get(self.url, {'points': 50}).data['performance_history']
+        columns = self.client.get(self.url, {'points': 50, 'series': 'columnar'}).data['performance_history']
+        self.assertEqual(columns['dates'], [point['date'] for point in rows])
+        self.assertEqual(columns['values'], [point['value'] for point in rows])
+
+
+class HistoryDedupeMigrationTests(TransactionTestCase):
+    """Migration 0003 collapses duplicate days before adding the (investment, date) unique index."""
+    before = [('investments', '0002_portfolio_summary')]
+    after = [('investments', '0003_performance_history_investment_date')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.addCleanup(self.migrate_to_latest)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_latest_row_of_each_day_survives(self):
+        Investment = self.apps.get_model('investments', 'Investment')
+        History = self.apps.get_model('investments', 'PerformanceHistory')
+        first, second = [
+            Investment.objects.create(user_name=name, current_value=1, initial_value=1) for name in ('A', 'B')
+        ]
+        for investment, day, value in [
+            (first, date(2024, 1, 1), 1), (first, date(2024, 1, 1), 2), (first, date(2024, 1, 1), 3),
+            (first, date(2024, 1, 2), 4), (second, date(2024, 1, 1), 5),
+        ]:
+            History.objects.create(investment=investment, date=day, value=value)
+
+        MigrationExecutor(connection).migrate(self.after)
+        self.assertEqual(
+            sorted(PerformanceHistory.objects.values_list('investment_id', 'date', 'value')),
+            [(first.pk, date(2024, 1, 1), 3), (first.pk, date(2024, 1, 2), 4), (second.pk, date(2024, 1, 1), 5)],
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning is PostgreSQL only')
+class PartitioningTests(TestCase):
+    def partition_dates(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT date FROM {name} ORDER BY date')
+            return [day for day, in cursor.fetchall()]
+
+    def test_convert_and_create_partitions(self):
+        investment = create_investments(1, days=0)[0]
+        for day in [date(2023, 6, 1), date(2024, 6, 1), date(2026, 3, 1)]:
+            PerformanceHistory.objects.create(investment=investment, date=day, value=1)
+        with connection.cursor() as cursor:
+            # Deferred foreign key checks from the rows above would block dropping the old table
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        self.assertTrue(convert_to_partitioned(2023, 2024))
+        self.assertFalse(convert_to_partitioned(2023, 2024))
+        default = f'{PARTITIONED_TABLE}_default'
+        with connection.cursor() as cursor:
+            self.assertEqual(existing_partitions(cursor), {partition_name(2023), partition_name(2024), default})
+        self.assertEqual(self.partition_dates(partition_name(2024)), [date(2024, 6, 1)])
+        self.assertEqual(self.partition_dates(default), [date(2026, 3, 1)])
+
+        # The 2026 row already in the default partition moves into the new one
+        self.assertEqual(create_partitions(2023, 2026), [partition_name(2025), partition_name(2026)])
+        self.assertEqual(self.partition_dates(partition_name(2026)), [date(2026, 3, 1)])
+        self.assertEqual(self.partition_dates(default), [])
+
+        # New rows keep unique ids and land in their year
+        point = PerformanceHistory.objects.create(investment=investment, date=date(2025, 2, 1), value=2)
+        self.assertEqual(PerformanceHistory.objects.filter(pk=point.pk).count(), 1)
+        self.assertEqual(self.partition_dates(partition_name(2025)), [date(2025, 2, 1)])
+        self.assertEqual(PerformanceHistory.objects.filter(investment=investment).count(), 4)
+
+
+class FastReadPathTests(APITestCase):
+    """Investment reads skip ModelSerializer but must render exactly what it would."""
+
+    def setUp(self):
+        super().setUp()
+        create_investments(3)
+        Investment.objects.filter(user_name='User 1').update(
+            best_performing_scheme='Midcap', best_performance_change=Decimal('19.5'),
+            worst_performing_scheme='Flexi Cap', worst_performance_change=Decimal('-5'),
+        )
+
+    def expected(self, **query):
+        request = Request(APIRequestFactory().get('/api/investments/', query))
+        investments = Investment.objects.order_by('pk').prefetch_related('performance_history', 'sector_allocations')
+        return InvestmentSerializer(investments, many=True, context={'request': request}).data
+
+    def test_list_matches_model_serializer(self):
+        response = self.client.get('/api/investments/')
+        expected = self.expected()
+        self.assertEqual(response.data['results'], expected)
+        self.assertEqual([list(item) for item in response.data['results']], [list(item) for item in expected])
+        self.assertEqual(response.data['results'][1]['best_performance_change'], '+19.5%')
+
+    def test_sparse_fieldsets_match_model_serializer(self):
+        for query in [{'fields': 'user_name,current_value'}, {'expand': 'sector_allocations'}]:
+            response = self.client.get('/api/investments/', query)
+            self.assertEqual(response.data['results'], self.expected(**query))
+
+    def test_detail_matches_model_serializer(self):
+        investment = Investment.objects.order_by('pk').first()
+        response = self.client.get(f'/api/investments/{investment.pk}/')
+        self.assertEqual(response.data, self.expected()[0])
+        self.assertEqual(self.client.get('/api/investments/999999/').status_code, 404)
+
+    def test_columnar_history(self):
+        response = self.client.get('/api/investments/', {'series': 'columnar'})
+        history = response.data['results'][0]['performance_history']
+        self.assertEqual(history['dates'][0], '2024-09-01')
+        self.assertEqual(history['values'][:2], ['100000.00', '100001.00'])
+        self.assertEqual(self.client.get('/api/investments/', {'series': 'csv'}).status_code, 400)
+
+    def test_orjson_renderer_is_byte_compatible(self):
+        data = {'results': self.expected(), 'as_of': timezone.now(), 'day': date(2024, 9, 1), 'note': 'a\u2028b ₹'}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class AuthenticationTests(TestCase):
+    password = 'SecurePass123!'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='demo', email='demo@fundsight.com', password=self.password)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+
+    def test_email_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(EmailBackend().authenticate(None, email='demo@fundsight.com', password=self.password), self.user)
+        self.assertIsNone(EmailBackend().authenticate(None, email='demo@fundsight.com', password='wrong'))
+        self.assertIsNone(EmailBackend().authenticate(None, username='demo', password=self.password))
+
+    def test_login(self):
+        with self.assertLogs('investments.auth_views', 'DEBUG') as logs:
+            response = self.client.post('/api/auth/login/', {'email': 'demo@fundsight.com', 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], self.token.key)
+        self.assertNotIn(self.password, '\n'.join(logs.output))
+        self.assertNotIn(self.token.key, '\n'.join(logs.output))
+
+        # Email is not unique, and an ambiguous address must not pick an account
+        User.objects.create_user(username='twin', email='demo@fundsight.com', password=self.password)
+        response = self.client.post('/api/auth/login/', {'email': 'demo@fundsight.com', 'password': self.password})
+        self.assertEqual(response.status_code, 400)
+
+    def test_token_lookup_is_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/auth/user/').data['email'], 'demo@fundsight.com')
+
+        with self.settings(TOKEN_CACHE_TIMEOUT=0):
+            with self.assertNumQueries(1):
+                self.client.get('/api/auth/user/')
+
+    def test_logout_and_deactivation_invalidate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get('/api/auth/user/')
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        # Session authentication comes first on these views, so failures are 403s
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 403)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 403)
+
+
+class DashboardTests(APITestCase):
+    url = '/api/dashboard/'
+
+    def setUp(self):
+        super().setUp()
+        create_investments(2, days=10)
+        create_funds(2)
+
+    def test_bootstrap_payload(self):
+        response = self.client.get(self.url, {'points': 5, 'period': 'MAX'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['email'], 'demo@fundsight.com')
+        self.assertEqual(response.data['portfolio']['investors'], 2)
+        self.assertEqual(response.data['funds'], self.client.get('/api/funds/').data['results'])
+
+        listed = self.client.get('/api/investments/').data['results']
+        investments = response.data['investments']
+        self.assertEqual([list(item) for item in investments], [list(item) for item in listed])
+        self.assertEqual(investments[0]['sector_allocations'], listed[0]['sector_allocations'])
+        history = investments[0]['performance_history']
+        self.assertEqual(len(history), 5)
+        self.assertEqual(history[0], listed[0]['performance_history'][0])
+        self.assertEqual(history[-1], listed[0]['performance_history'][-1])
+
+        columns = self.client.get(self.url, {'points': 5, 'period': 'MAX', 'series': 'columnar'}).data['investments'][0]
+        self.assertEqual(columns['performance_history']['dates'], [point['date'] for point in history])
+
+    def test_history_defaults_to_the_last_year(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['period'], '1Y')
+        # The fixture's history is from 2024
+        self.assertEqual(response.data['investments'][0]['performance_history'], [])
+
+    def test_investments_are_paginated(self):
+        create_investments(3, days=10)
+        first = self.client.get(self.url, {'page_size': 2, 'period': 'MAX'})
+        self.assertEqual(first.data['portfolio']['investors'], 5)
+        self.assertEqual(len(first.data['investments']), 2)
+        pages = [first.data['investments']]
+        next_url = first.data['next']
+        while next_url:
+            page = self.client.get(next_url).data
+            pages.append(page['investments'])
+            next_url = page['next']
+        listed = self.client.get('/api/investments/').data['results']
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([item['id'] for page in pages for item in page], [item['id'] for item in listed])
+        self.assertEqual(len(pages[-1][0]['performance_history']), 10)
+
+    def test_query_count_does_not_grow(self):
+        with self.assertNumQueries(7):
+            self.client.get(self.url)
+        create_investments(3, days=10)
+        create_funds(2)
+        with self.assertNumQueries(7):
+            response = self.client.get(self.url, {'period': '1Y'})
+        self.assertEqual(len(response.data['investments']), 5)
+
+    def test_history_is_read_in_keyset_chunks(self):
+        expected = self.client.get(self.url, {'period': 'MAX', 'points': 5}).data['investments']
+        cache.clear()
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}), \
+                mock.patch('investments.dashboard.HISTORY_CHUNK_SIZE', 4), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'period': 'MAX', 'points': 5})
+        self.assertEqual(response.data['investments'], expected)
+        # 20 points, 4 per query
+        self.assertEqual(sum('LIMIT 4' in query['sql'] for query in queries), 6)
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Logging in only touches last_login, which the payload does not show
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Demo'
+            self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['first_name'], 'Demo')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Fund.objects.filter(name='Fund 0').get().save()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+
+class AsyncViewTests(APITestCase):
+    """The ASGI-native endpoints render exactly what their sync counterparts do."""
+
+    def setUp(self):
+        super().setUp()
+        create_investments(3)
+        create_funds(2)
+
+    def test_investments_match_sync_views(self):
+        investment = Investment.objects.order_by('pk').first()
+        for path in ['investments/', 'investments/?series=columnar&expand=sector_allocations',
+                     f'investments/{investment.pk}/', 'funds/', 'funds/?expand=']:
+            response = self.client.get(f'/api/async/{path}')
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.data, self.client.get(f'/api/{path}').data, path)
+
+    def test_errors_and_cache(self):
+        self.assertEqual(self.client.get('/api/async/investments/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/async/investments/', {'series': 'csv'}).status_code, 400)
+        first = self.client.get('/api/async/funds/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(first['ETag'], self.client.get('/api/funds/')['ETag'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/async/funds/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/async/investments/').status_code, 401)
+
+
+class AsyncOverviewTests(TransactionTestCase):
+    """Overview queries run on their own threads and connections, so they must see committed data."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='demo', password='x'))
+
+    def test_overview(self):
+        investment = create_investments(1, days=40)[0]
+        create_funds(2)
+        response = self.client.get(f'/api/async/investments/{investment.pk}/overview/', {'period': 'MAX'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['investment'], self.client.get(f'/api/investments/{investment.pk}/').data)
+        self.assertEqual([fund['name'] for fund in response.data['funds']], ['Fund 0', 'Fund 1'])
+        self.assertEqual(response.data['metrics']['points'], 40)
+        self.assertEqual(response.data['metrics']['period'], 'MAX')
+
+        self.assertEqual(self.client.get('/api/async/investments/999999/overview/').status_code, 404)
+
+    def test_overview_sees_new_funds(self):
+        investment = create_investments(1)[0]
+        url = f'/api/async/investments/{investment.pk}/overview/'
+        self.assertEqual(self.client.get(url).data['funds'], [])
+        Fund.objects.create(name='Axis Midcap Fund', color='#f8d07b')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([fund['name'] for fund in response.data['funds']], ['Axis Midcap Fund'])
+
+
+class AnalyticsTests(APITestCase):
+    def series(self, values, start=date(2022, 1, 1)):
+        return to_arrays([(1, start + timedelta(days=d), value) for d, value in enumerate(values)])[1:]
+
+    def test_cagr_and_drawdown(self):
+        dates, values = self.series([100.0, 120.0, 90.0, 130.0])
+        metrics = series_metrics(dates, values, risk_free_rate=0)
+        self.assertAlmostEqual(metrics['total_return'], 30.0)
+        self.assertAlmostEqual(metrics['max_drawdown'], -25.0)
+        self.assertEqual(metrics['max_drawdown_start'], date(2022, 1, 2))
+        self.assertEqual(metrics['max_drawdown_end'], date(2022, 1, 3))
+        self.assertAlmostEqual(metrics['day_change'], 40.0)
+
+        dates, values = self.series([100.0] * 730 + [121.0])
+        metrics = series_metrics(dates, values)
+        self.assertAlmostEqual(metrics['cagr'], 10.0, places=1)
+        self.assertAlmostEqual(metrics['xirr'], 10.0, places=1)
+        self.assertAlmostEqual(metrics['rolling_returns']['1Y']['max'], 21.0)
+        self.assertIsNone(metrics['rolling_returns']['3Y'])
+
+    def test_endpoint(self):
+        investment = create_investments(1, days=400)[0]
+        response = self.client.get(f'/api/investments/{investment.pk}/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['period'], 'MAX')
+        self.assertEqual(response.data['end_value'], '100399.00')
+        self.assertIsNotNone(response.data['volatility'])
+        self.assertEqual(self.client.get(f'/api/investments/{investment.pk}/metrics/', {'period': '2W'}).status_code, 400)
+
+    def test_memoized_per_last_point(self):
+        investment = create_investments(1, days=30)[0]
+        today = date(2024, 10, 1)
+        first = investment_metrics(investment, '1Y', today)
+        with self.assertNumQueries(1):
+            self.assertEqual(investment_metrics(investment, '1Y', today), first)
+        PerformanceHistory.objects.create(investment=investment, date=today, value=90000)
+        self.assertEqual(investment_metrics(investment, '1Y', today)['end_value'], 90000)
+
+    def test_memo_is_retired_by_earlier_points(self):
+        investment = create_investments(1, days=30)[0]
+        today = date(2024, 10, 1)
+        self.assertEqual(investment_metrics(investment, '1Y', today)['start_value'], 100000)
+
+        point = investment.performance_history.get(date=date(2024, 9, 1))
+        point.value = 50000
+        with self.captureOnCommitCallbacks(execute=True):
+            point.save()
+        self.assertEqual(investment_metrics(investment, '1Y', today)['start_value'], 50000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            default_loader().load([(investment.pk, date(2024, 8, 1), 40000)])
+        metrics = investment_metrics(investment, '1Y', today)
+        self.assertEqual((metrics['start_date'], metrics['start_value']), (date(2024, 8, 1), 40000))
+        refresh_metrics(['1Y'], today=today)
+        with self.assertNumQueries(1):
+            self.assertEqual(investment_metrics(investment, '1Y', today), metrics)
+
+    def test_batch_refresh_fills_the_memo(self):
+        investments = create_investments(3, days=30)
+        today = date(2024, 9, 30)
+        self.assertEqual(refresh_metrics(['1M', 'MAX'], today=today, batch_size=2), 6)
+        for investment in investments:
+            with self.assertNumQueries(1):
+                metrics = investment_metrics(investment, 'MAX', today)
+            self.assertAlmostEqual(metrics['absolute_return'], 100029 - 100000)
+
+
+class AggregateEndpointTests(APITestCase):
+    def test_totals_sectors_and_combined_history(self):
+        investments = create_investments(2, days=3)
+        Investment.objects.filter(pk=investments[1].pk).update(current_value=90000)
+        response = self.client.get('/api/investments/aggregate/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['investors'], 2)
+        self.assertEqual(response.data['total_value'], '200000.00')
+        self.assertEqual(response.data['total_growth'], '0.00')
+        self.assertEqual(response.data['sectors'][0]['amount'], '110000.00')
+        self.assertEqual(response.data['sectors'][0]['percentage'], '50.0%')
+        self.assertEqual(response.data['performance_history'][-1], {'date': '2024-09-03', 'value': '200004.00'})
+
+    def test_query_count_is_independent_of_investors(self):
+        create_investments(2)
+        with self.assertNumQueries(3):
+            self.client.get('/api/investments/aggregate/')
+        create_investments(10)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/investments/aggregate/', {'series': 'columnar'})
+        self.assertEqual(response.data['investors'], 12)
+        self.assertEqual(len(response.data['performance_history']['dates']), 5)
+
+
+class FundOverlapTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.stocks = [Stock.objects.create(name=name) for name in ('HDFCBANK', 'RIL', 'INFY', 'TCS')]
+        self.alpha = Fund.objects.create(name='Alpha', color='#f8d07b')
+        self.beta = Fund.objects.create(name='Beta', color='#0070df')
+        with self.captureOnCommitCallbacks(execute=True):
+            for fund, stock, weight in [
+                (self.alpha, self.stocks[0], 15), (self.alpha, self.stocks[1], 10), (self.alpha, self.stocks[2], 5),
+                (self.beta, self.stocks[0], 8), (self.beta, self.stocks[1], 12), (self.beta, self.stocks[3], 20),
+            ]:
+                FundStockHolding.objects.create(fund=fund, stock=stock, weight=weight)
+
+    def test_pairwise_overlap(self):
+        result = FundOverlapEngine().compare([self.alpha.id, self.beta.id])
+        self.assertEqual(result['pairs'], [{
+            'fund_a': self.alpha.id,
+            'fund_b': self.beta.id,
+            'common_stocks': 2,
+            'weight_overlap': 18.0,
+            'jaccard': 0.5,
+        }])
+        self.assertEqual(result['summary'], {'overlapping_stocks': 2, 'average_overlap': 18.0})
+
+    def test_incremental_update_matches_rebuild(self):
+        engine = FundOverlapEngine()
+        engine.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            FundStockHolding.objects.filter(fund=self.beta, stock=self.stocks[1]).delete()
+            FundStockHolding.objects.create(fund=self.beta, stock=self.stocks[2], weight=3)
+
+        with mock.patch.object(engine, '_rebuild', side_effect=AssertionError('full rebuild')):
+            incremental = engine.compare([self.alpha.id, self.beta.id])
+        self.assertEqual(incremental, FundOverlapEngine().compare([self.alpha.id, self.beta.id]))
+        self.assertEqual(incremental['pairs'][0]['weight_overlap'], 11.0)
+
+    def test_changes_are_published_on_commit(self):
+        engine = FundOverlapEngine()
+        engine.refresh()
+        with self.captureOnCommitCallbacks() as callbacks:
+            FundStockHolding.objects.filter(fund=self.beta, stock=self.stocks[1]).delete()
+            # Uncommitted, so other workers must not replay it yet
+            self.assertEqual(cache.get(OVERLAP_VERSION_KEY), engine.version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(engine.compare([self.alpha.id, self.beta.id])['pairs'][0]['common_stocks'], 1)
+
+    def test_endpoint(self):
+        response = self.client.get('/api/funds/overlap/', {'funds': f'{self.alpha.id},{self.beta.id}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([fund['name'] for fund in response.data['funds']], ['Alpha', 'Beta'])
+        self.assertEqual(response.data['pairs'][0]['common_stocks'], 2)
+
+        response = self.client.get('/api/funds/overlap/', {'funds': f'{self.alpha.id},999'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StockHoldersTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = Stock.objects.create(name='HDFCBANK', sector='Financial')
+        self.infy = Stock.objects.create(name='INFY', sector='Technology')
+        self.ril = Stock.objects.create(name='RIL', sector='Energy')
+        self.alpha = Fund.objects.create(name='Alpha', color='#f8d07b', nav=100)
+        self.beta = Fund.objects.create(name='Beta', color='#0070df', nav=50)
+        with self.captureOnCommitCallbacks(execute=True):
+            for fund, stock, weight in [
+                (self.alpha, self.bank, 30), (self.alpha, self.infy, 10),
+                (self.beta, self.bank, 10), (self.beta, self.ril, 20),
+            ]:
+                FundStockHolding.objects.create(fund=fund, stock=stock, weight=weight)
+        self.investment = create_investments(1, days=0)[0]
+        InvestmentHolding.objects.create(investment=self.investment, fund=self.alpha, units=10)
+        InvestmentHolding.objects.create(investment=self.investment, fund=self.beta, units=20)
+
+    def test_incremental_update_matches_rebuild(self):
+        index = StockHoldersIndex()
+        self.assertEqual(index.funds_holding(self.bank.pk), {self.alpha.pk: 30, self.beta.pk: 10})
+        with self.captureOnCommitCallbacks(execute=True):
+            FundStockHolding.objects.filter(fund=self.beta, stock=self.bank).delete()
+            FundStockHolding.objects.create(fund=self.beta, stock=self.infy, weight=5)
+
+        with mock.patch.object(index, '_rebuild', side_effect=AssertionError('full rebuild')):
+            self.assertEqual(index.funds_holding(self.bank.pk), {self.alpha.pk: 30})
+            self.assertEqual(index.exposure_weights(self.infy.pk), {self.alpha.pk: (10, 40), self.beta.pk: (5, 25)})
+        fresh = StockHoldersIndex()
+        fresh.refresh()
+        self.assertEqual((index.holders, index.totals), (fresh.holders, fresh.totals))
+
+    def test_funds_endpoint(self):
+        response = self.client.get(f'/api/stocks/{self.bank.pk}/funds/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock']['name'], 'HDFCBANK')
+        self.assertEqual(
+            [(fund['name'], fund['weight']) for fund in response.data['funds']], [('Alpha', 30), ('Beta', 10)]
+        )
+        self.assertEqual(self.client.get('/api/stocks/999/funds/').status_code, 404)
+
+    def test_exposure(self):
+        response = self.client.get(f'/api/investments/{self.investment.pk}/exposure/', {'stock': self.bank.pk})
+        self.assertEqual(response.status_code, 200)
+        # Alpha: 10 units x 100 x 30/40, Beta: 20 units x 50 x 10/30
+        self.assertEqual(response.data['amount'], '1083.33')
+        self.assertEqual(response.data['portfolio_value'], '2000.00')
+        self.assertEqual(response.data['percentage'], '54.2%')
+        self.assertEqual(
+            [(fund['name'], fund['share'], fund['amount']) for fund in response.data['funds']],
+            [('Alpha', '75.0%', '750.00'), ('Beta', '33.3%', '333.33')],
+        )
+
+        response = self.client.get(f'/api/investments/{self.investment.pk}/exposure/', {'stock': self.infy.pk})
+        self.assertEqual([fund['name'] for fund in response.data['funds']], ['Alpha'])
+        self.assertEqual(response.data['amount'], '250.00')
+
+        self.assertEqual(self.client.get(f'/api/investments/{self.investment.pk}/exposure/').status_code, 400)
+        self.assertEqual(
+            self.client.get(f'/api/investments/{self.investment.pk}/exposure/', {'stock': 999}).status_code, 400
+        )
+        self.assertEqual(self.client.get('/api/investments/999/exposure/', {'stock': self.bank.pk}).status_code, 404)
+
+
+class NameSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in [
+                'Axis Midcap Fund', 'Axis Bluechip Fund', 'ICICI Prudential Midcap Fund',
+                'HDFC Large Cap Fund', 'Nippon Large Cap Fund - Direct Plan', 'Nippon India Small Cap Fund',
+            ]:
+                Fund.objects.create(name=name, color='#f8d07b')
+            for name in ['HDFCBANK', 'HDFC LTD.', 'INFY']:
+                Stock.objects.create(name=name)
+
+    def search(self, kind, query, **params):
+        response = self.client.get(f'/api/{kind}/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.data['results']]
+
+    def test_prefixes_rank_by_position_and_length(self):
+        self.assertEqual(self.search('funds', 'axis'), ['Axis Midcap Fund', 'Axis Bluechip Fund'])
+        self.assertEqual(self.search('funds', 'nippon large'), ['Nippon Large Cap Fund - Direct Plan'])
+        self.assertEqual(self.search('funds', 'large', limit=1), ['HDFC Large Cap Fund'])
+        self.assertEqual(self.search('stocks', 'hdfc'), ['HDFCBANK', 'HDFC LTD.'])
+
+    def test_tolerates_typos(self):
+        self.assertEqual(self.search('funds', 'axsi midcp'), ['Axis Midcap Fund'])
+        self.assertEqual(self.search('funds', 'midcp'), ['Axis Midcap Fund', 'ICICI Prudential Midcap Fund'])
+        # Short words must match exactly
+        self.assertEqual(self.search('funds', 'hfc'), [])
+
+    def test_sees_renames_and_deletes(self):
+        self.assertEqual(self.search('funds', 'flexi'), [])
+        fund = Fund.objects.get(name='Axis Bluechip Fund')
+        fund.name = 'Axis Flexi Cap Fund'
+        with self.captureOnCommitCallbacks(execute=True):
+            fund.save()
+        self.assertEqual(self.search('funds', 'flexi'), ['Axis Flexi Cap Fund'])
+        with self.captureOnCommitCallbacks(execute=True):
+            fund.delete()
+        self.assertEqual(self.search('funds', 'flexi'), [])
+
+    def test_renames_are_published_on_commit(self):
+        index = NameIndex(Fund)
+        index.search('fund')
+        fund = Fund.objects.get(name='Axis Bluechip Fund')
+        fund.name = 'Axis Flexi Cap Fund'
+        with self.captureOnCommitCallbacks() as callbacks:
+            fund.save()
+            # Not published yet, so the index keeps the committed names
+            self.assertEqual(index.search('flexi'), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(index.search('flexi'), [(fund.pk, 'Axis Flexi Cap Fund')])
+
+    def test_index_is_rebuilt_only_on_change(self):
+        index = NameIndex(Fund)
+        self.assertEqual(len(index.search('fund')), 6)
+        with mock.patch.object(index, '_rebuild', side_effect=AssertionError('rebuilt')):
+            index.search('axis')
+
+    def test_requires_a_query(self):
+        self.assertEqual(self.client.get('/api/funds/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/search/', {'q': 'hdfc', 'limit': 500}).status_code, 400)
+        self.assertEqual(self.search('funds', '-'), [])
+
+
+class SectorExposureTests(TestCase):
+    def setUp(self):
+        self.bank = Stock.objects.create(name='HDFCBANK', sector='Financial')
+        self.infy = Stock.objects.create(name='INFY', sector='Technology')
+        self.ril = Stock.objects.create(name='RIL', sector='Energy')
+        self.alpha = Fund.objects.create(name='Alpha', color='#f8d07b', nav=100)
+        self.beta = Fund.objects.create(name='Beta', color='#0070df', nav=50)
+        FundStockHolding.objects.create(fund=self.alpha, stock=self.bank, weight=30)
+        FundStockHolding.objects.create(fund=self.alpha, stock=self.infy, weight=10)
+        FundStockHolding.objects.create(fund=self.beta, stock=self.ril, weight=10)
+        self.first, self.second, self.snapshot = create_investments(3, days=0)
+        InvestmentHolding.objects.create(investment=self.first, fund=self.alpha, units=10)
+        InvestmentHolding.objects.create(investment=self.first, fund=self.beta, units=20)
+        InvestmentHolding.objects.create(investment=self.second, fund=self.beta, units=40)
+
+    def allocations(self, investment):
+        return {
+            allocation.name: (allocation.amount, allocation.percentage)
+            for allocation in SectorAllocation.objects.filter(investment=investment)
+        }
+
+    def test_derived_from_units_nav_and_weights(self):
+        self.assertEqual(self.allocations(self.first), {
+            'Financial': (Decimal('750.00'), Decimal('37.50')),
+            'Technology': (Decimal('250.00'), Decimal('12.50')),
+            'Energy': (Decimal('1000.00'), Decimal('50.00')),
+        })
+        self.assertEqual(self.allocations(self.second), {'Energy': (Decimal('2000.00'), Decimal('100.00'))})
+        # Investors without fund holdings keep their stored allocations
+        self.assertEqual(set(self.allocations(self.snapshot)), {'Financial', 'Technology'})
+
+    def test_nav_change_only_touches_holders(self):
+        untouched = list(SectorAllocation.objects.filter(investment=self.second).values_list('pk', flat=True))
+        self.assertEqual(affected_investments(funds=[self.alpha.pk]), {self.first.pk})
+        self.alpha.nav = 200
+        self.alpha.save()
+        self.assertEqual(self.allocations(self.first)['Financial'], (Decimal('1500.00'), Decimal('50.00')))
+        self.assertEqual(
+            list(SectorAllocation.objects.filter(investment=self.second).values_list('pk', flat=True)), untouched
+        )
+
+    def test_stock_and_holding_changes(self):
+        self.ril.sector = ''
+        self.ril.save()
+        self.assertEqual(self.allocations(self.second), {'Other Sectors': (Decimal('2000.00'), Decimal('100.00'))})
+        FundStockHolding.objects.create(fund=self.beta, stock=self.infy, weight=10)
+        self.assertEqual(self.allocations(self.second)['Technology'], (Decimal('1000.00'), Decimal('50.00')))
+        InvestmentHolding.objects.filter(investment=self.second).delete()
+        self.assertEqual(self.allocations(self.second), {})
+
+    def test_full_refresh_is_idempotent(self):
+        before = self.allocations(self.first)
+        self.assertEqual(refresh_sector_allocations(batch_size=1), 2)
+        self.assertEqual(self.allocations(self.first), before)
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@fundsight.com', password='x')
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        response = self.client.get(f'/admin/investments/{model}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist(model, **params)
+        return len(queries)
+
+    def test_holdings_changelist_does_not_query_per_row(self):
+        create_funds(2)
+        few = self.count_queries('fundstockholding')
+        create_funds(10)
+        self.assertEqual(self.count_queries('fundstockholding'), few)
+        # With the fund and stock selected, as the changelist does, the names cost no queries
+        holding = FundStockHolding.objects.select_related('fund', 'stock').order_by('pk').first()
+        with self.assertNumQueries(0):
+            self.assertEqual(str(holding), f'{holding.fund.name} holds {holding.stock.name} (Weight: {holding.weight})')
+
+    def test_every_changelist_renders(self):
+        create_funds(2)
+        enqueue('nightly_refresh')
+        for model in (
+            'investment', 'performancehistory', 'sectorallocation', 'fund', 'fundnav', 'stock',
+            'fundstockholding', 'investmentholding', 'job',
+        ):
+            self.changelist(model)
+        self.assertEqual(self.client.get('/admin/investments/fundstockholding/add/').status_code, 200)
+        jobs = self.changelist('job', task='nightly_refresh').context['cl'].result_list
+        self.assertEqual([job.task for job in jobs], ['nightly_refresh'])
+
+    def test_history_pages_by_cursor(self):
+        investment = create_investments(1, days=150)[0]
+        first = self.changelist('performancehistory')
+        self.assertEqual(len(first.context['cl'].result_list), 100)
+        cursor = first.context['cl'].next_cursor
+        self.assertContains(first, f'after={cursor}')
+
+        second = self.changelist('performancehistory', after=cursor)
+        self.assertEqual(len(second.context['cl'].result_list), 50)
+        self.assertIsNone(second.context['cl'].next_cursor)
+        shown = [row.pk for row in first.context['cl'].result_list] + [row.pk for row in second.context['cl'].result_list]
+        self.assertEqual(shown, list(investment.performance_history.order_by('-pk').values_list('pk', flat=True)))
+
+        # Sorting by a column falls back to numbered pages
+        self.assertFalse(self.changelist('performancehistory', o='2').context['cl'].cursor_paginated)
+
+    def test_related_id_filter(self):
+        first, second = create_investments(2, days=3)
+        response = self.changelist('performancehistory', investment_id=second.pk)
+        self.assertEqual({row.investment_id for row in response.context['cl'].result_list}, {second.pk})
+        self.assertContains(response, str(second))
+        self.assertEqual(len(self.changelist('performancehistory').context['cl'].result_list), 6)
+
+    def test_date_hierarchy_buckets_match_distinct_dates(self):
+        investment = create_investments(1, days=0)[0]
+        PerformanceHistory.objects.bulk_create([
+            PerformanceHistory(investment=investment, date=day, value=1)
+            for day in (date(2022, 12, 31), date(2023, 1, 1), date(2023, 1, 15), date(2023, 12, 1), date(2025, 2, 3))
+        ])
+        history = SkipScanQuerySet(PerformanceHistory)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(history.dates('date', kind), list(PerformanceHistory.objects.dates('date', kind)))
+        self.assertEqual(history.dates('date', 'year', order='DESC')[0], date(2025, 1, 1))
+
+        response = self.changelist('performancehistory', date__year=2023)
+        self.assertContains(response, 'date__month=12')
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+
+class PortfolioSummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.investment = Investment.objects.create(
+            user_name='Yashna',
+            current_value=575000,
+            initial_value=500000,
+            best_performing_scheme='ICICI Prudential Midcap Fund',
+            best_performance_change=19,
+            worst_performing_scheme='Axis Flexi Cap Fund',
+            worst_performance_change=-5,
+        )
+
+    def test_refreshed_when_history_is_added(self):
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2024, 1, 1), value=500000)
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 1, 1), value=560000)
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 1, 2), value=575000)
+
+        summary = PortfolioSummary.objects.get(investment=self.investment)
+        self.assertEqual(summary.as_of, date(2025, 1, 2))
+        self.assertEqual(summary.absolute_return, Decimal('75000'))
+        self.assertEqual(summary.return_percentage, Decimal('15.00'))
+        self.assertEqual(summary.day_change, Decimal('15000'))
+        self.assertEqual(summary.day_change_percentage, Decimal('2.68'))
+        self.assertEqual(summary.cagr, Decimal('14.91'))
+        self.assertEqual(summary.best_performance_change, Decimal('19'))
+
+    def test_unrepresentable_cagr_is_left_empty(self):
+        # A 15% gain over two days annualizes past what the column can store
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 1, 1), value=500000)
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 1, 3), value=575000)
+        self.assertIsNone(PortfolioSummary.objects.get(investment=self.investment).cagr)
+
+    def test_endpoint_is_a_single_row_fetch(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/investments/{self.investment.pk}/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['current_value'], '575000.00')
+
+    def test_percentages_render_as_strings(self):
+        SectorAllocation.objects.create(
+            investment=self.investment, name='Financial', amount=195500, percentage=34, bgcolor='#9bb0c7'
+        )
+        response = self.client.get(f'/api/investments/{self.investment.pk}/')
+        self.assertEqual(response.data['best_performance_change'], '+19%')
+        self.assertEqual(response.data['worst_performance_change'], '-5%')
+        self.assertEqual(response.data['sector_allocations'][0]['percentage'], '34.0%')
+
+    def test_deleting_investment_drops_summary(self):
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2024, 1, 1), value=500000)
+        self.investment.delete()
+        self.assertFalse(PortfolioSummary.objects.exists())
+
+
+class IngestNavTests(TestCase):
+    def setUp(self):
+        self.investment = create_investments(1, days=0)[0]
+
+    def ingest(self, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        call_command('ingest_nav', f.name, *args, stdout=StringIO())
+
+    def test_csv_upserts_on_investment_and_date(self):
+        self.ingest(
+            'investment,date,value\n'
+            f'{self.investment.pk},2024-09-01,100000\n'
+            f'{self.investment.pk},2024-09-02,101000\n'
+            '999,2024-09-02,1\n',
+            '--chunk-size', '2',
+        )
+        self.ingest(f'investment,date,value\n{self.investment.pk},2024-09-02,102500.50\n')
+
+        history = list(self.investment.performance_history.order_by('date').values_list('date', 'value'))
+        self.assertEqual(history, [(date(2024, 9, 1), Decimal('100000')), (date(2024, 9, 2), Decimal('102500.50'))])
+        self.assertEqual(PortfolioSummary.objects.get(investment=self.investment).as_of, date(2024, 9, 2))
+
+    def test_amfi_format(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(f'scheme_code,investment\n120503,{self.investment.pk}\n')
+        self.addCleanup(os.remove, f.name)
+        self.ingest(
+            'Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date\n'
+            '\n'
+            'Open Ended Schemes(Equity Scheme - Large Cap Fund)\n'
+            '120503;INF846K01EW2;-;Axis Bluechip Fund - Direct Plan - Growth;58.1200;17-Oct-2024\n'
+            '120504;INF846K01EX0;-;Axis Bluechip Fund - Direct Plan - IDCW;N.A.;17-Oct-2024\n',
+            '--format', 'amfi', '--scheme-map', f.name,
+        )
+        self.assertEqual(
+            list(self.investment.performance_history.values_list('date', 'value')),
+            [(date(2024, 10, 17), Decimal('58.12'))],
+        )
+
+
+class JobQueueTests(TransactionTestCase):
+    """Workers close stale connections between jobs, which a TestCase transaction would not survive."""
+
+    def test_enqueue_is_idempotent_by_key(self):
+        first = enqueue('nightly_refresh', key='nightly')
+        self.assertEqual(enqueue('nightly_refresh', key='nightly').pk, first.pk)
+        enqueue('nightly_refresh')
+        self.assertEqual(Job.objects.count(), 2)
+        with self.assertRaises(ValueError):
+            enqueue('no_such_task')
+
+    def test_failed_job_backs_off_then_fails(self):
+        job = enqueue('refresh_investments', max_attempts=2, first=1)  # missing "last"
+        job = claim('test')
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertIsNone(claim('other'))
+
+        with self.assertLogs('investments.jobs', 'ERROR'):
+            self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(claim('test'))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('investments.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim('test')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('TypeError', job.last_error)
+
+    def test_stale_job_is_requeued(self):
+        enqueue('nightly_refresh')
+        job = claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.QUEUED, ''))
+
+    def test_scheduler_enqueues_each_firing_once(self):
+        start = timezone.make_aware(datetime(2025, 1, 1, 1, 30))
+        schedulers = [Scheduler([('0 2 * * *', 'nightly_refresh', {})], now=start) for _ in range(2)]
+        self.assertEqual(schedulers[0].tick(start + timedelta(minutes=20)), [])
+        for scheduler in schedulers:
+            scheduler.tick(start + timedelta(days=1, hours=1))
+        self.assertEqual(
+            sorted(Job.objects.values_list('key', flat=True)),
+            ['nightly_refresh:2025-01-01T02:00', 'nightly_refresh:2025-01-02T02:00'],
+        )
+
+    def test_cron_expressions(self):
+        weekdays = CronSchedule('*/15 9-17 * * 1-5')
+        self.assertTrue(weekdays.matches(datetime(2025, 1, 6, 9, 45)))  # Monday
+        self.assertFalse(weekdays.matches(datetime(2025, 1, 5, 9, 45)))  # Sunday
+        self.assertFalse(weekdays.matches(datetime(2025, 1, 6, 9, 50)))
+        # Both day fields restricted: either one matches
+        either = CronSchedule('0 0 1 * 0')
+        self.assertTrue(either.matches(datetime(2025, 1, 5)))
+        self.assertTrue(either.matches(datetime(2025, 1, 1)))
+        self.assertFalse(either.matches(datetime(2025, 1, 2)))
+        with self.assertRaises(ValueError):
+            CronSchedule('0 25 * * *')
+
+    def test_nightly_refresh_fans_out_and_refreshes(self):
+        investments = create_investments(5)
+        Investment.objects.update(current_value=1)
+        enqueue('nightly_refresh', key='nightly', chunk_size=2)
+        call_command('run_workers', '--burst', stdout=StringIO())
+
+        chunks = Job.objects.filter(task='refresh_investments')
+        self.assertEqual(chunks.count(), 3)
+        self.assertTrue(chunks.filter(key__startswith='nightly:').exists())
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        for investment in investments:
+            investment.refresh_from_db()
+            self.assertEqual(investment.current_value, Decimal('100004'))
+            self.assertEqual(PortfolioSummary.objects.get(investment=investment).current_value, Decimal('100004'))
+
+        # A retried fan-out finds its chunks already queued
+        run_job(Job.objects.get(key='nightly'))
+        self.assertEqual(chunks.count(), 3)
+
+
+class PackedHistoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.investments = create_investments(2)
+        self.investment = self.investments[0]
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 1, 2), value=Decimal('100010.55'))
+
+    def rows(self, investment):
+        return list(investment.performance_history.order_by('date').values_list('date', 'value'))
+
+    def packed(self, investment, start=None, end=None):
+        dates, paise = read_series(investment.pk, start, end)
+        return [(day, Decimal(value) / 100) for day, value in zip(dates.tolist(), paise.tolist())]
+
+    def test_pack_round_trips_rows(self):
+        self.assertEqual(pack_investments(), (2, 11))
+        self.assertEqual(PackedHistory.objects.count(), 3)  # one investment spans two years
+        for investment in self.investments:
+            self.assertEqual(self.packed(investment), self.rows(investment))
+        self.assertEqual(
+            self.packed(self.investment, date(2024, 9, 5), date(2025, 1, 2)),
+            [(date(2024, 9, 5), Decimal('100004')), (date(2025, 1, 2), Decimal('100010.55'))],
+        )
+        dates, paise = read_series(self.investment.pk, date(2025, 1, 1), date(2025, 12, 31))
+        self.assertFalse(paise.flags.writeable)  # a view of the fetched bytes
+        self.assertEqual(len(read_series(999)[0]), 0)
+
+    def test_write_points_appends_and_merges(self):
+        investment = self.investments[1]
+        write_points([(investment.pk, date(2025, 3, 1), 10), (investment.pk, date(2025, 3, 2), 11)])
+        write_points([(investment.pk, date(2025, 3, 3), Decimal('12.34')), (999, date(2025, 3, 3), 1)])
+        self.assertEqual(len(PackedHistory.objects.get(investment=investment, year=2025).paise), 3 * 8)
+        # Overwrite a day and insert one before the chunk's last
+        write_points([(investment.pk, date(2025, 3, 2), 20), (investment.pk, date(2025, 1, 1), 5)])
+        self.assertEqual(
+            self.packed(investment, date(2025, 1, 1)),
+            [(date(2025, 1, 1), 5), (date(2025, 3, 1), 10), (date(2025, 3, 2), 20), (date(2025, 3, 3), Decimal('12.34'))],
+        )
+
+    @override_settings(HISTORY_STORAGE='mirror')
+    def test_mirror_follows_writes(self):
+        pack_investments()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(f'investment,date,value\n{self.investment.pk},2025-01-03,100020\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('ingest_nav', f.name, stdout=StringIO())
+        self.assertEqual(self.packed(self.investment, date(2025, 1, 1)), self.rows(self.investment)[-2:])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.investment.performance_history.filter(date=date(2025, 1, 2)).get().delete()
+        PerformanceHistory.objects.create(investment=self.investment, date=date(2025, 2, 1), value=1)
+        self.assertEqual(self.packed(self.investment), self.rows(self.investment))
+
+    @override_settings(HISTORY_STORAGE='mirror')
+    def test_mirror_repacks_once_per_investment_on_commit(self):
+        pack_investments()
+        point = self.investment.performance_history.get(date=date(2025, 1, 2))
+        with mock.patch('investments.packed.pack_investments', wraps=pack_investments) as repack:
+            # A corrected value is merged into its chunk
+            point.value = Decimal('100011')
+            point.save()
+            repack.assert_not_called()
+            self.assertEqual(self.packed(self.investment), self.rows(self.investment))
+
+            with self.captureOnCommitCallbacks() as callbacks:
+                point.date = date(2025, 1, 5)
+                point.save()
+                PerformanceHistory.objects.filter(investment__in=self.investments, date__lt=date(2024, 9, 4)).delete()
+            repack.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(repack.call_count, 1)
+        self.assertEqual(set(repack.call_args.args[0]), set(self.investments))
+        for investment in self.investments:
+            self.assertEqual(self.packed(investment), self.rows(investment))
+
+    def test_packed_reads_match_rows(self):
+        pack_investments()
+        url = f'/api/investments/{self.investment.pk}/performance/?period=MAX&points=4'
+        expected = self.client.get(url).json()
+        expected_metrics = investment_metrics(self.investment, 'MAX', date(2025, 1, 2))
+        cache.clear()
+        with override_settings(HISTORY_STORAGE='packed'):
+            self.assertEqual(self.client.get(url).json(), expected)
+            self.assertEqual(investment_metrics(self.investment, 'MAX', date(2025, 1, 2)), expected_metrics)
+            cache.clear()
+            self.assertEqual(refresh_metrics(['MAX', '1Y'], today=date(2025, 1, 2)), 4)
+            self.assertEqual(investment_metrics(self.investment, 'MAX', date(2025, 1, 2)), expected_metrics)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.funds = [Fund.objects.create(name=f'Fund {i}', color='#f8d07b') for i in range(3)]
+        for day, navs in ((date(2024, 1, 1), (10, 20)), (date(2025, 1, 3), (11, 18))):
+            for fund, nav in zip(self.funds, navs):
+                FundNav.objects.create(fund=fund, date=day, nav=nav)
+        self.investments = [
+            Investment.objects.create(user_name=f'User {i}', current_value=0, initial_value=500) for i in range(3)
+        ]
+        first, second, third = self.investments
+        InvestmentHolding.objects.create(investment=first, fund=self.funds[0], units=100, cost=900)
+        InvestmentHolding.objects.create(investment=first, fund=self.funds[1], units=50, cost=1000)
+        InvestmentHolding.objects.create(investment=second, fund=self.funds[0], units=10)
+        # Fund 2 has no NAV yet, so this investor cannot be valued
+        InvestmentHolding.objects.create(investment=third, fund=self.funds[2], units=1, cost=1)
+
+    def test_fund_nav_follows_series(self):
+        self.funds[0].refresh_from_db()
+        self.assertEqual(self.funds[0].nav, Decimal('11'))
+        self.assertEqual(navs_on(date(2024, 6, 1), [fund.pk for fund in self.funds]), {
+            self.funds[0].pk: 10.0, self.funds[1].pk: 20.0,
+        })
+
+    def test_revalue_writes_history_and_investments(self):
+        self.assertEqual(revalue(date(2025, 1, 3)), 2)
+        first, second, third = self.investments
+        for investment in self.investments:
+            investment.refresh_from_db()
+
+        self.assertEqual(list(first.performance_history.values_list('date', 'value')), [(date(2025, 1, 3), 2000)])
+        self.assertEqual((first.current_value, first.initial_value), (2000, 1900))
+        self.assertEqual((first.best_performing_scheme, first.best_performance_change), ('Fund 0', Decimal('22.22')))
+        self.assertEqual((first.worst_performing_scheme, first.worst_performance_change), ('Fund 1', Decimal('-10.00')))
+        self.assertEqual(PortfolioSummary.objects.get(investment=first).absolute_return, 100)
+
+        # No cost recorded: valued, but the invested amount and schemes are left alone
+        self.assertEqual((second.current_value, second.initial_value, second.best_performing_scheme), (110, 500, None))
+        self.assertFalse(third.performance_history.exists())
+
+        # A date between NAVs values at the latest NAV before it
+        revalue(date(2024, 6, 1), Investment.objects.filter(pk=first.pk))
+        self.assertEqual(first.performance_history.get(date=date(2024, 6, 1)).value, 2000)
+        first.refresh_from_db()
+        self.assertEqual(first.current_value, 2000)  # still the value on the latest date
+
+    def test_fund_navs_ingest_and_revalue_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(f'fund,date,value\n{self.funds[0].pk},2025-01-06,12\n{self.funds[2].pk},2025-01-06,5\n999,2025-01-06,1\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('ingest_nav', f.name, '--funds', stdout=StringIO())
+        self.funds[2].refresh_from_db()
+        self.assertEqual(self.funds[2].nav, Decimal('5'))
+
+        call_command('revalue', stdout=StringIO())
+        self.assertEqual(
+            list(PerformanceHistory.objects.filter(date=date(2025, 1, 6)).order_by('investment').values_list('value', flat=True)),
+            [2100, 120, 5],
+        )
+
+
+class HistoryExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.investments = create_investments(2, days=3)
+
+    def test_csv_streams_in_ingest_layout(self):
+        response = self.client.get('/api/investments/export/', {'from': '2024-09-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'investment,date,value')
+        self.assertEqual(lines[1], f'{self.investments[0].pk},2024-09-02,100001.00')
+        self.assertEqual(len(lines), 5)
+
+    def test_parquet_row_groups(self):
+        import pyarrow.parquet as pq
+        from .export import export_chunks, export_rows
+
+        data = b''.join(export_chunks('parquet', export_rows(chunk_size=4), chunk_size=4))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet.metadata.num_rows, 6)
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        self.assertEqual(parquet.read().column('value')[0].as_py(), Decimal('100000.00'))
+
+        response = self.client.get('/api/investments/export/', {'format': 'parquet', 'to': '2024-09-01'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        self.assertEqual(pq.read_table(io.BytesIO(b''.join(response.streaming_content))).num_rows, 2)
+
+    def test_keyset_chunks_without_server_side_cursors(self):
+        from .export import export_rows
+
+        expected = list(
+            PerformanceHistory.objects.order_by('investment_id', 'date').values_list('investment_id', 'date', 'value')
+        )
+        # As behind PgBouncer in the production profile, where iterator() would fetch the whole result at once
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            with CaptureQueriesContext(connection) as queries:
+                rows = list(export_rows(chunk_size=4))
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all('LIMIT 4' in query['sql'] for query in queries))
+        self.assertEqual(list(export_rows(chunk_size=2, start=date(2024, 9, 2))), expected[1:3] + expected[4:])
+
+    def test_invalid_parameters(self):
+        response = self.client.get('/api/investments/export/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.json())
+        response = self.client.get('/api/investments/export/', {'from': '2024-09-03', 'to': '2024-09-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_round_trips_through_ingest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.csv')
+            call_command('export_history', path, stdout=StringIO())
+            PerformanceHistory.objects.all().delete()
+            call_command('ingest_nav', path, stdout=StringIO())
+        self.assertEqual(PerformanceHistory.objects.count(), 6)
+
+
+class SyntheticDataTests(TestCase):
+    options = {'users': 3, 'days': 10, 'funds': 4, 'stocks': 12, 'holdings_per_fund': 5, 'seed': 7}
+
+    def generate(self, **options):
+        call_command('generate_data', **{**self.options, **options}, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(PerformanceHistory.objects.order_by('investment__user_name', 'date')
+                 .values_list('investment__user_name', 'date', 'value')),
+            list(FundStockHolding.objects.order_by('fund__name', 'stock__name')
+                 .values_list('fund__name', 'stock__name', 'weight')),
+            list(InvestmentHolding.objects.order_by('investment__user_name', 'fund__name')
+                 .values_list('investment__user_name', 'fund__name', 'units')),
+        )
+
+    def test_counts_and_determinism(self):
+        self.generate()
+        self.assertEqual(
+            [model.objects.count() for model in (Investment, PerformanceHistory, Fund, Stock, FundNav)],
+            [3, 30, 4, 12, 40],
+        )
+        self.assertEqual(FundStockHolding.objects.count(), 20)
+        self.assertEqual(InvestmentHolding.objects.count(), 9)
+        self.assertEqual(PortfolioSummary.objects.count(), 3)
+        first = self.snapshot()
+
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.generate(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_clear_leaves_other_data_and_skips_row_signals(self):
+        kept = create_investments(1)[0]
+        self.generate()
+        with mock.patch('investments.signals.refresh_sector_allocations') as refreshed:
+            self.generate(clear=True)
+        refreshed.assert_not_called()
+        self.assertEqual(list(Investment.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(PerformanceHistory.objects.count(), 5)
+        self.assertEqual(
+            [model.objects.count() for model in (Fund, Stock, FundNav, FundStockHolding, InvestmentHolding)],
+            [0, 0, 0, 0, 0],
+        )
+
+    def test_delete_in_batches_without_signals(self):
+        investments = create_investments(3)
+        with mock.patch('investments.signals.cache.invalidate') as invalidated:
+            deleted = delete_in(
+                PerformanceHistory, 'investment', [investment.pk for investment in investments[:2]], batch_size=1,
+            )
+        invalidated.assert_not_called()
+        self.assertEqual(deleted, 10)
+        self.assertEqual(set(PerformanceHistory.objects.values_list('investment_id', flat=True)), {investments[2].pk})
+        self.assertEqual(delete_in(PerformanceHistory, 'investment', []), 0)
+
+    def test_benchmark_commands_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_api', '--generate', '--users', '3', '--days', '10', '--funds', '4', '--stocks', '12',
+                '--iterations', '1', '--output', output, stdout=StringIO(),
+            )
+            stdout = StringIO()
+            call_command('benchmark_api', '--iterations', '1', '--output', output, '--compare', output, stdout=stdout)
+            with open(output) as f:
+                results = json.load(f)['results']
+        self.assertEqual(results['endpoint.GET /api/investments/']['status'], 200)
+        # Each run logs in with its own password and removes the login afterwards
+        self.assertEqual(results['endpoint.POST /api/auth/login/']['status'], 200)
+        self.assertFalse(User.objects.filter(email='benchmark@fundsight.com').exists())
+        self.assertIn('serializer.InvestmentSerializer', results)
+        self.assertIn('Compared with', stdout.getvalue())
+
+        stdout = StringIO()
+        call_command('benchmark_history', '--investments', '2', '--days', '40', '--queries', '2', stdout=stdout)
+        self.assertIn('Plan for a 1Y range query:', stdout.getvalue())
+        self.assertFalse(Investment.objects.filter(user_name__startswith='benchmark-').exists())
+
+
+@override_settings(TELEMETRY_ENABLED=True, TELEMETRY_FLUSH_INTERVAL=0)
+class TelemetryTests(APITestCase):
+    def test_server_timing(self):
+        create_investments(3)
+        response = self.client.get('/api/investments/', {'page_size': 10})
+        timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        # The investments and both nested relations
+        self.assertIn('desc="3 queries"', timings['db'])
+        self.assertEqual(set(timings), {'db', 'render', 'serialize', 'total'})
+
+        with self.settings(TELEMETRY_ENABLED=False):
+            response = APIClient().get('/api/health/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics(self):
+        create_investments(2)
+        for _ in range(2):
+            self.client.get('/api/investments/')
+        self.client.get('/api/no-such-endpoint/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        samples = dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+        self.assertEqual(samples['fundsight_requests_total{route="investment-list",method="GET",status="200"}'], '2')
+        self.assertEqual(samples['fundsight_requests_total{route="unmatched",method="GET",status="404"}'], '1')
+        self.assertEqual(
+            samples['fundsight_request_duration_seconds_bucket{route="investment-list",method="GET",le="+Inf"}'], '2'
+        )
+        # The second request was a response cache hit
+        self.assertEqual(samples['fundsight_request_db_queries_total{route="investment-list"}'], '3')
+        self.assertIn('# TYPE fundsight_request_duration_seconds histogram', lines)
+        buckets = [
+            line for line in lines
+            if line.startswith('fundsight_request_duration_seconds_bucket{route="investment-list"')
+        ]
+        self.assertEqual(len(buckets), 15)
+        counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts))
+
+        with self.settings(METRICS_TOKEN='scrape'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+        with self.settings(TELEMETRY_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_profile_on_request(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILE_TOKEN='secret', PROFILE_DIR=directory):
+            self.assertNotIn('X-Profile-File', self.client.get('/api/health/', HTTP_X_PROFILE='guess'))
+            response = self.client.get('/api/health/', HTTP_X_PROFILE='secret')
+            stats = pstats.Stats(os.path.join(directory, response['X-Profile-File']))
+        self.assertTrue(stats.total_calls)
+
+    async def test_async_stack(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        self.assertTrue(iscoroutinefunction(TelemetryMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(TelemetryMiddleware(lambda request: HttpResponse('ok'))))
+
+        # Through ASGI, with the async view stack awaited rather than run on a thread
+        response = await self.async_client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        metrics = await self.async_client.get('/metrics')
+        self.assertIn('fundsight_requests_total{route="health",method="GET",status="200"} 1', metrics.content.decode())
+
+
+class ResponseCacheTests(APITestCase):
+    def test_hit_skips_the_database(self):
+        create_funds(2)
+        first = self.client.get('/api/funds/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/funds/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_query_params_and_users_get_separate_entries(self):
+        create_funds(2)
+        self.client.get('/api/funds/')
+        self.assertEqual(self.client.get('/api/funds/', {'fields': 'id'})['X-Cache'], 'MISS')
+
+        other = User.objects.create_user(username='other', email='other@fundsight.com', password='x')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/api/funds/')['X-Cache'], 'MISS')
+
+    def test_model_changes_invalidate(self):
+        fund = create_funds(1)[0]
+        etag = self.client.get('/api/funds/')['ETag']
+        fund.name = 'Renamed Fund'
+        with self.captureOnCommitCallbacks(execute=True):
+            fund.save()
+        response = self.client.get('/api/funds/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed Fund')
+
+    def test_if_none_match_returns_304(self):
+        investment = create_investments(1)[0]
+        url = f'/api/investments/{investment.pk}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PerformanceHistory.objects.create(investment=investment, date=date(2025, 1, 1), value=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_invalidated_once_the_write_commits(self):
+        fund = create_funds(1)[0]
+        self.client.get('/api/funds/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            fund.name = 'Renamed Fund'
+            fund.save()
+            # A request before the commit sees the old row, so it must not be stamped with a newer generation
+            self.assertEqual(self.client.get('/api/funds/')['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/funds/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed Fund')
@@ -0,0 +1,72 @@
+import calendar
+from datetime import date
+
+# Chart periods offered by the Performance Metrics page, as months back from today
+PERIOD_MONTHS = {
+    '1M': 1,
+    '3M': 3,
+    '6M': 6,
+    '1Y': 12,
+    '3Y': 36,
+    'MAX': None,
+}
+
+
+def subtract_months(day, months):
+    """Return ``day`` moved back by ``months``, clamped to the end of shorter months."""
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def period_start(period, today):
+    """First date included in ``period``, or None when the period is unbounded."""
+    months = PERIOD_MONTHS[period]
+    if months is None:
+        return None
+    return subtract_months(today, months)
+
+
+def lttb(points, threshold):
+    """
+    Downsample ``(date, value)`` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept and every other bucket keeps the
+    point that forms the largest triangle with its neighbours, which preserves
+    the visual peaks and troughs of the series.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    xs = [p[0].toordinal() for p in points]
+    ys = [float(p[1]) for p in points]
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
@@ -1,17 +1,28 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from .views import InvestmentViewSet, FundViewSet
+from rest_framework.routers import DefaultRouter, SimpleRouter
+from .async_views import AsyncInvestmentViewSet, AsyncFundViewSet
+from .views import InvestmentViewSet, FundViewSet, StockViewSet, DashboardView, CacheStatsView, HealthView
 from .auth_views import LoginView, LogoutView, UserView, CSRFTokenView, TokenView
 
 router = DefaultRouter()
 router.register(r'investments', InvestmentViewSet)
 router.register(r'funds', FundViewSet)
+router.register(r'stocks', StockViewSet)
+
+# ASGI-native read endpoints, see async_views.py
+async_router = SimpleRouter()
+async_router.register(r'investments', AsyncInvestmentViewSet, basename='async-investment')
+async_router.register(r'funds', AsyncFundViewSet, basename='async-fund')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/', include(async_router.urls)),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('auth/user/', UserView.as_view(), name='user'),
     path('auth/csrf/', CSRFTokenView.as_view(), name='csrf'),
     path('auth/token/', TokenView.as_view(), name='token'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('health/', HealthView.as_view(), name='health'),
 ]
\ No newline at end of file
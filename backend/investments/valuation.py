@@ -0,0 +1,224 @@
+"""
+Daily valuation of investors from the fund units they hold.
+
+An investor is worth ``units x NAV`` summed over their holdings, at each
+fund's latest FundNav on or before the valuation day. For a partition of
+investors that is one sparse product: an (investor x fund) units matrix times
+the NAV vector. Each holding's gain against its ``cost`` gives the best and
+worst performing schemes, picked with one sort over all holdings rather than
+a loop per investor.
+
+``revalue`` writes the day's PerformanceHistory rows through the NAV
+ingestion loaders (``COPY`` on PostgreSQL) and the derived Investment fields
+with one ``UPDATE ... FROM unnest(...)`` (``bulk_update`` elsewhere). With ``processes`` above 1, partitions of investment
+ids are valued in a pool of forked processes, each with its own connection.
+Investors holding a fund without any NAV yet are skipped, rather than written
+at a partial value.
+"""
+import multiprocessing
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, connections
+from django.db.models import Exists, FloatField, Max, OuterRef, Subquery
+from django.db.models.functions import Cast
+from scipy import sparse
+
+from . import cache, packed
+from .ingest import chunked, default_loader
+from .models import Fund, FundNav, Investment, InvestmentHolding
+from .summary import refresh_current_values, refresh_summaries
+
+CENT = Decimal('0.01')
+
+# Largest magnitude best_performance_change and worst_performance_change can store
+MAX_CHANGE = 99999.99
+
+UPDATED_FIELDS = [
+    'initial_value', 'best_performing_scheme', 'best_performance_change',
+    'worst_performing_scheme', 'worst_performance_change',
+]
+
+
+def latest_nav_date():
+    return FundNav.objects.aggregate(latest=Max('date'))['latest']
+
+
+def refresh_fund_navs(funds=None):
+    """
+    Set ``Fund.nav`` to each fund's latest FundNav, for ``funds`` (all by
+    default), in one UPDATE. Returns the number of funds whose NAV moved.
+    """
+    if funds is None:
+        funds = Fund.objects.all()
+    history = FundNav.objects.filter(fund=OuterRef('pk'))
+    latest = Subquery(history.order_by('-date').values('nav')[:1])
+    updated = funds.filter(Exists(history)).exclude(nav=latest).update(nav=latest)
+    if updated:
+        # update() skips the signals that invalidate cached fund responses
+        cache.invalidate('funds')
+    return updated
+
+
+def navs_on(day, fund_ids):
+    """``{fund_id: nav}`` as floats, at each fund's latest FundNav on or before ``day``; funds without one are left out."""
+    nav = FundNav.objects.filter(fund=OuterRef('pk'), date__lte=day).order_by('-date')
+    funds = Fund.objects.filter(pk__in=fund_ids).annotate(
+        nav_on=Subquery(nav.values(value=Cast('nav', FloatField()))[:1])
+    )
+    return dict(funds.filter(nav_on__isnull=False).values_list('pk', 'nav_on'))
+
+
+def value_holdings(day, investments=None):
+    """
+    Value the holdings of ``investments`` (all by default) on ``day``.
+
+    Returns a dict of arrays aligned on ``investment_ids``: ``values`` and
+    ``costs`` in rupees, and ``best_fund``/``best_change`` and
+    ``worst_fund``/``worst_change``, with the change in percent. A fund id is
+    0, with a NaN change, for investors without any costed holding.
+    """
+    holdings = InvestmentHolding.objects.all()
+    if investments is not None:
+        holdings = holdings.filter(investment__in=investments)
+    rows = list(holdings.values_list(
+        'investment_id', 'fund_id', Cast('units', FloatField()), Cast('cost', FloatField())
+    ))
+    if not rows:
+        return None
+    holding_investments, holding_funds, units, costs = (np.array(column) for column in zip(*rows))
+    investment_ids, investor = np.unique(holding_investments, return_inverse=True)
+    fund_ids, fund = np.unique(holding_funds, return_inverse=True)
+
+    navs = navs_on(day, fund_ids.tolist())
+    nav = np.array([navs.get(fund_id, np.nan) for fund_id in fund_ids.tolist()])
+    # Investors holding a fund with no NAV yet cannot be valued
+    unpriced = np.zeros(len(investment_ids), dtype=bool)
+    unpriced[investor[np.isnan(nav[fund])]] = True
+
+    units_matrix = sparse.csr_matrix((units, (investor, fund)), shape=(len(investment_ids), len(fund_ids)))
+    values = units_matrix @ np.nan_to_num(nav)
+    total_costs = np.bincount(investor, weights=costs, minlength=len(investment_ids))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = np.where(costs > 0, (units * nav[fund] / costs - 1) * 100, np.nan)
+    best_fund = np.zeros(len(investment_ids), dtype=np.int64)
+    worst_fund = np.zeros(len(investment_ids), dtype=np.int64)
+    best_change = np.full(len(investment_ids), np.nan)
+    worst_change = np.full(len(investment_ids), np.nan)
+    costed = np.flatnonzero(~np.isnan(changes))
+    if len(costed):
+        # Holdings ordered by investor, then by change: each investor's run starts at its worst and ends at its best
+        order = costed[np.lexsort((changes[costed], investor[costed]))]
+        runs = investor[order]
+        starts = np.r_[True, runs[1:] != runs[:-1]]
+        ends = np.r_[runs[1:] != runs[:-1], True]
+        worst, best = order[starts], order[ends]
+        worst_fund[investor[worst]], worst_change[investor[worst]] = holding_funds[worst], changes[worst]
+        best_fund[investor[best]], best_change[investor[best]] = holding_funds[best], changes[best]
+
+    keep = ~unpriced
+    return {
+        'investment_ids': investment_ids[keep],
+        'values': values[keep],
+        'costs': total_costs[keep],
+        'best_fund': best_fund[keep],
+        'best_change': best_change[keep],
+        'worst_fund': worst_fund[keep],
+        'worst_change': worst_change[keep],
+    }
+
+
+def _change(value):
+    return Decimal(float(np.clip(value, -MAX_CHANGE, MAX_CHANGE))).quantize(CENT)
+
+
+def _update_investments(rows):
+    """
+    Write ``(id, initial_value, best scheme, best change, worst scheme,
+    worst change)`` rows to Investment. On PostgreSQL this is one
+    ``UPDATE ... FROM unnest(...)``; ``bulk_update`` builds a CASE per row
+    and column, which is most of the cost of a revaluation.
+    """
+    if not rows:
+        return
+    if connection.vendor != 'postgresql':
+        Investment.objects.bulk_update([
+            Investment(
+                pk=pk, initial_value=cost,
+                best_performing_scheme=best, best_performance_change=best_change,
+                worst_performing_scheme=worst, worst_performance_change=worst_change,
+            )
+            for pk, cost, best, best_change, worst, worst_change in rows
+        ], UPDATED_FIELDS, batch_size=1000)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Investment._meta.db_table} AS i SET initial_value = v.cost, '
+            'best_performing_scheme = v.best, best_performance_change = v.best_change, '
+            'worst_performing_scheme = v.worst, worst_performance_change = v.worst_change '
+            'FROM unnest(%s::bigint[], %s::numeric[], %s::varchar[], %s::numeric[], %s::varchar[], %s::numeric[]) '
+            'AS v(id, cost, best, best_change, worst, worst_change) WHERE i.id = v.id',
+            [list(column) for column in zip(*rows)],
+        )
+
+
+def _revalue(day, investments=None):
+    valuation = value_holdings(day, investments)
+    if valuation is None or not len(valuation['investment_ids']):
+        return 0
+    investment_ids = valuation['investment_ids'].tolist()
+
+    history = [
+        (investment_id, day, Decimal(value).quantize(CENT))
+        for investment_id, value in zip(investment_ids, valuation['values'].tolist())
+    ]
+    default_loader().load(history)
+    if packed.mirrored():
+        packed.write_points(history)
+
+    fund_names = dict(Fund.objects.filter(
+        pk__in={*valuation['best_fund'].tolist(), *valuation['worst_fund'].tolist()}
+    ).values_list('pk', 'name'))
+    _update_investments([
+        (
+            investment_id, Decimal(cost).quantize(CENT),
+            fund_names[best_fund], _change(best_change), fund_names[worst_fund], _change(worst_change),
+        )
+        for investment_id, cost, best_fund, best_change, worst_fund, worst_change in zip(
+            investment_ids, valuation['costs'].tolist(),
+            valuation['best_fund'].tolist(), valuation['best_change'].tolist(),
+            valuation['worst_fund'].tolist(), valuation['worst_change'].tolist(),
+        )
+        # Investors without a recorded cost keep their invested amount and schemes
+        if best_fund
+    ])
+
+    # The loaders and bulk updates skip the signals that keep these fresh
+    valued = Investment.objects.filter(pk__in=investment_ids)
+    refresh_current_values(valued)
+    refresh_summaries(valued)
+    cache.invalidate('investments')
+    return len(investment_ids)
+
+
+def _revalue_ids(day, investment_ids):
+    return _revalue(day, Investment.objects.filter(pk__in=investment_ids))
+
+
+def revalue(day, investments=None, processes=1, chunk_size=1000):
+    """
+    Value every investor in ``investments`` (all by default) on ``day`` and
+    write the results, ``chunk_size`` investors per partition across
+    ``processes`` processes. Returns the number of investors valued.
+    """
+    if processes <= 1:
+        return _revalue(day, investments)
+    if investments is None:
+        investments = Investment.objects.all()
+    investment_ids = investments.order_by('pk').values_list('pk', flat=True)
+    partitions = [(day, chunk) for chunk in chunked(investment_ids.iterator(chunk_size=chunk_size), chunk_size)]
+    # Forked children must open their own connections rather than share the parent's
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        return sum(pool.starmap(_revalue_ids, partitions))
@@ -1,17 +1,327 @@
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
-from .models import Investment, Fund
-from .serializers import InvestmentSerializer, FundSerializer
+from django.conf import settings
+from django.db import connection
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.authentication import SessionAuthentication
+from .models import Investment, Fund, FundStockHolding, PortfolioSummary, Stock
+from . import packed
+from .aggregates import combined_history, portfolio_totals, sector_totals
+from .analytics import investment_metrics
+from .authentication import CachedTokenAuthentication
+from .cache import cached_response, stats as cache_stats
+from .dashboard import dashboard_data, investment_rows
+from .export import CONTENT_TYPES, ExportError, export_chunks, export_rows
+from .fastpath import RowSerializer
+from .holders import holders_index, investment_exposure
+from .overlap import overlap_engine
+from .pagination import KeysetPagination
+from .search import search_names
+from .serializers import (
+    InvestmentSerializer, FundSerializer, PerformanceHistorySerializer, PerformanceQuerySerializer,
+    FundOverlapQuerySerializer, PortfolioSummarySerializer, SeriesQuerySerializer, MetricsQuerySerializer,
+    InvestmentMetricsSerializer, PortfolioAggregateSerializer, ExportQuerySerializer, StockSerializer,
+    StockHolderSerializer, ExposureQuerySerializer, StockExposureSerializer, SearchQuerySerializer,
+    DashboardQuerySerializer,
+)
+from .summary import refresh_summaries
+from .telemetry import render_metrics
+from .timeseries import lttb, period_start
 
-class InvestmentViewSet(viewsets.ModelViewSet):
+def name_search_response(request, model):
+    params = SearchQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    matches = search_names(model, params.validated_data['q'], params.validated_data['limit'])
+    return Response({'results': [{'id': pk, 'name': name} for pk, name in matches]})
+
+class SparseFieldsetViewSetMixin:
+    """Only prefetch the nested relations the serializer will actually render."""
+
+    def requested_relations(self):
+        serializer_class = self.get_serializer_class()
+        selected = serializer_class.requested_fields(self.request.query_params, serializer_class.Meta.fields)
+        return [name for name in serializer_class.Meta.expandable_fields if name in selected]
+
+class InvestmentEndpointMixin:
+    """Configuration shared by the sync and async investment viewsets."""
     queryset = Investment.objects.all()
     serializer_class = InvestmentSerializer
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    lookup_value_regex = r'\d+'
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
 
-class FundViewSet(viewsets.ModelViewSet):
+    def columnar_series(self):
+        params = SeriesQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data['series'] == 'columnar'
+
+class InvestmentViewSet(InvestmentEndpointMixin, viewsets.ModelViewSet):
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'export':
+            # ?format= names the export file type here, not a DRF renderer; errors still render as JSON
+            renderer = self.get_renderers()[0]
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+    # Reads render from column tuples instead of model instances (see fastpath.py).
+    # Each nested relation costs one query, like prefetch_related.
+
+    @cached_response('investments')
+    def list(self, request, *args, **kwargs):
+        columnar = self.columnar_series()
+        rows = RowSerializer(self.get_serializer())
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(rows.serialize(list(queryset), columnar))
+        return self.get_paginated_response(rows.serialize(page, columnar))
+
+    @cached_response('investments')
+    def retrieve(self, request, *args, **kwargs):
+        columnar = self.columnar_series()
+        rows = RowSerializer(self.get_serializer())
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        row = get_object_or_404(rows.values(self.get_queryset()), **{self.lookup_field: lookup})
+        self.check_object_permissions(request, row)
+        return Response(rows.serialize([row], columnar)[0])
+
+    @action(detail=True, methods=['get'])
+    @cached_response('investments')
+    def performance(self, request, pk=None):
+        params = PerformanceQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        period = params.validated_data['period']
+
+        investment = self.get_object()
+        start = period_start(period, timezone.localdate())
+        if packed.serves_reads():
+            points = packed.to_points(*packed.read_series(investment.pk, start))
+        else:
+            history = investment.performance_history.order_by('date')
+            if start is not None:
+                history = history.filter(date__gte=start)
+            points = list(history.values_list('date', 'value'))
+        sampled = lttb(points, params.validated_data['points'])
+        return Response({
+            'period': period,
+            'total_points': len(points),
+            'performance_history': RowSerializer(PerformanceHistorySerializer()).render(
+                sampled, columnar=params.validated_data['series'] == 'columnar'
+            ),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response('investments')
+    def aggregate(self, request):
+        params = PerformanceQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        period = params.validated_data['period']
+
+        investments = self.filter_queryset(self.get_queryset())
+        points = combined_history(investments, period_start(period, timezone.localdate()))
+        sampled = lttb(points, params.validated_data['points'])
+        return Response({
+            **PortfolioAggregateSerializer({
+                **portfolio_totals(investments),
+                'sectors': sector_totals(investments),
+            }).data,
+            'period': period,
+            'total_points': len(points),
+            'performance_history': RowSerializer(PerformanceHistorySerializer()).render(
+                sampled, columnar=params.validated_data['series'] == 'columnar'
+            ),
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        file_format = params.validated_data['format']
+
+        rows = export_rows(
+            params.validated_data.get('from'), params.validated_data.get('to'),
+            investments=self.filter_queryset(self.get_queryset()),
+        )
+        try:
+            chunks = export_chunks(file_format, rows)
+        except ExportError as exc:
+            raise serializers.ValidationError({'format': [str(exc)]})
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="performance-history.{file_format}"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    @cached_response('investments')
+    def metrics(self, request, pk=None):
+        params = MetricsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        period = params.validated_data['period']
+
+        metrics = investment_metrics(self.get_object(), period, timezone.localdate())
+        if metrics is None:
+            return Response({'detail': 'No performance history in this period.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(InvestmentMetricsSerializer({'period': period, **metrics}).data)
+
+    @action(detail=True, methods=['get'])
+    @cached_response('investments')
+    def summary(self, request, pk=None):
+        summary = PortfolioSummary.objects.filter(investment_id=pk).first()
+        if summary is None:
+            # Not materialized yet, e.g. created before the summary table existed
+            investment = get_object_or_404(Investment, pk=pk)
+            refresh_summaries(Investment.objects.filter(pk=investment.pk))
+            summary = PortfolioSummary.objects.get(investment_id=pk)
+        return Response(PortfolioSummarySerializer(summary).data)
+
+    @action(detail=True, methods=['get'])
+    @cached_response('investments', 'funds')
+    def exposure(self, request, pk=None):
+        """The investor's exposure to ``?stock=`` across every fund they hold."""
+        params = ExposureQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        investment = get_object_or_404(Investment.objects.only('pk'), pk=pk)
+        stock = Stock.objects.filter(pk=params.validated_data['stock']).first()
+        if stock is None:
+            raise serializers.ValidationError({'stock': [f"Unknown stock id: {params.validated_data['stock']}"]})
+        return Response(StockExposureSerializer({
+            'investment': investment.pk,
+            'stock': stock,
+            **investment_exposure(investment.pk, stock.pk),
+        }).data)
+
+class FundEndpointMixin(SparseFieldsetViewSetMixin):
+    """Configuration shared by the sync and async fund viewsets."""
     queryset = Fund.objects.all()
     serializer_class = FundSerializer
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if 'holdings' in self.requested_relations():
+            # Holdings are serialized with their stock name, so join the stock in the prefetch
+            holdings = FundStockHolding.objects.select_related('stock')
+            queryset = queryset.prefetch_related(Prefetch('holdings', queryset=holdings))
+        return queryset
+
+class FundViewSet(FundEndpointMixin, viewsets.ModelViewSet):
+    @cached_response('funds')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response('funds')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    @cached_response('funds')
+    def overlap(self, request):
+        params = FundOverlapQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        fund_ids = params.validated_data['funds']
+
+        funds = {fund.id: fund for fund in Fund.objects.filter(id__in=fund_ids).only('id', 'name', 'color')}
+        missing = [fund_id for fund_id in fund_ids if fund_id not in funds]
+        if missing:
+            raise serializers.ValidationError({'funds': [f'Unknown fund ids: {missing}']})
+
+        return Response({
+            'funds': [
+                {'id': fund_id, 'name': funds[fund_id].name, 'color': funds[fund_id].color}
+                for fund_id in fund_ids
+            ],
+            **overlap_engine.compare(fund_ids),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response('funds')
+    def search(self, request):
+        """Funds whose names match ``?q=``, best first; see search.py."""
+        return name_search_response(request, Fund)
+
+class StockViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Stock.objects.all()
+    serializer_class = StockSerializer
+    lookup_value_regex = r'\d+'
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    @cached_response('funds')
+    def search(self, request):
+        """Stocks whose names match ``?q=``, best first; see search.py."""
+        return name_search_response(request, Stock)
+
+    @action(detail=True, methods=['get'])
+    @cached_response('funds')
+    def funds(self, request, pk=None):
+        """Every fund holding the stock, heaviest weight first, from the in-memory holders index."""
+        stock = self.get_object()
+        weights = holders_index.funds_holding(stock.pk)
+        funds = Fund.objects.filter(pk__in=weights).values('id', 'name', 'color')
+        holders = sorted(
+            ({**fund, 'weight': weights[fund['id']]} for fund in funds),
+            key=lambda fund: (-fund['weight'], fund['id']),
+        )
+        return Response({
+            'stock': StockSerializer(stock).data,
+            'funds': StockHolderSerializer(holders, many=True).data,
+        })
+
+class DashboardView(APIView):
+    """Everything the frontend needs for first paint, in one response (see dashboard.py)."""
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    pagination_class = KeysetPagination
+
+    @cached_response('investments', 'funds', 'users')
+    def get(self, request):
+        params = DashboardQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        rows = investment_rows()
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows.values(Investment.objects.all()), request, view=self)
+        data = dashboard_data(request.user, rows, page, today=timezone.localdate(), **params.validated_data)
+        return Response({**data, 'next': paginator.get_next_link()})
+
+class CacheStatsView(APIView):
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        groups = sorted({group for group, _ in cache_stats})
+        return Response({
+            group: {'hits': cache_stats[group, 'hit'], 'misses': cache_stats[group, 'miss']}
+            for group in groups
+        })
+
+class HealthView(APIView):
+    """Liveness/readiness probe: checks the worker can reach the database."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return Response({'status': 'ok'})
+
+class MetricsView(APIView):
+    """Request telemetry in the Prometheus text format, for scraping (see telemetry.py)."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if not settings.TELEMETRY_ENABLED:
+            raise Http404
+        token = settings.METRICS_TOKEN
+        if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            raise exceptions.PermissionDenied
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,48 @@
+"""
+HTTP load scenario for the API.
+
+    pip install locust
+    python manage.py create_demo_users
+    locust -f locustfile.py --host http://localhost:8000 --users 50 --spawn-rate 10 --run-time 2m --headless \
+        --csv benchmark-results/locust
+
+Each simulated user logs in once and then loads the dashboard the way the
+frontend does: user profile, investments and funds, plus the performance chart.
+"""
+import os
+
+from locust import HttpUser, between, task
+
+EMAIL = os.environ.get('LOCUST_EMAIL', 'demo@fundsight.com')
+PASSWORD = os.environ.get('LOCUST_PASSWORD', 'SecurePass123!')
+
+
+class DashboardUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        response = self.client.post('/api/auth/login/', json={'email': EMAIL, 'password': PASSWORD})
+        response.raise_for_status()
+        self.client.headers['Authorization'] = f"Token {response.json()['token']}"
+        investments = self.client.get('/api/investments/', params={'expand': ''}).json()['results']
+        self.investment_ids = [investment['id'] for investment in investments] or [None]
+
+    @task(3)
+    def dashboard(self):
+        self.client.get('/api/auth/user/')
+        self.client.get('/api/investments/')
+        self.client.get('/api/funds/')
+
+    @task(2)
+    def performance_chart(self):
+        investment_id = self.investment_ids[0]
+        if investment_id is not None:
+            self.client.get(
+                f'/api/investments/{investment_id}/performance/',
+                params={'period': '1Y', 'points': 200},
+                name='/api/investments/[id]/performance/',
+            )
+
+    @task(1)
+    def headline_totals(self):
+        self.client.get('/api/investments/', params={'fields': 'id,user_name,current_value,initial_value'})
@@ -2,11 +2,13 @@ import { configureStore } from '@reduxjs/toolkit';
 import { useDispatch, useSelector, TypedUseSelectorHook } from 'react-redux';
 import investmentReducer from '../features/investmentSlice'; // Fixed import path
 import authReducer from '../features/authSlice';
+import dashboardReducer from '../features/dashboardSlice';
 
 export const store = configureStore({
   reducer: {
     investments: investmentReducer,
     auth: authReducer,
+    dashboard: dashboardReducer,
     // ...other reducers
   },
 });
@@ -1,5 +1,6 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import { fetchDashboard } from './dashboardSlice';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api/';
 
@@ -88,6 +89,9 @@ const authSlice = createSlice({
         state.loading = false;
         state.error = action.payload as string;
       })
+      .addCase(fetchDashboard.fulfilled, (state, action) => {
+        state.user = action.payload.user;
+      })
       .addCase(logout.fulfilled, (state) => {
         state.user = null;
         state.token = null;
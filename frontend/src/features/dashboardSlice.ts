@@ -0,0 +1,45 @@
+import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit';
+import { DashboardState, DashboardData } from '../types';
+import api from '../services/api';
+
+// Thunk for the first-paint bootstrap: user, a page of investments, funds and totals in one request
+export const fetchDashboard = createAsyncThunk(
+  'dashboard/fetchDashboard',
+  async (_, { rejectWithValue }) => {
+    try {
+      const response = await api.get<DashboardData>('/dashboard/');
+      return response.data;
+    } catch (error: any) {
+      return rejectWithValue(error.response?.data?.detail || 'Failed to load the dashboard');
+    }
+  }
+);
+
+// Kept apart from the investments slice: its histories are downsampled and it holds one page of investors
+const initialState: DashboardState = {
+  data: null,
+  status: 'idle',
+  error: null
+};
+
+const dashboardSlice = createSlice({
+  name: 'dashboard',
+  initialState,
+  reducers: {},
+  extraReducers: (builder) => {
+    builder
+      .addCase(fetchDashboard.pending, (state) => {
+        state.status = 'loading';
+      })
+      .addCase(fetchDashboard.fulfilled, (state, action: PayloadAction<DashboardData>) => {
+        state.status = 'succeeded';
+        state.data = action.payload;
+      })
+      .addCase(fetchDashboard.rejected, (state, action) => {
+        state.status = 'failed';
+        state.error = action.payload as string || 'Unknown error occurred';
+      });
+  }
+});
+
+export default dashboardSlice.reducer;
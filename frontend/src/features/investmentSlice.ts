@@ -2,13 +2,24 @@ import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit';
 import { InvestmentState, Investment, Fund } from '../types';
 import api from '../services/api';  // Import the configured api service
 
+// List endpoints are cursor paginated; follow `next` links until the last page
+const fetchAllPages = async <T>(url: string): Promise<T[]> => {
+  const results: T[] = [];
+  let next: string | null = url;
+  while (next) {
+    const response: { data: { results: T[]; next: string | null } } = await api.get(next);
+    results.push(...response.data.results);
+    next = response.data.next;
+  }
+  return results;
+};
+
 // Thunk for fetching all investments
 export const fetchInvestments = createAsyncThunk(
   'investments/fetchInvestments',
   async (_, { rejectWithValue }) => {
     try {
-      const response = await api.get('/investments/');
-      return response.data;
+      return await fetchAllPages<Investment>('/investments/');
     } catch (error: any) {
       return rejectWithValue(error.response?.data?.detail || 'Failed to fetch investments');
     }
@@ -20,8 +31,7 @@ export const fetchFunds = createAsyncThunk(
   'investments/fetchFunds',
   async (_, { rejectWithValue }) => {
     try {
-      const response = await api.get('/funds/');
-      return response.data;
+      return await fetchAllPages<Fund>('/funds/');
     } catch (error: any) {
       return rejectWithValue(error.response?.data?.detail || 'Failed to fetch funds');
     }
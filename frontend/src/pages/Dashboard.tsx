@@ -1,7 +1,8 @@
 import React, { useEffect, useState } from 'react';
-import { useSelector } from 'react-redux';
+import { useDispatch, useSelector } from 'react-redux';
 import { useNavigate } from 'react-router-dom';
-import { RootState } from '../app/store';
+import { RootState, AppDispatch } from '../app/store';
+import { fetchDashboard } from '../features/dashboardSlice';
 import { 
   Box, 
   Paper, 
@@ -26,24 +27,24 @@ import MoreVertIcon from '@mui/icons-material/MoreVert';
 import BarChartIcon from '@mui/icons-material/BarChart';
 
 const Dashboard: React.FC = () => {
-  const { investments, funds } = useSelector((state: RootState) => state.investments);
+  const dispatch = useDispatch<AppDispatch>();
+  const dashboard = useSelector((state: RootState) => state.dashboard.data);
+  const investments = dashboard?.investments ?? [];
+  const aggregate = dashboard?.portfolio;
   const [animate, setAnimate] = useState(false);
   const navigate = useNavigate();
   
   useEffect(() => {
     // Trigger animations after component mounts
     setAnimate(true);
-  }, []);
+    // One request for the user, investments, funds and totals instead of a waterfall
+    dispatch(fetchDashboard());
+  }, [dispatch]);
 
-  // Calculate some mock data for visualization
-  const totalInvestment = investments.reduce((sum, inv) => sum + Number(inv.current_value), 0);
-  const totalGrowth = investments.reduce(
-    (sum, inv) => sum + (Number(inv.current_value) - Number(inv.initial_value)), 
-    0
-  );
-  const growthPercentage = totalInvestment > 0 
-    ? (totalGrowth / (totalInvestment - totalGrowth) * 100).toFixed(1) 
-    : '0';
+  // Totals are summed by the backend, so the dashboard does not add up every investment itself
+  const totalInvestment = Number(aggregate?.total_value ?? 0);
+  const totalGrowth = Number(aggregate?.total_growth ?? 0);
+  const growthPercentage = Number(aggregate?.growth_percentage ?? 0).toFixed(1);
   const isPositiveGrowth = totalGrowth >= 0;
 
   return (
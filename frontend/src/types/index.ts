@@ -9,6 +9,7 @@ export interface Fund {
   }
   
   export interface Investment {
+    id: number;
     user_name: string;
     current_value: number;
     initial_value: number;
@@ -28,6 +29,44 @@ export interface Fund {
     }[];
   }
   
+  export interface PortfolioTotals {
+    investors: number;
+    total_value: string;
+    total_invested: string;
+    total_growth: string;
+    growth_percentage: string | null;
+    sectors: {
+      name: string;
+      amount: string;
+      percentage: string;
+      bgcolor: string;
+    }[];
+  }
+
+  export interface User {
+    id: number;
+    username: string;
+    email: string;
+    first_name: string;
+    last_name: string;
+  }
+
+  // Everything the app needs for first paint, from GET /api/dashboard/
+  export interface DashboardData {
+    user: User;
+    portfolio: PortfolioTotals;
+    period: string;
+    investments: Investment[];
+    funds: Fund[];
+    next: string | null;
+  }
+
+  export interface DashboardState {
+    data: DashboardData | null;
+    status: 'idle' | 'loading' | 'succeeded' | 'failed';
+    error: string | null;
+  }
+
   export interface InvestmentState {
     investments: Investment[];
     funds: Fund[];